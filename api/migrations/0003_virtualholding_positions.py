@@ -0,0 +1,40 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:14
+
+from django.db import migrations, models
+
+
+def merge_lots(apps, schema_editor):
+    """Collapse per-lot rows into one position per (user, stock_id)"""
+    VirtualHolding = apps.get_model('api', 'VirtualHolding')
+    positions = {}
+    for h in VirtualHolding.objects.order_by('buy_time', 'id'):
+        positions.setdefault((h.user_id, h.stock_id), []).append(h)
+
+    for lots in positions.values():
+        keep, rest = lots[0], lots[1:]
+        quantity = sum(h.quantity for h in lots)
+        cost_cents = sum(int(round(h.buy_price * h.quantity * 100)) for h in lots)
+        if quantity <= 0:
+            VirtualHolding.objects.filter(id__in=[h.id for h in lots]).delete()
+            continue
+        keep.quantity = quantity
+        keep.cost_cents = cost_cents
+        keep.buy_price = cost_cents / 100 / quantity
+        keep.save(update_fields=['quantity', 'cost_cents', 'buy_price'])
+        VirtualHolding.objects.filter(id__in=[h.id for h in rest]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_tradehistory_cashaccount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='virtualholding',
+            name='cost_cents',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(merge_lots, migrations.RunPython.noop),
+    ]
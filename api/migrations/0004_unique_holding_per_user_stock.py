@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Kept apart from 0003 so the constraint is added outside the data migration's transaction
+
+    dependencies = [
+        ('api', '0003_virtualholding_positions'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='virtualholding',
+            constraint=models.UniqueConstraint(fields=('user', 'stock_id'), name='unique_holding_per_user_stock'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_unique_holding_per_user_stock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tradehistory',
+            index=models.Index(fields=['user', '-ts', '-id'], name='trade_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tradehistory',
+            index=models.Index(fields=['user', 'stock_id', '-ts', '-id'], name='trade_user_stock_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_tradehistory_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock_id', models.CharField(max_length=10)),
+                ('date', models.DateField()),
+                ('capacity', models.BigIntegerField()),
+                ('turnover', models.BigIntegerField()),
+                ('open', models.FloatField(null=True)),
+                ('high', models.FloatField(null=True)),
+                ('low', models.FloatField(null=True)),
+                ('close', models.FloatField(null=True)),
+                ('change', models.FloatField()),
+                ('transaction', models.IntegerField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailybar',
+            constraint=models.UniqueConstraint(fields=('stock_id', 'date'), name='unique_bar_per_stock_date'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0006_dailybar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock_id', models.CharField(max_length=10)),
+                ('side', models.CharField(choices=[('BUY', 'BUY'), ('SELL', 'SELL')], max_length=4)),
+                ('order_type', models.CharField(choices=[('LIMIT', 'LIMIT'), ('STOP', 'STOP')], max_length=5)),
+                ('price', models.FloatField()),
+                ('quantity', models.IntegerField()),
+                ('reserved_cents', models.BigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('OPEN', 'OPEN'), ('FILLED', 'FILLED'), ('CANCELLED', 'CANCELLED'), ('REJECTED', 'REJECTED')], default='OPEN', max_length=9)),
+                ('fill_price', models.FloatField(blank=True, null=True)),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'status', '-created_at'], name='order_user_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:35
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tradehistory',
+            name='journal_id',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='tradehistory',
+            name='ts',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0008_tradehistory_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RealizedPnl',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock_id', models.CharField(max_length=10)),
+                ('realized_cents', models.BigIntegerField(default=0)),
+                ('sold_quantity', models.BigIntegerField(default=0)),
+                ('sold_cost_cents', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='realizedpnl',
+            constraint=models.UniqueConstraint(fields=('user', 'stock_id'), name='unique_pnl_per_user_stock'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0009_realizedpnl'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquitySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('as_of', models.DateTimeField()),
+                ('cash_cents', models.BigIntegerField()),
+                ('market_value_cents', models.BigIntegerField()),
+                ('positions', models.JSONField(default=dict)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='equitysnapshot',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_snapshot_per_user_date'),
+        ),
+    ]
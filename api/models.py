@@ -1,18 +1,44 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class VirtualHolding(models.Model):
+    """One position per (user, stock_id), written behind from the Redis ledger"""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     stock_id = models.CharField(max_length=10)
-    buy_price = models.FloatField()
+    buy_price = models.FloatField()  # average cost per share
     quantity = models.IntegerField()
+    cost_cents = models.BigIntegerField(default=0)
     buy_time = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "stock_id"], name="unique_holding_per_user_stock"),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.stock_id} x {self.quantity}"
 
 
+class RealizedPnl(models.Model):
+    """Running realized P&L per (user, stock_id), written behind from the Redis ledger"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    stock_id = models.CharField(max_length=10)
+    realized_cents = models.BigIntegerField(default=0)
+    sold_quantity = models.BigIntegerField(default=0)
+    sold_cost_cents = models.BigIntegerField(default=0)  # FIFO cost basis of the shares sold
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "stock_id"], name="unique_pnl_per_user_stock"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.stock_id} realized {self.realized_cents / 100:.2f}"
+
+
 class TradeHistory(models.Model):
     BUY = "BUY"
     SELL = "SELL"
@@ -23,7 +49,109 @@ class TradeHistory(models.Model):
     side = models.CharField(max_length=4, choices=SIDE_CHOICES)
     price = models.FloatField()
     quantity = models.IntegerField()
-    ts = models.DateTimeField(auto_now_add=True)
+    # Trade time, stamped when the trade is journaled rather than when it is flushed
+    ts = models.DateTimeField(default=timezone.now)
+    # Redis stream entry id; makes re-flushing a journal batch a no-op
+    journal_id = models.CharField(max_length=32, unique=True, null=True, blank=True)
+
+    class Meta:
+        # Keyset pagination walks (ts, id) newest first within one user
+        indexes = [
+            models.Index(fields=["user", "-ts", "-id"], name="trade_user_ts_idx"),
+            models.Index(fields=["user", "stock_id", "-ts", "-id"], name="trade_user_stock_ts_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}:{self.side} {self.stock_id} {self.quantity}@{self.price}"
+
+
+class CashAccount(models.Model):
+    """Durable copy of the Redis cash ledger, in integer cents"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    balance_cents = models.BigIntegerField()
+    reserved_cents = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.balance_cents / 100:,.2f}"
+
+
+class DailyBar(models.Model):
+    """Local copy of one TWSE/TPEx daily OHLCV bar (twstock's Data tuple)"""
+    stock_id = models.CharField(max_length=10)
+    date = models.DateField()
+    capacity = models.BigIntegerField()  # shares traded
+    turnover = models.BigIntegerField()  # value traded, NT$
+    # None when the symbol did not trade that day
+    open = models.FloatField(null=True)
+    high = models.FloatField(null=True)
+    low = models.FloatField(null=True)
+    close = models.FloatField(null=True)
+    change = models.FloatField()
+    transaction = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["stock_id", "date"], name="unique_bar_per_stock_date"),
+        ]
+
+    def __str__(self):
+        return f"{self.stock_id} {self.date} {self.close}"
+
+
+class Order(models.Model):
+    """Resting limit/stop order; open orders are also indexed by price in Redis"""
+    LIMIT = "LIMIT"
+    STOP = "STOP"
+    TYPE_CHOICES = [(LIMIT, "LIMIT"), (STOP, "STOP")]
+
+    OPEN = "OPEN"
+    FILLED = "FILLED"
+    CANCELLED = "CANCELLED"
+    REJECTED = "REJECTED"
+    STATUS_CHOICES = [(OPEN, "OPEN"), (FILLED, "FILLED"), (CANCELLED, "CANCELLED"), (REJECTED, "REJECTED")]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    stock_id = models.CharField(max_length=10)
+    side = models.CharField(max_length=4, choices=TradeHistory.SIDE_CHOICES)
+    order_type = models.CharField(max_length=5, choices=TYPE_CHOICES)
+    price = models.FloatField()  # limit price, or stop trigger price
+    quantity = models.IntegerField()
+    reserved_cents = models.BigIntegerField(default=0)  # cash held back for buys
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default=OPEN)
+    fill_price = models.FloatField(null=True, blank=True)
+    reason = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "status", "-created_at"], name="order_user_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}:{self.order_type} {self.side} {self.stock_id} {self.quantity}@{self.price} {self.status}"
+
+
+class EquitySnapshot(models.Model):
+    """A user's cash and marked-to-close positions at the end of one trading day"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    date = models.DateField()
+    # Every trade up to this instant is reflected; the next snapshot starts here
+    as_of = models.DateTimeField()
+    cash_cents = models.BigIntegerField()  # available plus reserved
+    market_value_cents = models.BigIntegerField()
+    # {stock_id: {"quantity": shares, "price": close or null when unpriced}}
+    positions = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "date"], name="unique_snapshot_per_user_date"),
+        ]
+
+    @property
+    def equity_cents(self) -> int:
+        return self.cash_cents + self.market_value_cents
 
     def __str__(self):
-        return f"{self.user.username}:{self.side} {self.stock_id} {self.quantity}@{self.price}"
\ No newline at end of file
+        return f"{self.user.username} {self.date}: {self.equity_cents / 100:,.2f}"
@@ -0,0 +1,10 @@
+# api/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class TradeHistoryCursorPagination(CursorPagination):
+    """Keyset pagination over (ts, id), newest first"""
+    ordering = ("-ts", "-id")
+    page_size = 50
+    page_size_query_param = "limit"
+    max_page_size = 200
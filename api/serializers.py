@@ -1,7 +1,10 @@
 # api/serializers.py
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import VirtualHolding, TradeHistory
+from .models import EquitySnapshot, Order, VirtualHolding, TradeHistory
+from .utils.backtest import STRATEGIES
+from .utils.leaderboard import LEADERBOARD_LIMIT_MAX
+from .utils.stock_codes import SEARCH_LIMIT_MAX, is_valid_stock_id
 
 # ---------- Auth ----------
 class RegisterSerializer(serializers.ModelSerializer):
@@ -32,6 +35,75 @@ class TradeHistorySerializer(serializers.ModelSerializer):
         fields = ("id", "stock_id", "side", "price", "quantity", "ts")
 
 
+class OrderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = (
+            "id", "stock_id", "side", "order_type", "price", "quantity",
+            "status", "fill_price", "reason", "created_at", "updated_at",
+        )
+
+
+class PlaceOrderSerializer(serializers.Serializer):
+    stock_id = serializers.CharField(max_length=10)
+    side = serializers.ChoiceField(choices=TradeHistory.SIDE_CHOICES)
+    order_type = serializers.ChoiceField(choices=Order.TYPE_CHOICES)
+    price = serializers.FloatField(min_value=0.00001)
+    quantity = serializers.IntegerField(min_value=1)
+
+    def validate_stock_id(self, value):
+        value = value.strip()
+        if not is_valid_stock_id(value):
+            raise serializers.ValidationError("Unknown stock ID")
+        return value
+
+
+class OrderFilterSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    stock_id = serializers.CharField(max_length=10, required=False)
+
+
+class EquitySnapshotSerializer(serializers.ModelSerializer):
+    cash = serializers.SerializerMethodField()
+    market_value = serializers.SerializerMethodField()
+    equity = serializers.SerializerMethodField()
+
+    class Meta:
+        model = EquitySnapshot
+        fields = ("date", "cash", "market_value", "equity", "positions")
+
+    def get_cash(self, obj):
+        return obj.cash_cents / 100
+
+    def get_market_value(self, obj):
+        return obj.market_value_cents / 100
+
+    def get_equity(self, obj):
+        return obj.equity_cents / 100
+
+
+class DateRangeSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if "start" in attrs and "end" in attrs and attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("start must not be after end")
+        return attrs
+
+
+class TradeHistoryFilterSerializer(serializers.Serializer):
+    stock_id = serializers.CharField(max_length=10, required=False)
+    side = serializers.ChoiceField(choices=TradeHistory.SIDE_CHOICES, required=False)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if "start" in data and "end" in data and data["start"] > data["end"]:
+            raise serializers.ValidationError("start must not be after end")
+        return data
+
+
 class BuySerializer(serializers.Serializer):
     stock_id = serializers.CharField()
     buy_price = serializers.FloatField(min_value=0.00001)
@@ -49,9 +121,10 @@ class AnalyzeSerializer(serializers.Serializer):
     prompt = serializers.CharField(max_length=1000, required=True)
     
     def validate_stock_id(self, value):
-        """Validate Taiwan stock ID format"""
-        if not value.isdigit() or len(value) != 4:
-            raise serializers.ValidationError("Stock ID must be a 4-digit number")
+        """Validate against the listed TWSE/TPEx codes (ETFs included)"""
+        value = value.strip()
+        if not is_valid_stock_id(value):
+            raise serializers.ValidationError("Unknown stock ID")
         return value
     
     def validate_prompt(self, value):
@@ -62,4 +135,84 @@ class AnalyzeSerializer(serializers.Serializer):
 
 
 class PriceLookupSerializer(serializers.Serializer):
-    stock_id = serializers.CharField()
\ No newline at end of file
+    stock_id = serializers.CharField()
+
+
+class BatchPriceLookupSerializer(serializers.Serializer):
+    stock_ids = serializers.ListField(
+        child=serializers.CharField(max_length=10),
+        allow_empty=False,
+        max_length=50,
+    )
+
+    def validate_stock_ids(self, value):
+        """Drop blanks and duplicates while keeping request order"""
+        stock_ids = list(dict.fromkeys(v.strip() for v in value if v.strip()))
+        if not stock_ids:
+            raise serializers.ValidationError("At least one stock ID is required")
+        return stock_ids
+
+
+class BatchAnalyzeSerializer(serializers.Serializer):
+    # Omitted or empty: analyze every symbol currently held
+    stock_ids = serializers.ListField(
+        child=serializers.CharField(max_length=10),
+        required=False,
+        max_length=50,
+    )
+    prompt = serializers.CharField(max_length=1000, required=False, allow_blank=True)
+
+    def validate_stock_ids(self, value):
+        """Drop blanks and duplicates while keeping request order; reject unlisted codes"""
+        stock_ids = list(dict.fromkeys(v.strip() for v in value if v.strip()))
+        unknown = [sid for sid in stock_ids if not is_valid_stock_id(sid)]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown stock ID: {', '.join(unknown)}")
+        return stock_ids
+
+
+class BacktestSerializer(serializers.Serializer):
+    stock_ids = serializers.ListField(
+        child=serializers.CharField(max_length=10),
+        allow_empty=False,
+        max_length=50,
+    )
+    strategy = serializers.ChoiceField(choices=STRATEGIES)
+    # Strategy parameters; unused ones are ignored
+    fast = serializers.IntegerField(min_value=1, required=False)
+    slow = serializers.IntegerField(min_value=2, required=False)
+    period = serializers.IntegerField(min_value=2, required=False)
+    lower = serializers.FloatField(min_value=0, max_value=100, required=False)
+    upper = serializers.FloatField(min_value=0, max_value=100, required=False)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    initial_cash = serializers.FloatField(min_value=1, default=1_000_000.0)
+
+    def validate_stock_ids(self, value):
+        """Drop blanks and duplicates while keeping request order"""
+        stock_ids = list(dict.fromkeys(v.strip() for v in value if v.strip()))
+        if not stock_ids:
+            raise serializers.ValidationError("At least one stock ID is required")
+        return stock_ids
+
+    def validate(self, data):
+        if data.get("fast", 5) >= data.get("slow", 20):
+            raise serializers.ValidationError("fast must be shorter than slow")
+        if data.get("lower", 30) >= data.get("upper", 70):
+            raise serializers.ValidationError("lower must be below upper")
+        if data.get("start") and data.get("end") and data["start"] > data["end"]:
+            raise serializers.ValidationError("start must be on or before end")
+        data["strategy"] = {
+            "type": data["strategy"],
+            **{k: data.pop(k) for k in ("fast", "slow", "period", "lower", "upper") if k in data},
+        }
+        return data
+
+
+class StockSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=50)
+    limit = serializers.IntegerField(min_value=1, max_value=SEARCH_LIMIT_MAX, default=10)
+
+
+class LeaderboardSerializer(serializers.Serializer):
+    limit = serializers.IntegerField(min_value=1, max_value=LEADERBOARD_LIMIT_MAX, default=10)
@@ -1,28 +1,77 @@
 # api/tasks.py
-from celery import shared_task
-from twstock import Stock, BestFourPoint
-import httpx
+from celery import chord, group, shared_task
+from celery.signals import worker_process_init, worker_process_shutdown
 import os
-from django.core.cache import cache
 import logging
 import asyncio
 import json
 
+from django.core.cache import cache
+
+from .utils.analysis_cache import analysis_key, release_inflight, store_analysis
+from .utils.analysis_events import publish_analysis_event, publish_token
+from .utils import mcp_client
+from .utils.backtest import backtest_many, chunk_symbols, combine_results
+from .utils.equity import snapshot_equity
+from .utils.price_history import append_daily_bars, load_histories, symbols_with_bars
+from .utils.quote_cache import get_quote
+from .utils.realtime import ingest
+from .utils import leaderboard, order_book
+from .utils.market_hours import is_market_open
+from .utils.signal_cache import get_signal, refresh_due, refresh_signal, refresh_signals, tracked_symbols
+from .utils.sync_holdings import flush_dirty_cash, flush_dirty_holdings
+from .utils.trade_journal import flush_journal
+
 logger = logging.getLogger(__name__)
 
 CLAUDE_URL = os.getenv("MCP_CLAUDE_URL", "http://mcp:5001/claude")
 GEMINI_URL = os.getenv("MCP_GEMINI_URL", "http://mcp:5001/gemini")
+CLAUDE_STREAM_URL = os.getenv("MCP_CLAUDE_STREAM_URL", f"{CLAUDE_URL}/stream")
+GEMINI_STREAM_URL = os.getenv("MCP_GEMINI_STREAM_URL", f"{GEMINI_URL}/stream")
+
+REALTIME_LOCK_KEY = "realtime:lock"
+REALTIME_LOCK_TTL = 30
+
+# Symbols per consolidated prompt in a batch analysis, bounding prompt size
+BATCH_PROMPT_SIZE = int(os.getenv("ANALYZE_BATCH_PROMPT_SIZE", 10))
+
+
+@worker_process_init.connect
+def _open_mcp_client(**kwargs):
+    mcp_client.start()
+
+
+@worker_process_shutdown.connect
+def _close_mcp_client(**kwargs):
+    mcp_client.stop()
 
 
 async def _call(url: str, prompt: str):
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.post(url, json={"prompt": prompt})
+    r = await mcp_client.get_client().post(url, json={"prompt": prompt})
+    r.raise_for_status()
+    return r.json()
+
+
+async def _call_stream(url: str, prompt: str, provider: str, task_id: str):
+    """Relay partial completions to the task's pub/sub channel as they arrive"""
+    parts = []
+    async with mcp_client.get_client().stream("POST", url, json={"prompt": prompt}) as r:
         r.raise_for_status()
-        return r.json()
+        async for text in r.aiter_text():
+            if not text:
+                continue
+            parts.append(text)
+            publish_token(task_id, provider, text)
+    return {"result": "".join(parts)}
 
 
-async def _llm_batch(prompt: str):
+async def _llm_batch(prompt: str, task_id: str = None):
     # 真正的 coroutine
+    if task_id:
+        return await asyncio.gather(
+            _call_stream(CLAUDE_STREAM_URL, prompt, "claude", task_id),
+            _call_stream(GEMINI_STREAM_URL, prompt, "gemini", task_id),
+        )
     return await asyncio.gather(
         _call(CLAUDE_URL, prompt),
         _call(GEMINI_URL, prompt),
@@ -32,26 +81,22 @@ async def _llm_batch(prompt: str):
 def get_stock_info(stock_id: str):
     """Get comprehensive stock information"""
     try:
-        stock = Stock(stock_id)
-        bfp = BestFourPoint(stock)
-        
+        quote = get_quote(stock_id)
+        if quote["status"] != "success":
+            raise ValueError(quote.get("error", "quote unavailable"))
+
         # Get price data
-        current_price = stock.price[-1] if stock.price else None
-        open_price = stock.open[-1] if stock.open else current_price
-        high_price = stock.high[-1] if stock.high else current_price
-        low_price = stock.low[-1] if stock.low else current_price
-        volume = stock.capacity[-1] if stock.capacity else 0
-        
-        # Calculate price change
-        change = 0
-        change_percent = 0
-        if len(stock.price) >= 2:
-            previous_price = stock.price[-2]
-            change = current_price - previous_price
-            change_percent = (change / previous_price) * 100 if previous_price > 0 else 0
-        
-        # Technical analysis
-        best_four_point = bfp.best_four_point()
+        current_price = quote["price"]
+        open_price = quote["open"]
+        high_price = quote["high"]
+        low_price = quote["low"]
+        volume = quote["volume"]
+        change = quote["change"]
+        change_percent = quote["change_percent"]
+
+        # Technical analysis, precomputed by precompute_signals when tracked
+        signal = get_signal(stock_id) or refresh_signal(stock_id)
+        best_four_point = signal["best_four_point"]
         buy_signal = any(best_four_point) if best_four_point else None
         sell_signal = False  # You can implement sell signal logic here
         
@@ -77,6 +122,24 @@ def get_stock_info(stock_id: str):
         }
 
 
+def format_stock_context(stock_id: str, tw_result: dict) -> str:
+    """Summary block describing one stock for an LLM prompt"""
+    return f"""
+股票代號: {stock_id}
+當前股價: NT${tw_result.get('price', 'N/A')}
+今日漲跌: {tw_result.get('change', 0):.2f} ({tw_result.get('change_percent', 0):.2f}%)
+成交量: {tw_result.get('volume', 'N/A')}
+技術指標: {'買進信號' if tw_result.get('buy') else '無明確信號'}
+"""
+
+
+def _answered(raw_response) -> bool:
+    """True when an LLM call returned actual text rather than an empty result"""
+    if not isinstance(raw_response, dict):
+        return bool(raw_response)
+    return bool((raw_response.get("response") or raw_response.get("result") or "").strip())
+
+
 def format_ai_response(raw_response, ai_name):
     """Format AI response to be more human-readable"""
     try:
@@ -108,20 +171,14 @@ def format_ai_response(raw_response, ai_name):
 
 
 @shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=5, max_retries=3)
-def analyze_stock(self, stock_id: str, custom_prompt: str = None):
+def analyze_stock(self, stock_id: str, custom_prompt: str = None, cache_key: str = None):
     logger.info("Analyze stock %s with custom prompt: %s", stock_id, custom_prompt)
 
     # Get comprehensive stock information
     tw_result = get_stock_info(stock_id)
     
     # Build context-rich prompt for AI
-    stock_context = f"""
-股票代號: {stock_id}
-當前股價: NT${tw_result.get('price', 'N/A')}
-今日漲跌: {tw_result.get('change', 0):.2f} ({tw_result.get('change_percent', 0):.2f}%)
-成交量: {tw_result.get('volume', 'N/A')}
-技術指標: {'買進信號' if tw_result.get('buy') else '無明確信號'}
-"""
+    stock_context = format_stock_context(stock_id, tw_result)
 
     # Use custom prompt if provided, otherwise use default
     if custom_prompt:
@@ -154,9 +211,12 @@ def analyze_stock(self, stock_id: str, custom_prompt: str = None):
 
 請用繁體中文回答，語氣專業但易懂。"""
 
+    answered = False
     try:
         # Call AI services
-        claude_json, gemini_json = asyncio.run(_llm_batch(prompt))
+        # Streams tokens to listening clients when running as a task
+        claude_json, gemini_json = mcp_client.run(_llm_batch(prompt, self.request.id))
+        answered = _answered(claude_json) and _answered(gemini_json)
         
         # Format responses to be human-readable
         claude_formatted = format_ai_response(claude_json, "Claude")
@@ -183,9 +243,242 @@ def analyze_stock(self, stock_id: str, custom_prompt: str = None):
         "analysis_type": "custom" if custom_prompt else "default"
     }
     
-    # Cache the result for 30 minutes
-    cache_key = f"analyze:{stock_id}:{hash(custom_prompt or 'default')}"
-    cache.set(cache_key, result, 60 * 30)
+    # Cache the result for 30 minutes under a process-independent key; a
+    # fallback (LLM or TWSE failure) is only delivered to this task's clients
+    digest = cache_key or analysis_key(stock_id, custom_prompt, tw_result)
+    if answered and "error" not in tw_result:
+        store_analysis(digest, self.request.id, result)
+    else:
+        release_inflight(digest)
+
+    # Push to clients streaming this task instead of polling for it
+    if self.request.id:
+        publish_analysis_event(self.request.id, "done", {"result": result})
     
     logger.info("Analysis completed for stock %s", stock_id)
-    return result
\ No newline at end of file
+    return result
+
+
+@shared_task
+def persist_dirty_holdings(batch_size: int = 500):
+    """Celery beat write-behind job: flush changed holdings to Postgres"""
+    flushed = 0
+    while True:
+        count = flush_dirty_holdings(batch_size)
+        flushed += count
+        if count < batch_size:
+            break
+    if flushed:
+        logger.info("Persisted holdings for %d users", flushed)
+    return flushed
+
+
+@shared_task
+def persist_dirty_cash(batch_size: int = 500):
+    """Celery beat write-behind job: flush changed cash balances to Postgres"""
+    flushed = 0
+    while True:
+        count = flush_dirty_cash(batch_size)
+        flushed += count
+        if count < batch_size:
+            break
+    if flushed:
+        logger.info("Persisted cash for %d users", flushed)
+    return flushed
+
+
+@shared_task
+def flush_trade_journal():
+    """Celery beat job: bulk-insert journaled trades into TradeHistory"""
+    flushed = flush_journal(wait=0)
+    if flushed:
+        logger.info("Flushed %d journaled trades", flushed)
+    return flushed
+
+
+@shared_task
+def precompute_signals(force: bool = False):
+    """Celery beat job: refresh BestFourPoint signals for tracked symbols
+
+    Runs on a fixed interval; recomputes throughout the session and once
+    more after the close has settled, then idles until the next open.
+    """
+    if not force and not refresh_due():
+        return 0
+    stock_ids = tracked_symbols()
+    signals = refresh_signals(stock_ids)
+    logger.info("Precomputed signals for %d/%d symbols", len(signals), len(stock_ids))
+    return len(signals)
+
+
+@shared_task
+def append_history():
+    """Celery beat job: append settled daily bars for tracked symbols
+
+    Only symbols behind the last settled close reach upstream, so runs
+    between closes cost a single query.
+    """
+    appended = append_daily_bars(tracked_symbols())
+    if appended:
+        logger.info("Appended %d daily bars", appended)
+    return appended
+
+
+@shared_task
+def snapshot_daily_equity():
+    """Celery beat job: one equity snapshot per user for the last settled trading day
+
+    Users already snapshotted for that day are skipped, so running this
+    more often than daily only costs a query.
+    """
+    written = snapshot_equity()
+    if written:
+        logger.info("Wrote %d equity snapshots", written)
+    return written
+
+
+@shared_task
+def ingest_realtime_quotes(force: bool = False):
+    """Celery beat job: poll realtime ticks for tracked symbols in session
+
+    Price moves then fill any resting orders they cross and re-mark their
+    holders on the leaderboard. Skipped while a previous run still holds
+    the lock, so a slow upstream cannot stack up overlapping polls.
+    """
+    if not force and not is_market_open():
+        return 0
+    if not cache.add(REALTIME_LOCK_KEY, 1, REALTIME_LOCK_TTL):
+        return 0
+    try:
+        changed = ingest(tracked_symbols())
+        filled = order_book.match_ticks(changed)
+        if filled:
+            logger.info("Filled %d resting orders", filled)
+        leaderboard.mark_prices(changed)
+        return len(changed)
+    finally:
+        cache.delete(REALTIME_LOCK_KEY)
+
+
+@shared_task
+def rebuild_leaderboard():
+    """Celery beat job: recompute all leaderboard scores to correct any drift"""
+    return leaderboard.rebuild_leaderboard()
+
+
+@shared_task
+def rebuild_order_book():
+    """Celery beat job: reconcile the order index with open orders in Postgres
+
+    Holds the realtime lock so no fill is in flight while it runs; skipped
+    (until the next beat) when a poll holds it.
+    """
+    if not cache.add(REALTIME_LOCK_KEY, 1, REALTIME_LOCK_TTL):
+        return 0
+    try:
+        return order_book.rebuild_order_book()
+    finally:
+        cache.delete(REALTIME_LOCK_KEY)
+
+
+@shared_task(bind=True)
+def run_backtest(self, stock_ids, strategy, start=None, end=None, initial_cash=1_000_000.0):
+    """Replay stored daily bars for ``strategy`` across ``stock_ids``
+
+    ``start``/``end`` are ISO dates. Symbols without stored history are
+    reported as missing instead of failing the run. Larger runs are
+    replaced by a chord of ``backtest_chunk`` tasks, one per symbol chunk,
+    so they spread across worker processes; the result stays under this
+    task's id.
+    """
+    present = symbols_with_bars(stock_ids, start, end)
+    missing = [sid for sid in dict.fromkeys(stock_ids) if sid not in present]
+    allocation = initial_cash / max(1, len(present))
+    chunks = chunk_symbols(present)
+    logger.info("Backtest %s over %d symbols in %d chunks", strategy["type"], len(present), len(chunks))
+    if len(chunks) == 1:
+        results = backtest_chunk(present, strategy, start, end, allocation)
+        return combine_backtest([results], present, strategy, initial_cash, missing)
+    return self.replace(chord(
+        group(backtest_chunk.s(chunk, strategy, start, end, allocation) for chunk in chunks),
+        combine_backtest.s(present, strategy, initial_cash, missing),
+    ))
+
+
+@shared_task
+def backtest_chunk(stock_ids, strategy, start, end, allocation):
+    """Header task of a backtest chord; loads and replays its own symbols"""
+    return backtest_many(load_histories(stock_ids, start=start, end=end), strategy, allocation)
+
+
+@shared_task
+def combine_backtest(chunk_results, stock_ids, strategy, initial_cash, missing):
+    """Chord callback: merge per-chunk results into one backtest report"""
+    results = [r for chunk in chunk_results for r in chunk]
+    report = combine_results(results, stock_ids, strategy, initial_cash)
+    report["missing"] = missing
+    return report
+
+
+@shared_task
+def gather_stock_info(stock_id: str):
+    """Per-symbol header of a batch analysis chord"""
+    return {"stock_id": stock_id, **get_stock_info(stock_id)}
+
+
+def _batch_prompt(infos, custom_prompt: str = None) -> str:
+    context = "\n".join(format_stock_context(info["stock_id"], info) for info in infos)
+    stock_ids = "、".join(info["stock_id"] for info in infos)
+    question = f"用戶特定問題: {custom_prompt}" if custom_prompt else "請針對整體投資組合提供分析"
+    return f"""請以專業投資顧問的角度，綜合分析以下台股: {stock_ids}。
+
+各股票基本資訊:
+{context}
+
+{question}
+
+請提供詳細、實用的投資建議，包括:
+1. 逐檔的技術面重點
+2. 各股票之間的比較與配置建議
+3. 整體風險評估
+4. 具體建議
+
+請用繁體中文回答，語氣專業但易懂。"""
+
+
+async def _llm_batch_many(prompts):
+    return await asyncio.gather(*(_llm_batch(prompt) for prompt in prompts), return_exceptions=True)
+
+
+@shared_task(bind=True)
+def analyze_batch(self, infos, custom_prompt: str = None):
+    """Chord callback: one consolidated prompt per BATCH_PROMPT_SIZE symbols"""
+    chunks = [infos[i:i + BATCH_PROMPT_SIZE] for i in range(0, len(infos), BATCH_PROMPT_SIZE)]
+    logger.info("Batch analysis of %d stocks in %d prompts", len(infos), len(chunks))
+
+    responses = mcp_client.run(_llm_batch_many([_batch_prompt(chunk, custom_prompt) for chunk in chunks]))
+
+    analyses = []
+    for chunk, response in zip(chunks, responses):
+        if isinstance(response, Exception):
+            logger.error("Error calling LLM services: %s", str(response))
+            claude_json = gemini_json = None
+            claude_formatted = "Claude 分析服務暫時無法使用，請稍後再試。"
+            gemini_formatted = "Gemini 分析服務暫時無法使用，請稍後再試。"
+        else:
+            claude_json, gemini_json = response
+            claude_formatted = format_ai_response(claude_json, "Claude")
+            gemini_formatted = format_ai_response(gemini_json, "Gemini")
+        analyses.append({
+            "stock_ids": [info["stock_id"] for info in chunk],
+            "claude": {"response": claude_formatted, "raw": claude_json},
+            "gemini": {"response": gemini_formatted, "raw": gemini_json},
+        })
+
+    return {
+        "stock_ids": [info["stock_id"] for info in infos],
+        "prompt": custom_prompt or "投資組合綜合分析",
+        "twstock": {info["stock_id"]: info for info in infos},
+        "analyses": analyses,
+        "analysis_type": "batch",
+    }
@@ -5,6 +5,9 @@ from django.contrib.auth import get_user_model
 
 @pytest.mark.django_db
 def test_buy_sell_flow():
+    from api.utils import trade_journal
+
+    trade_journal._conn().delete(trade_journal.JOURNAL_STREAM)
     client = APIClient()
 
     # register
@@ -24,13 +27,486 @@ def test_buy_sell_flow():
     # holdings
     r = client.get("/api/holdings/")
     assert r.status_code == 200
-    assert len(r.data) == 1
+    assert len(r.data["holdings"]) == 1
 
     # sell
     r = client.post("/api/trade/sell/", {"stock_id":"2330","sell_price":110,"quantity":1}, format="json")
     assert r.status_code == 200
 
-    # history
+    # cash is written behind: CashAccount catches up on the next flush
+    from api.models import CashAccount
+    from api.utils.sync_holdings import flush_dirty_cash
+    account = CashAccount.objects.get(user__username="t")
+    assert account.balance_cents == 100000000
+    flush_dirty_cash()
+    account.refresh_from_db()
+    assert account.balance_cents == 100001000
+
+    # history: journaled trades are served before they are flushed
     r = client.get("/api/history/")
     assert r.status_code == 200
-    assert len(r.data) == 2  # buy + sell
+    assert [t["side"] for t in r.data["results"]] == ["SELL", "BUY"]
+    assert [t["id"] for t in r.data["results"]] == [None, None]
+
+    trade_journal.flush_journal()
+    r = client.get("/api/history/", {"side": "BUY"})
+    assert len(r.data["results"]) == 1 and r.data["results"][0]["id"] is not None
+
+
+@pytest.mark.django_db
+def test_failed_buy_refunds_cash(monkeypatch):
+    from api import views
+    from api.utils.trading_cache import _cash_key, _conn, get_cash_cents
+
+    user = get_user_model().objects.create_user(username="r", password="p123456")
+    _conn().delete(_cash_key(user.id))
+    start = get_cash_cents(user.id)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("ledger unavailable")
+
+    monkeypatch.setattr(views, "add_user_holding", broken)
+    client = APIClient()
+    client.force_authenticate(user)
+    with pytest.raises(RuntimeError):
+        client.post("/api/trade/buy/", {"stock_id": "2330", "buy_price": 100, "quantity": 1}, format="json")
+    assert get_cash_cents(user.id) == start
+
+
+@pytest.mark.django_db
+def test_history_dates_are_taipei_days():
+    from datetime import datetime
+    from api.models import TradeHistory
+    from api.utils import trade_journal
+    from api.utils.market_hours import TAIPEI_TZ
+
+    trade_journal._conn().delete(trade_journal.JOURNAL_STREAM)
+    user = get_user_model().objects.create_user(username="h", password="p123456")
+    # 07:30 Taipei on the 18th is still the 17th in UTC
+    TradeHistory.objects.create(user=user, stock_id="2330", side="BUY", price=100, quantity=1,
+                                ts=datetime(2025, 7, 18, 7, 30, tzinfo=TAIPEI_TZ))
+    client = APIClient()
+    client.force_authenticate(user)
+    assert len(client.get("/api/history/", {"start": "2025-07-18"}).data["results"]) == 1
+    assert len(client.get("/api/history/", {"end": "2025-07-17"}).data["results"]) == 0
+
+
+def test_market_hours():
+    from datetime import datetime
+    from api.utils.market_hours import TAIPEI_TZ, is_market_open, last_close, next_open
+
+    friday_session = datetime(2025, 7, 18, 10, 0, tzinfo=TAIPEI_TZ)
+    friday_close = datetime(2025, 7, 18, 14, 0, tzinfo=TAIPEI_TZ)
+    assert is_market_open(friday_session)
+    assert not is_market_open(friday_close)
+    assert next_open(friday_close) == datetime(2025, 7, 21, 9, 0, tzinfo=TAIPEI_TZ)
+    monday_morning = datetime(2025, 7, 21, 8, 0, tzinfo=TAIPEI_TZ)
+    assert last_close(monday_morning) == datetime(2025, 7, 18, 13, 30, tzinfo=TAIPEI_TZ)
+
+
+@pytest.mark.django_db
+def test_load_histories_keeps_last_bars():
+    from datetime import date, timedelta
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from api.models import DailyBar
+    from api.utils.price_history import load_histories
+
+    days = [date(2025, 1, 1) + timedelta(days=i) for i in range(200)]
+    DailyBar.objects.bulk_create([
+        DailyBar(stock_id="2330", date=d, capacity=0, turnover=0, close=i, change=0, transaction=0)
+        for i, d in enumerate(days) if d.weekday() < 5
+    ])
+    with CaptureQueriesContext(connection) as queries:
+        closes = load_histories(["2330", "0050"], days=20)
+    assert list(closes["2330"]["close"]) == [i for i, d in enumerate(days) if d.weekday() < 5][-20:]
+    assert len(closes["0050"]["close"]) == 0
+    # Bounded by date, not read in full and sliced
+    assert "date" in queries[-1]["sql"].split("WHERE", 1)[1]
+
+
+def test_indicators_match_twstock():
+    from datetime import datetime, timedelta
+    import numpy as np
+    from twstock import BestFourPoint, Stock
+    from twstock.stock import DATATUPLE
+    from api.utils.indicators import best_four_point, rsi, sma
+
+    rng = np.random.default_rng(0)
+    close = np.round(100 + np.cumsum(rng.normal(0, 1, (50, 40)), axis=1), 2)
+    open_ = np.round(close + rng.normal(0, 1, close.shape), 2)
+    capacity = rng.integers(1000, 5000, close.shape).astype(float)
+
+    vectorized = best_four_point(close, open_, capacity)
+    for row in range(close.shape[0]):
+        stock = Stock("2330", initial_fetch=False)
+        stock.data = [
+            DATATUPLE(datetime(2025, 1, 1) + timedelta(days=t), int(capacity[row, t]), 0,
+                      open_[row, t], 0, 0, close[row, t], 0, 0)
+            for t in range(close.shape[1])
+        ]
+        assert vectorized[row] == BestFourPoint(stock).best_four_point()
+
+    rising = np.arange(1, 40, dtype=float)
+    assert np.isnan(sma(rising, 3)[1]) and sma(rising, 3)[2] == 2
+    assert rsi(rising)[-1] == 100
+
+
+def test_backtest_sma_cross():
+    import numpy as np
+    from api.utils.backtest import COMMISSION_RATE, run_backtests
+
+    close = np.linspace(100, 200, 60)
+    bars = {
+        "date": np.datetime64("2025-01-01") + np.arange(60),
+        "open": close,
+        "close": close,
+        "capacity": np.ones(60),
+    }
+    result = run_backtests({"2330": bars}, {"type": "sma_cross", "fast": 3, "slow": 10}, 100_000)
+    symbol = result["symbols"][0]
+
+    # Fast average overtakes once the slow one exists, then never crosses back
+    assert [t["side"] for t in symbol["trades"]] == ["BUY"]
+    assert 0 < symbol["total_return"] < symbol["buy_and_hold_return"]
+    assert symbol["max_drawdown"] == pytest.approx(-COMMISSION_RATE)
+    assert result["portfolio"]["equity"][-1] == pytest.approx(symbol["equity"][-1])
+
+
+@pytest.mark.django_db
+def test_backtest_task_fans_out_chunks(monkeypatch):
+    from datetime import date, timedelta
+    from api.models import DailyBar
+    from api.tasks import run_backtest
+    from api.utils import backtest
+
+    stock_ids = ["2330", "2317", "2454", "0050"]
+    DailyBar.objects.bulk_create([
+        DailyBar(stock_id=sid, date=date(2025, 1, 1) + timedelta(days=i), capacity=1, turnover=0,
+                 open=100 + i * (k + 1), close=100 + i * (k + 1), change=0, transaction=0)
+        for k, sid in enumerate(stock_ids) for i in range(30)
+    ])
+    monkeypatch.setattr(backtest, "BACKTEST_MAX_WORKERS", 2)
+    chunks = []
+    monkeypatch.setattr("api.tasks.backtest_many", lambda h, *a: chunks.append(list(h)) or backtest.backtest_many(h, *a))
+
+    strategy = {"type": "sma_cross", "fast": 3, "slow": 10}
+    result = run_backtest.apply(args=(stock_ids + ["9999"], strategy), kwargs={"initial_cash": 400_000}).get()
+
+    assert sorted(chunks) == [["2317", "0050"], ["2330", "2454"]]
+    assert [s["stock_id"] for s in result["symbols"]] == stock_ids
+    assert result["missing"] == ["9999"]
+    assert result["portfolio"]["equity"][0] == pytest.approx(400_000)
+
+
+@pytest.mark.django_db
+def test_failed_analysis_is_not_cached(monkeypatch):
+    from api import tasks
+    from api.utils.analysis_cache import claim_inflight, get_cached_analysis
+
+    def down(coro):
+        coro.close()
+        raise ConnectionError("mcp unavailable")
+
+    def answer(coro):
+        coro.close()
+        return {"result": "Looks fairly valued today."}, {"result": "Momentum is improving."}
+
+    monkeypatch.setattr(tasks, "get_stock_info", lambda stock_id: {"price": 100.0})
+    for run, cached in ((down, False), (answer, True)):
+        digest = f"test-{run.__name__}"
+        assert claim_inflight(digest, "first") is None
+        monkeypatch.setattr(tasks.mcp_client, "run", run)
+        tasks.analyze_stock.apply(("2330",), {"cache_key": digest})
+        assert (get_cached_analysis(digest) is not None) == cached
+        # Either way the next identical request starts its own task
+        assert claim_inflight(digest, "second") is None
+
+
+@pytest.mark.django_db
+def test_signals_do_not_watch_unknown_codes():
+    from api.utils.signal_cache import WATCHED_KEY
+    from django_redis import get_redis_connection
+
+    conn = get_redis_connection("default")
+    conn.delete(WATCHED_KEY)
+    user = get_user_model().objects.create_user(username="w", password="p123456")
+    client = APIClient()
+    client.force_authenticate(user)
+    r = client.get("/api/signals/", {"stock_id": "2330,ZZZZ"})
+    assert r.data["unknown"] == ["ZZZZ"]
+    assert {m.decode() for m in conn.zrange(WATCHED_KEY, 0, -1)} <= {"2330"}
+
+    r = client.get("/api/indicators/", {"stock_id": "2330,ZZZZ"})
+    assert r.data["unknown"] == ["ZZZZ"] and "ZZZZ" not in r.data["missing"]
+    assert {m.decode() for m in conn.zrange(WATCHED_KEY, 0, -1)} <= {"2330"}
+
+
+def test_stock_code_index():
+    from api.serializers import AnalyzeSerializer, BatchAnalyzeSerializer
+    from api.utils.stock_codes import is_valid_stock_id, search
+
+    assert is_valid_stock_id("2330") and is_valid_stock_id("0050")
+    assert not is_valid_stock_id("9999")
+    assert search("台積")[0]["stock_id"] == "2330"
+    assert [r["stock_id"] for r in search("005", limit=2)] == ["0050", "0051"]
+    # ETF codes are no longer rejected for not being 4 digits
+    assert AnalyzeSerializer(data={"stock_id": "00646", "prompt": "趨勢?"}).is_valid()
+    assert BatchAnalyzeSerializer(data={"stock_ids": ["2330", "00646"]}).is_valid()
+    assert not BatchAnalyzeSerializer(data={"stock_ids": ["2330", "ZZZZ"]}).is_valid()
+
+
+@pytest.mark.django_db
+def test_realtime_ingest_serves_fresh_ticks():
+    from api.utils.quote_cache import get_quote, get_quotes
+    from api.utils.realtime import FakeQuoteSource, ingest
+
+    source = FakeQuoteSource(start_price=50.0)
+    assert len(ingest(["2330", "0050"], source=source)) == 2
+
+    quote = get_quote("2330")
+    assert quote["source"] == "realtime"
+    assert quote["price"] == source.prices["2330"]
+    assert get_quotes(["0050"])["0050"]["price"] == source.prices["0050"]
+
+
+def test_realtime_source_skips_failed_batches(monkeypatch):
+    from api.utils import realtime
+
+    def get_raw(batch):
+        if batch == ["2330"]:
+            raise ConnectionError("reset by peer")
+        return {"msgArray": [{"c": "0050", "z": "180.5", "v": "12", "y": "179", "tlong": "1752800000000"}]}
+
+    monkeypatch.setattr(realtime, "REALTIME_BATCH_SIZE", 1)
+    monkeypatch.setattr(realtime.realtime, "get_raw", get_raw)
+    ticks = realtime.TwstockRealtimeSource().fetch(["2330", "0050"])
+    assert list(ticks) == ["0050"] and ticks["0050"]["price"] == 180.5
+
+
+@pytest.mark.django_db
+def test_order_book_fills_crossed_orders():
+    from api.models import Order
+    from api.utils import trade_journal
+    from api.utils.order_book import match_ticks
+    from api.utils.trading_cache import get_cash_cents, get_user_holdings
+
+    client = APIClient()
+    client.post("/api/auth/register/", {"username": "o", "password": "p123456"}, format="json")
+    r = client.post("/api/auth/login/", {"username": "o", "password": "p123456"}, format="json")
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {r.data['access']}")
+    user_id = get_user_model().objects.get(username="o").id
+    start = get_cash_cents(user_id)["available"]
+    trade_journal._conn().delete(trade_journal.JOURNAL_STREAM)
+
+    order = {"stock_id": "2330", "side": "BUY", "order_type": "LIMIT", "price": 100, "quantity": 10}
+    r = client.post("/api/orders/", order, format="json")
+    assert r.status_code == 201
+    buy_id = r.data["id"]
+    assert get_cash_cents(user_id) == {"available": start - 100000, "reserved": 100000}
+    r = client.post("/api/orders/", {**order, "price": 90}, format="json")
+    cancel_id = r.data["id"]
+
+    # Above the limit nothing fires; at 95 only the 100 limit is crossed
+    assert match_ticks([{"stock_id": "2330", "price": 101}]) == 0
+    assert match_ticks([{"stock_id": "2330", "price": 95}]) == 1
+    assert Order.objects.get(id=buy_id).fill_price == 95
+    assert get_cash_cents(user_id) == {"available": start - 95000 - 90000, "reserved": 90000}
+    assert get_user_holdings(user_id)[0]["quantity"] == 10
+
+    assert client.delete(f"/api/orders/{cancel_id}/").status_code == 200
+    assert client.delete(f"/api/orders/{buy_id}/").status_code == 409
+    assert get_cash_cents(user_id) == {"available": start - 95000, "reserved": 0}
+
+    # Sell stop at 90 fires once the price falls through it
+    r = client.post("/api/orders/", {**order, "side": "SELL", "order_type": "STOP", "price": 90}, format="json")
+    assert match_ticks([{"stock_id": "2330", "price": 89}]) == 1
+    assert get_user_holdings(user_id) == []
+    assert len(client.get("/api/history/").data["results"]) == 2
+
+    # A balance reset cancels resting orders along with their reserves
+    r = client.post("/api/orders/", order, format="json")
+    assert client.post("/api/balance/", {"reset": True}, format="json").status_code == 200
+    assert Order.objects.get(id=r.data["id"]).status == Order.CANCELLED
+    assert get_cash_cents(user_id) == {"available": start, "reserved": 0}
+
+
+@pytest.mark.django_db
+def test_failed_fill_rolls_back_and_book_reconciles(monkeypatch):
+    from api.models import Order
+    from api.utils import order_book
+    from api.utils.trading_cache import _cash_key, _conn, get_cash_cents
+
+    user = get_user_model().objects.create_user(username="f", password="p123456")
+    conn = _conn()
+    conn.delete(_cash_key(user.id), *conn.keys("orders:2330:*"))
+    start = get_cash_cents(user.id)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("ledger unavailable")
+
+    # Reserve captured and released, then the ledger write fails: all undone
+    order = order_book.place_order(user, "2330", "BUY", Order.LIMIT, 100, 10)
+    with monkeypatch.context() as m:
+        m.setattr(order_book, "add_user_holding", broken)
+        assert order_book.match_ticks([{"stock_id": "2330", "price": 95}]) == 0
+    assert Order.objects.get(id=order.id).status == Order.REJECTED
+    assert get_cash_cents(user.id) == start
+
+    # An open order that fell out of Redis is indexed again
+    order = order_book.place_order(user, "2330", "BUY", Order.LIMIT, 100, 10)
+    conn.delete(*conn.keys("orders:2330:*"))
+    assert order_book.rebuild_order_book() == 1
+    assert order_book.match_ticks([{"stock_id": "2330", "price": 95}]) == 1
+
+
+@pytest.mark.django_db
+def test_trade_journal_flush_is_idempotent():
+    from api.models import TradeHistory
+    from api.utils import trade_journal
+
+    trade_journal._conn().delete(trade_journal.JOURNAL_STREAM)
+    user = get_user_model().objects.create_user(username="j", password="p123456")
+    first = trade_journal.record_trade(user.id, "2330", TradeHistory.BUY, 100.5, 3, ts=1_700_000_000.0)
+    trade_journal.record_trade(user.id, "2330", TradeHistory.SELL, 101, 3)
+
+    # A flusher that read the entries but died before acknowledging them
+    conn = trade_journal._conn()
+    trade_journal._ensure_group(conn)
+    trade_journal._read(conn, ">", 10)
+    TradeHistory.objects.bulk_create([TradeHistory(
+        journal_id=first, user=user, stock_id="2330", side=TradeHistory.BUY, price=100.5, quantity=3,
+    )])
+
+    assert trade_journal.flush_journal() == 2
+    assert trade_journal.flush_journal() == 0
+    rows = list(TradeHistory.objects.order_by("id"))
+    assert [r.side for r in rows] == ["BUY", "SELL"]
+    assert rows[1].price == 101
+    assert conn.xlen(trade_journal.JOURNAL_STREAM) == 0
+
+
+@pytest.mark.django_db
+def test_fifo_lots_and_realized_pnl():
+    from api.models import RealizedPnl
+    from api.utils.sync_holdings import sync_holdings_to_postgres
+    from api.utils.trading_cache import (
+        InsufficientShares, _conn, _key, _lots_key, add_user_holding, get_user_pnl, remove_user_holding,
+    )
+
+    user = get_user_model().objects.create_user(username="f", password="p123456")
+    # Redis outlives the test database; drop any ledger left under a reused id
+    _conn().delete(_key(user.id), _lots_key(user.id, "2330"))
+    add_user_holding(user.id, {"stock_id": "2330", "buy_price": 100, "quantity": 10})
+    add_user_holding(user.id, {"stock_id": "2330", "buy_price": 120, "quantity": 10})
+
+    # 15 shares: all of the 100 lot and half of the 120 lot
+    assert remove_user_holding(user.id, "2330", 15, 130) == (5, 15 * 13000 - 100000 - 60000)
+    pnl = get_user_pnl(user.id)["2330"]
+    assert pnl["avg_cost"] == 120
+    assert pnl["realized_pnl"] == 350
+    with pytest.raises(InsufficientShares):
+        remove_user_holding(user.id, "2330", 6, 130)
+
+    # Realized P&L outlives the position and survives a cold ledger
+    assert remove_user_holding(user.id, "2330", 5, 110) == (0, -5000)
+    sync_holdings_to_postgres(user)
+    assert RealizedPnl.objects.get(user=user, stock_id="2330").realized_cents == 30000
+    _conn().delete(_key(user.id))
+    pnl = get_user_pnl(user.id)["2330"]
+    assert (pnl["quantity"], pnl["realized_pnl"], pnl["sold_quantity"]) == (0, 300, 20)
+
+
+@pytest.mark.django_db
+def test_hydrated_position_is_sold_first():
+    from api.models import VirtualHolding
+    from api.utils.trading_cache import _conn, _key, _lots_key, add_user_holding, remove_user_holding
+
+    user = get_user_model().objects.create_user(username="g", password="p123456")
+    _conn().delete(_key(user.id), _lots_key(user.id, "2330"))
+    VirtualHolding.objects.create(user=user, stock_id="2330", quantity=10, cost_cents=100000, buy_price=100)
+
+    # The cold ledger loads 10 @ 100 as the oldest lot, ahead of the new buy
+    add_user_holding(user.id, {"stock_id": "2330", "buy_price": 200, "quantity": 10})
+    assert remove_user_holding(user.id, "2330", 10, 150) == (10, 150000 - 100000)
+    assert remove_user_holding(user.id, "2330", 10, 150) == (0, 150000 - 200000)
+
+
+@pytest.mark.django_db
+def test_equity_snapshots_roll_forward():
+    from datetime import date, datetime
+    from api.models import DailyBar, EquitySnapshot
+    from api.utils.equity import snapshot_equity
+    from api.utils.market_hours import TAIPEI_TZ
+    from api.utils.trade_journal import record_trade
+    from api.utils.trading_cache import _cash_key, _conn, _key, add_user_holding, debit_cash
+
+    user = get_user_model().objects.create_user(username="e", password="p123456")
+    _conn().delete(_key(user.id), _cash_key(user.id))
+    day1, day2 = date(2025, 7, 17), date(2025, 7, 18)
+    for day, (price, quantity) in ((day1, (100, 10)), (day2, (110, 5))):
+        debit_cash(user.id, price * quantity * 100)
+        add_user_holding(user.id, {"stock_id": "2330", "buy_price": price, "quantity": quantity})
+        record_trade(user.id, "2330", "BUY", price, quantity,
+                     ts=datetime.combine(day, datetime.min.time(), tzinfo=TAIPEI_TZ).timestamp() + 36000)
+    DailyBar.objects.create(stock_id="2330", date=day1, capacity=0, turnover=0, close=105, change=0, transaction=0)
+    DailyBar.objects.create(stock_id="2330", date=day2, capacity=0, turnover=0, close=112, change=0, transaction=0)
+    now = datetime(2025, 7, 18, 20, 0, tzinfo=TAIPEI_TZ)
+
+    # Bootstrapped from the live ledger with day 2's trade undone
+    assert snapshot_equity(day1, now=now) == 1
+    # Rolled forward from day 1 by day 2's trade alone
+    assert snapshot_equity(day2, now=now) == 1
+    assert snapshot_equity(day2, now=now) == 0
+    first, second = EquitySnapshot.objects.filter(user=user).order_by("date")
+    assert (first.cash_cents, first.market_value_cents) == (100000000 - 100000, 105000)
+    assert (second.cash_cents, second.market_value_cents) == (100000000 - 155000, 168000)
+    assert second.positions == {"2330": {"quantity": 15, "price": 112}}
+
+    client = APIClient()
+    client.force_authenticate(user)
+    r = client.get("/api/equity/", {"start": "2025-07-18"})
+    assert [s["equity"] for s in r.data["snapshots"]] == [(100000000 - 155000 + 168000) / 100]
+
+    # A balance reset starts the curve over from the reset cash
+    assert client.post("/api/balance/", {"reset": True}, format="json").status_code == 200
+    assert not EquitySnapshot.objects.filter(user=user).exists()
+    assert snapshot_equity(day2, now=now) == 1
+    assert EquitySnapshot.objects.get(user=user).cash_cents == 100000000
+
+
+@pytest.mark.django_db
+def test_leaderboard_follows_trades_and_ticks():
+    from api.utils import leaderboard
+    from api.utils.trading_cache import (
+        LEADERBOARD_KEY, MARKS_KEY, _cash_key, _conn, _key, add_user_holding, debit_cash, credit_cash,
+        remove_user_holding,
+    )
+
+    alice, bob = (get_user_model().objects.create_user(username=n, password="p123456") for n in ("la", "lb"))
+    conn = _conn()
+    conn.delete(LEADERBOARD_KEY, MARKS_KEY, "symbol:holders:2330", "symbol:holders:2317",
+                *(k for u in (alice, bob) for k in (_key(u.id), _cash_key(u.id))))
+    start = leaderboard.rank_user(alice.id)
+    assert leaderboard.rank_user(bob.id) == start
+
+    def buy(user, sid, price, qty):
+        debit_cash(user.id, price * qty * 100)
+        add_user_holding(user.id, {"stock_id": sid, "buy_price": price, "quantity": qty})
+
+    buy(alice, "2330", 100, 10)
+    buy(bob, "2317", 50, 10)
+    # Marked at the trade price, so buying leaves equity unchanged
+    assert leaderboard.user_rank(alice.id)["equity"] == start / 100
+
+    leaderboard.mark_prices([{"stock_id": "2330", "price": 110}, {"stock_id": "2317", "price": 45}])
+    assert [r["username"] for r in leaderboard.top(2)] == ["la", "lb"]
+    assert leaderboard.user_rank(bob.id) == {"rank": 2, "equity": start / 100 - 50, "total": 2}
+
+    # Selling at 120 realizes 10 more per share than the 110 mark
+    remove_user_holding(alice.id, "2330", 10, 120)
+    credit_cash(alice.id, 120 * 10 * 100)
+    assert leaderboard.user_rank(alice.id)["equity"] == start / 100 + 200
+    assert leaderboard.rebuild_leaderboard() == 2
+    assert leaderboard.user_rank(alice.id)["equity"] == start / 100 + 200
+    assert leaderboard.user_rank(bob.id)["equity"] == start / 100 - 50
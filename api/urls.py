@@ -7,9 +7,22 @@ from .views import (
     SellStockView,
     HoldingsView,
     TradeHistoryView,
+    PnlView,
+    EquityCurveView,
+    LeaderboardView,
     AnalyzeStockView,
     AnalyzeResultView,
+    AnalyzeStreamView,
+    AnalyzeBatchView,
+    AnalyzeBatchResultView,
     StockPriceLookupView,
+    SignalsView,
+    StockSearchView,
+    IndicatorsView,
+    BacktestView,
+    BacktestResultView,
+    OrdersView,
+    OrderDetailView,
     UserBalanceView,
 )
 
@@ -21,8 +34,21 @@ urlpatterns = [
     path("trade/sell/", SellStockView.as_view()),
     path("holdings/", HoldingsView.as_view()),
     path("history/", TradeHistoryView.as_view()),
+    path("pnl/", PnlView.as_view()),
+    path("equity/", EquityCurveView.as_view()),
+    path("leaderboard/", LeaderboardView.as_view()),
+    path("orders/", OrdersView.as_view()),
+    path("orders/<int:order_id>/", OrderDetailView.as_view()),
     path("analyze/", AnalyzeStockView.as_view()),
+    path("analyze/batch/", AnalyzeBatchView.as_view()),
+    path("analyze/batch/<str:group_id>/", AnalyzeBatchResultView.as_view()),
     path("analyze/<str:task_id>/", AnalyzeResultView.as_view()),
+    path("analyze/<str:task_id>/stream/", AnalyzeStreamView.as_view()),
     path("price/", StockPriceLookupView.as_view()),
+    path("signals/", SignalsView.as_view()),
+    path("stocks/search/", StockSearchView.as_view()),
+    path("indicators/", IndicatorsView.as_view()),
+    path("backtest/", BacktestView.as_view()),
+    path("backtest/<str:task_id>/", BacktestResultView.as_view()),
     path("balance/", UserBalanceView.as_view()),  # NEW: User balance endpoint
 ]
\ No newline at end of file
@@ -0,0 +1,79 @@
+# api/utils/analysis_cache.py
+import hashlib
+import json
+from typing import Dict, Optional
+
+from django.core.cache import cache
+
+from .market_hours import taipei_now
+
+RESULT_KEY_FMT = "analyze:{digest}"
+INFLIGHT_KEY_FMT = "analyze:inflight:{digest}"
+
+RESULT_TTL = 60 * 30
+# Long enough to cover an analysis with retries; a crashed task only blocks
+# deduplication for this long
+INFLIGHT_TTL = 60 * 10
+
+
+def normalize_prompt(prompt: Optional[str]) -> str:
+    return " ".join((prompt or "").split()).casefold()
+
+
+def analysis_key(stock_id: str, prompt: Optional[str], quote: Dict) -> str:
+    """Stable content address for an analysis request
+
+    Built from the symbol, the normalized prompt, the trading day and the
+    quote snapshot, so it is identical across processes (unlike hash()).
+    """
+    payload = {
+        "stock_id": stock_id,
+        "prompt": normalize_prompt(prompt),
+        "trading_day": taipei_now().date().isoformat(),
+        "price": quote.get("price"),
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_cached_analysis(digest: str) -> Optional[Dict]:
+    """Returns {"task_id": ..., "result": ...} for a finished analysis"""
+    return cache.get(RESULT_KEY_FMT.format(digest=digest))
+
+
+def store_analysis(digest: str, task_id: str, result: Dict):
+    cache.set(RESULT_KEY_FMT.format(digest=digest), {"task_id": task_id, "result": result}, RESULT_TTL)
+    cache.delete(INFLIGHT_KEY_FMT.format(digest=digest))
+
+
+def release_inflight(digest: str):
+    """Let the next identical request start afresh, caching nothing"""
+    cache.delete(INFLIGHT_KEY_FMT.format(digest=digest))
+
+
+def claim_inflight(digest: str, task_id: str) -> Optional[str]:
+    """Register ``task_id`` as the worker for ``digest``
+
+    Returns None when the claim succeeded, otherwise the id of the task
+    that is already running the same analysis.
+    """
+    key = INFLIGHT_KEY_FMT.format(digest=digest)
+    for _ in range(2):
+        if cache.add(key, task_id, INFLIGHT_TTL):
+            return None
+        existing = cache.get(key)
+        if existing is not None:
+            return existing
+    return None
+
+
+BATCH_KEY_FMT = "analyze:batch:{group_id}"
+
+
+def store_batch(group_id: str, task_id: str, stock_ids):
+    """Remember the chord callback and symbols behind a batch group id"""
+    cache.set(BATCH_KEY_FMT.format(group_id=group_id), {"task_id": task_id, "stock_ids": stock_ids}, RESULT_TTL)
+
+
+def get_batch(group_id: str) -> Optional[Dict]:
+    return cache.get(BATCH_KEY_FMT.format(group_id=group_id))
@@ -0,0 +1,46 @@
+# api/utils/analysis_events.py
+import json
+from typing import Dict
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis import asyncio as aioredis
+
+# One pub/sub channel per analysis task; every client waiting on the task
+# (including deduplicated requests) subscribes to the same channel
+CHANNEL_FMT = "analysis:{task_id}"
+# Token events published so far, so a client that subscribes mid-stream can
+# replay what it missed; each event carries its 1-based ``seq`` in this list
+TOKENS_KEY_FMT = "analysis:{task_id}:tokens"
+TOKENS_TTL = 30 * 60
+
+
+def channel_name(task_id: str) -> str:
+    return CHANNEL_FMT.format(task_id=task_id)
+
+
+def tokens_key(task_id: str) -> str:
+    return TOKENS_KEY_FMT.format(task_id=task_id)
+
+
+def _message(event: str, payload: Dict) -> str:
+    return json.dumps({"event": event, **payload}, ensure_ascii=False, default=str)
+
+
+def publish_analysis_event(task_id: str, event: str, payload: Dict):
+    get_redis_connection("default").publish(channel_name(task_id), _message(event, payload))
+
+
+def publish_token(task_id: str, provider: str, text: str):
+    """Buffer one partial completion, then publish it with its sequence number"""
+    conn = get_redis_connection("default")
+    pipe = conn.pipeline()
+    pipe.rpush(tokens_key(task_id), _message("token", {"provider": provider, "text": text}))
+    pipe.expire(tokens_key(task_id), TOKENS_TTL)
+    seq, _ = pipe.execute()
+    conn.publish(channel_name(task_id), _message("token", {"provider": provider, "text": text, "seq": seq}))
+
+
+def async_redis():
+    """asyncio client on the same Redis as the default cache"""
+    return aioredis.Redis.from_url(settings.CACHES["default"]["LOCATION"])
@@ -0,0 +1,176 @@
+# api/utils/backtest.py
+"""Vectorized daily-bar backtests over plain NumPy arrays
+
+Kept free of Django imports; the caller loads histories (see
+price_history) and passes arrays in. Large runs are split with
+``chunk_symbols`` and each chunk becomes its own Celery task (see
+tasks.run_backtest), so chunks run in parallel across worker processes.
+"""
+import math
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .indicators import best_four_point_checks, macd, rsi, sma
+
+TRADING_DAYS_PER_YEAR = 252
+# TWSE costs: broker commission on both sides, securities transaction tax on sells
+COMMISSION_RATE = 0.001425
+SELL_TAX_RATE = 0.003
+
+# Most chunks (parallel tasks) one backtest is split into
+BACKTEST_MAX_WORKERS = int(os.getenv("BACKTEST_WORKERS", os.cpu_count() or 1))
+# Below this many symbols, dispatching tasks costs more than it saves
+PARALLEL_MIN_SYMBOLS = 4
+
+STRATEGIES = ("sma_cross", "macd_cross", "rsi", "best_four_point")
+
+
+def target_position(strategy: Dict, bars: Dict[str, np.ndarray]) -> np.ndarray:
+    """Desired long (1) / flat (0) exposure at each bar's close"""
+    close = bars["close"]
+    kind = strategy["type"]
+    if kind == "sma_cross":
+        return (sma(close, strategy.get("fast", 5)) > sma(close, strategy.get("slow", 20))).astype(float)
+    if kind == "macd_cross":
+        line, signal, _ = macd(close)
+        return (line > signal).astype(float)
+    if kind == "rsi":
+        # Enter when oversold, hold until overbought
+        value = rsi(close, strategy.get("period", 14))
+        entries = value < strategy.get("lower", 30)
+        exits = value > strategy.get("upper", 70)
+        return _hold_between(entries, exits)
+    if kind == "best_four_point":
+        buy, sell = best_four_point_checks(close, bars["open"], bars["capacity"])
+        buy_now = buy.any(axis=0)
+        return _hold_between(buy_now, sell.any(axis=0) & ~buy_now)
+    raise ValueError(f"Unknown strategy type: {kind}")
+
+
+def _hold_between(entries: np.ndarray, exits: np.ndarray) -> np.ndarray:
+    """1 from an entry bar until the next exit bar, via forward-filled events"""
+    events = np.where(entries, 1.0, np.where(exits, 0.0, np.nan))
+    idx = np.where(~np.isnan(events), np.arange(len(events)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    filled = events[idx]
+    return np.nan_to_num(filled, nan=0.0)
+
+
+def _max_drawdown(equity: np.ndarray) -> float:
+    if not len(equity):
+        return 0.0
+    return float((equity / np.maximum.accumulate(equity) - 1).min())
+
+
+def _sharpe(returns: np.ndarray) -> Optional[float]:
+    std = returns.std()
+    if len(returns) < 2 or std == 0:
+        return None
+    return float(returns.mean() / std * math.sqrt(TRADING_DAYS_PER_YEAR))
+
+
+def backtest_symbol(stock_id: str, bars: Dict[str, np.ndarray], strategy: Dict, initial_cash: float) -> Dict:
+    """Long-only replay of one symbol, trading at the close a signal appears
+
+    Each bar earns the close-to-close return on the position held since
+    the previous close, less commission and sell tax on position changes.
+    """
+    close = bars["close"]
+    dates = bars["date"]
+    if len(close) < 2:
+        return {"stock_id": stock_id, "error": "Not enough history"}
+
+    target = target_position(strategy, bars)
+    position = np.zeros_like(target)
+    position[1:] = target[:-1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        asset_returns = np.nan_to_num(np.diff(close, prepend=close[0]) / np.roll(close, 1), nan=0.0)
+    asset_returns[0] = 0.0
+    turnover = np.abs(np.diff(target, prepend=0.0))
+    costs = turnover * COMMISSION_RATE + np.where(np.diff(target, prepend=0.0) < 0, SELL_TAX_RATE, 0.0)
+    returns = position * asset_returns - costs
+    equity = initial_cash * np.cumprod(1 + returns)
+
+    changes = np.flatnonzero(np.diff(target, prepend=0.0))
+    trades = [
+        {
+            "date": str(dates[i]),
+            "side": "BUY" if target[i] > 0 else "SELL",
+            "price": float(close[i]),
+        }
+        for i in changes
+    ]
+    round_trips = [
+        trades[k + 1]["price"] / trades[k]["price"] - 1
+        for k in range(0, len(trades) - 1, 2)
+    ]
+
+    return {
+        "stock_id": stock_id,
+        "dates": [str(d) for d in dates],
+        "position": position.tolist(),
+        "equity": equity.tolist(),
+        "trades": trades,
+        "total_return": float(equity[-1] / initial_cash - 1),
+        "buy_and_hold_return": float(close[-1] / close[0] - 1) if close[0] else None,
+        "max_drawdown": _max_drawdown(equity),
+        "sharpe": _sharpe(returns[1:]),
+        "win_rate": float(np.mean(np.array(round_trips) > 0)) if round_trips else None,
+        "exposure": float(position.mean()),
+    }
+
+
+def chunk_symbols(stock_ids: List[str], workers: Optional[int] = None) -> List[List[str]]:
+    """Split symbols into one chunk per worker; small runs stay in one chunk"""
+    workers = min(workers or BACKTEST_MAX_WORKERS, len(stock_ids))
+    if workers <= 1 or len(stock_ids) < PARALLEL_MIN_SYMBOLS:
+        return [list(stock_ids)]
+    return [stock_ids[i::workers] for i in range(workers)]
+
+
+def backtest_many(histories: Dict[str, Dict[str, np.ndarray]], strategy: Dict, allocation: float) -> List[Dict]:
+    return [backtest_symbol(sid, bars, strategy, allocation) for sid, bars in histories.items()]
+
+
+def combine_results(results: List[Dict], stock_ids: List[str], strategy: Dict, initial_cash: float) -> Dict:
+    """Per-symbol results from any number of chunks, in ``stock_ids`` order, plus the portfolio"""
+    by_symbol = {r["stock_id"]: r for r in results}
+    return {
+        "strategy": strategy,
+        "initial_cash": initial_cash,
+        "symbols": [by_symbol[sid] for sid in stock_ids],
+        "portfolio": _combine(results, initial_cash / max(1, len(stock_ids))),
+    }
+
+
+def run_backtests(histories: Dict[str, Dict[str, np.ndarray]], strategy: Dict, initial_cash: float = 1_000_000.0) -> Dict:
+    """Backtest every symbol in ``histories`` in this process and combine them equal-weighted"""
+    per_symbol = initial_cash / max(1, len(histories))
+    return combine_results(backtest_many(histories, strategy, per_symbol), list(histories), strategy, initial_cash)
+
+
+def _combine(results: List[Dict], allocation: float) -> Optional[Dict]:
+    """Equal-weight portfolio over the dates every symbol has"""
+    ok = [r for r in results if "error" not in r]
+    if not ok:
+        return None
+    common = sorted(set.intersection(*(set(r["dates"]) for r in ok)))
+    if not common:
+        return None
+    equity = np.zeros(len(common))
+    for r in ok:
+        index = {d: i for i, d in enumerate(r["dates"])}
+        curve = np.array(r["equity"])[[index[d] for d in common]]
+        # Rebase so every symbol starts the common window with its allocation
+        equity += curve / curve[0] * allocation
+    returns = np.diff(equity) / equity[:-1]
+    return {
+        "dates": common,
+        "equity": equity.tolist(),
+        "total_return": float(equity[-1] / equity[0] - 1),
+        "max_drawdown": _max_drawdown(equity),
+        "sharpe": _sharpe(returns),
+    }
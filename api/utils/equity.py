@@ -0,0 +1,169 @@
+# api/utils/equity.py
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.db.models import Max
+from django.utils import timezone
+
+from api.models import CashAccount, DailyBar, EquitySnapshot, TradeHistory, VirtualHolding
+from .market_hours import TAIPEI_TZ, last_settled_close
+from .price_history import append_daily_bars
+from .trade_journal import flush_journal
+from .trading_cache import get_cash_many, get_user_positions, to_cents
+
+logger = logging.getLogger(__name__)
+
+# How far back a close may be carried forward for a symbol without a bar that day
+CLOSE_LOOKBACK_DAYS = 14
+
+
+def _cutoff(day: date, now: datetime) -> datetime:
+    """End of ``day`` in Taipei, or now if that has not arrived yet"""
+    return min(now, datetime.combine(day + timedelta(days=1), datetime.min.time(), tzinfo=TAIPEI_TZ))
+
+
+def _apply(state: Dict, trade, sign: int = 1):
+    """Move cash and shares by one trade (sign=-1 undoes it)"""
+    shares = trade.quantity if trade.side == TradeHistory.BUY else -trade.quantity
+    state["positions"][trade.stock_id] += sign * shares
+    state["cash_cents"] -= sign * to_cents(trade.price * shares)
+
+
+def _closes(stock_ids: Iterable[str], day: date) -> Dict[str, float]:
+    """Newest stored close on or before ``day`` per symbol, in one query"""
+    rows = (
+        DailyBar.objects.filter(
+            stock_id__in=list(stock_ids),
+            date__lte=day,
+            date__gt=day - timedelta(days=CLOSE_LOOKBACK_DAYS),
+            close__isnull=False,
+        )
+        .order_by("stock_id", "date")
+        .values_list("stock_id", "close")
+    )
+    return dict(rows)  # later (newer) dates overwrite earlier ones
+
+
+def _bootstrap(user_ids: List[int], cutoff: datetime) -> Dict[int, Dict]:
+    """First snapshot state: the live ledger and cash, less trades after ``cutoff``"""
+    state = {
+        user_id: {"cash_cents": 0, "positions": defaultdict(int)}
+        for user_id in user_ids
+    }
+    for user_id, balance, reserved in CashAccount.objects.filter(user_id__in=user_ids).values_list(
+        "user_id", "balance_cents", "reserved_cents"
+    ):
+        state[user_id]["cash_cents"] = balance + reserved
+    # CashAccount is written behind; the Redis balance is the current one
+    for user_id, cash in get_cash_many(user_ids).items():
+        state[user_id]["cash_cents"] = cash["available"] + cash["reserved"]
+
+    warm = get_user_positions(user_ids)
+    for user_id, positions in warm.items():
+        for stock_id, p in positions.items():
+            state[user_id]["positions"][stock_id] = p["quantity"]
+    cold = [user_id for user_id in user_ids if user_id not in warm]
+    for user_id, stock_id, quantity in VirtualHolding.objects.filter(user_id__in=cold).values_list(
+        "user_id", "stock_id", "quantity"
+    ):
+        state[user_id]["positions"][stock_id] = quantity
+
+    for trade in TradeHistory.objects.filter(user_id__in=user_ids, ts__gt=cutoff):
+        _apply(state[trade.user_id], trade, sign=-1)
+    return state
+
+
+def forget_snapshots(user_id: int) -> int:
+    """Drop a user's snapshots after their cash was reset outside of trading
+
+    Rolling forward only replays trades, so a reset would never reach the
+    curve; with no snapshot left, the next run bootstraps from the live
+    ledger. Returns the number of snapshots deleted.
+    """
+    deleted, _ = EquitySnapshot.objects.filter(user_id=user_id).delete()
+    return deleted
+
+
+def snapshot_equity(day: Optional[date] = None, now: Optional[datetime] = None) -> int:
+    """Write the ``day`` snapshot (default: last settled trading day) for every user lacking one
+
+    Each user's state is their previous snapshot rolled forward by the
+    trades since its ``as_of``; users without one are bootstrapped from the
+    live ledger once. Positions are marked at the day's stored closes.
+    Returns the number of snapshots written.
+    """
+    now = now or timezone.now()
+    day = day or last_settled_close(now).date()
+    cutoff = _cutoff(day, now)
+    flush_journal()
+
+    done = set(EquitySnapshot.objects.filter(date=day).values_list("user_id", flat=True))
+    user_ids = set(CashAccount.objects.values_list("user_id", flat=True))
+    user_ids |= set(EquitySnapshot.objects.values_list("user_id", flat=True).distinct())
+    user_ids -= done
+    if not user_ids:
+        return 0
+
+    latest = dict(
+        EquitySnapshot.objects.filter(user_id__in=user_ids, date__lt=day)
+        .values("user_id")
+        .annotate(latest=Max("date"))
+        .values_list("user_id", "latest")
+    )
+    state = {}
+    since = {}
+    previous = EquitySnapshot.objects.filter(user_id__in=list(latest), date__in=set(latest.values()))
+    for snap in previous:
+        if snap.date != latest[snap.user_id]:
+            continue
+        state[snap.user_id] = {
+            "cash_cents": snap.cash_cents,
+            "positions": defaultdict(int, {sid: p["quantity"] for sid, p in snap.positions.items()}),
+        }
+        since[snap.user_id] = snap.as_of
+    state.update(_bootstrap([u for u in user_ids if u not in state], cutoff))
+
+    if since:
+        trades = TradeHistory.objects.filter(
+            user_id__in=list(since), ts__gt=min(since.values()), ts__lte=cutoff
+        ).order_by("ts", "id")
+        for trade in trades:
+            if trade.ts > since[trade.user_id]:
+                _apply(state[trade.user_id], trade)
+
+    held = {sid for s in state.values() for sid, qty in s["positions"].items() if qty}
+    closes = _closes(held, day)
+    missing = [sid for sid in held if sid not in closes]
+    if missing and append_daily_bars(missing):
+        closes.update(_closes(missing, day))
+    unpriced = [sid for sid in missing if sid not in closes]
+    if unpriced:
+        logger.warning("No close on or before %s for %s; left out of market value", day, unpriced)
+
+    snapshots = []
+    for user_id, s in state.items():
+        positions = {
+            sid: {"quantity": qty, "price": closes.get(sid)}
+            for sid, qty in sorted(s["positions"].items()) if qty
+        }
+        market_value = sum(
+            to_cents(p["price"] * p["quantity"]) for p in positions.values() if p["price"] is not None
+        )
+        snapshots.append(EquitySnapshot(
+            user_id=user_id,
+            date=day,
+            as_of=cutoff,
+            cash_cents=s["cash_cents"],
+            market_value_cents=market_value,
+            positions=positions,
+        ))
+    EquitySnapshot.objects.bulk_create(
+        snapshots,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["user", "date"],
+        update_fields=["as_of", "cash_cents", "market_value_cents", "positions"],
+    )
+    return len(snapshots)
@@ -0,0 +1,213 @@
+# api/utils/indicators.py
+"""Technical indicators over whole price matrices
+
+Every function takes arrays shaped (symbols, days) -- or a single 1-D
+series -- oldest bar first, and computes along the last axis, so a whole
+universe is one NumPy call per indicator. Missing values are NaN.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+BEST_BUY_WHY = ["量大收紅", "量縮價不跌", "三日均價由下往上", "三日均價大於六日均價"]
+BEST_SELL_WHY = ["量大收黑", "量縮價跌", "三日均價由上往下", "三日均價小於六日均價"]
+
+# History loaded per symbol; enough for SMA 60 and for the EMAs to settle
+LOOKBACK_BARS = 120
+
+
+def stack_histories(histories: Dict[str, Dict[str, np.ndarray]], fields=("open", "high", "low", "close", "capacity")):
+    """Right-align per-symbol histories into (symbols, days) float matrices
+
+    Shorter histories are NaN-padded at the start, so the last column is
+    each symbol's newest bar.
+    """
+    stock_ids = list(histories)
+    width = max((len(h["date"]) for h in histories.values()), default=0)
+    matrices = {}
+    for field in fields:
+        matrix = np.full((len(stock_ids), width), np.nan)
+        for row, sid in enumerate(stock_ids):
+            values = histories[sid][field]
+            if len(values):
+                matrix[row, width - len(values):] = values
+        matrices[field] = matrix
+    return stock_ids, matrices
+
+
+def _rolling(x: np.ndarray, n: int, fn) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] >= n:
+        out[..., n - 1:] = fn(sliding_window_view(x, n, axis=-1), axis=-1)
+    return out
+
+
+def sma(x: np.ndarray, n: int) -> np.ndarray:
+    return _rolling(x, n, np.mean)
+
+
+def rolling_std(x: np.ndarray, n: int) -> np.ndarray:
+    return _rolling(x, n, np.std)
+
+
+def _ewm(x: np.ndarray, alpha: float, min_periods: int) -> np.ndarray:
+    """Recursive exponential average, vectorized across symbols
+
+    Each row starts at its first valid value; a NaN bar carries the previous
+    average forward. Values before ``min_periods`` valid bars are NaN.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.empty(x.shape)
+    prev = np.full(x.shape[:-1], np.nan)
+    for t in range(x.shape[-1]):
+        value = x[..., t]
+        prev = np.where(np.isnan(prev), value, np.where(np.isnan(value), prev, alpha * value + (1 - alpha) * prev))
+        out[..., t] = prev
+    seen = np.cumsum(~np.isnan(x), axis=-1)
+    out[seen < min_periods] = np.nan
+    return out
+
+
+def ema(x: np.ndarray, n: int) -> np.ndarray:
+    return _ewm(x, 2.0 / (n + 1), n)
+
+
+def rsi(close: np.ndarray, n: int = 14) -> np.ndarray:
+    """Wilder's RSI (smoothing factor 1/n)"""
+    close = np.asarray(close, dtype=np.float64)
+    delta = np.diff(close, axis=-1, prepend=np.nan)
+    gain = _ewm(np.where(np.isnan(delta), np.nan, np.maximum(delta, 0)), 1.0 / n, n)
+    loss = _ewm(np.where(np.isnan(delta), np.nan, np.maximum(-delta, 0)), 1.0 / n, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = 100 - 100 / (1 + gain / loss)
+    # Only gains in the window: RSI is 100 rather than undefined
+    return np.where((loss == 0) & (gain > 0), 100.0, out)
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9):
+    """Returns (macd line, signal line, histogram)"""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger(close: np.ndarray, n: int = 20, k: float = 2.0):
+    """Returns (upper, middle, lower) bands"""
+    middle = sma(close, n)
+    width = k * rolling_std(close, n)
+    return middle + width, middle, middle - width
+
+
+def volume_ratio(volume: np.ndarray, n: int = 5) -> np.ndarray:
+    """Each bar's volume over the mean of the ``n`` bars before it"""
+    volume = np.asarray(volume, dtype=np.float64)
+    previous = np.full(volume.shape, np.nan)
+    previous[..., 1:] = sma(volume, n)[..., :-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return volume / previous
+
+
+def best_four_point_checks(close: np.ndarray, open_: np.ndarray, capacity: np.ndarray):
+    """twstock's four buy and four sell conditions evaluated on every bar
+
+    Returns two boolean arrays shaped (4, *close.shape), in BEST_BUY_WHY /
+    BEST_SELL_WHY order. Moving averages are rounded to 2 decimals as
+    twstock does.
+    """
+    close, open_, capacity = (np.asarray(a, dtype=np.float64) for a in (close, open_, capacity))
+
+    def shift(x, k):
+        out = np.full(x.shape, np.nan)
+        out[..., k:] = x[..., :-k]
+        return out
+
+    ma3 = np.round(sma(close, 3), 2)
+    ma6 = np.round(sma(close, 6), 2)
+    ma3_up = ma3 > shift(ma3, 1)
+    # twstock counts a flat average as falling
+    ma3_down = ~ma3_up & ~np.isnan(shift(ma3, 1))
+    ma3_up_before = shift(ma3, 1) > shift(ma3, 2)
+    ma3_down_before = ~ma3_up_before & ~np.isnan(shift(ma3, 2))
+
+    volume_up = capacity > shift(capacity, 1)
+    volume_down = capacity < shift(capacity, 1)
+    buy = np.stack([
+        volume_up & (close > open_),
+        volume_down & (close > shift(open_, 1)),
+        ma3_up & ma3_down_before,
+        ma3 > ma6,
+    ])
+    sell = np.stack([
+        volume_up & (close < open_),
+        volume_down & (close < shift(open_, 1)),
+        ma3_down & ma3_up_before,
+        ma3 < ma6,
+    ])
+    return buy, sell
+
+
+def best_four_point(close: np.ndarray, open_: np.ndarray, capacity: np.ndarray) -> List[Optional[Tuple[bool, str]]]:
+    """Latest-bar BestFourPoint per row, in twstock's return format
+
+    twstock also gates on a bias-ratio pivot, but that check returns a
+    non-empty tuple and is always truthy, so any one condition decides.
+    """
+    buy, sell = best_four_point_checks(np.atleast_2d(close), np.atleast_2d(open_), np.atleast_2d(capacity))
+    results = []
+    for row in range(buy.shape[1]):
+        buy_now, sell_now = buy[:, row, -1], sell[:, row, -1]
+        if buy_now.any():
+            results.append((True, ", ".join(w for w, hit in zip(BEST_BUY_WHY, buy_now) if hit)))
+        elif sell_now.any():
+            results.append((False, ", ".join(w for w, hit in zip(BEST_SELL_WHY, sell_now) if hit)))
+        else:
+            results.append(None)
+    return results
+
+
+def _latest(x: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(v) else round(float(v), 4) for v in x[..., -1]]
+
+
+def compute_indicators(histories: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, Dict]:
+    """Latest indicator values for every symbol in ``histories`` at once"""
+    stock_ids, m = stack_histories(histories)
+    if not stock_ids:
+        return {}
+    close, volume = m["close"], m["capacity"]
+    if close.shape[-1] == 0:
+        return {sid: {"stock_id": sid, "bars": 0} for sid in stock_ids}
+
+    macd_line, macd_signal, macd_hist = macd(close)
+    upper, middle, lower = bollinger(close)
+    columns = {
+        "close": _latest(close),
+        "sma_5": _latest(sma(close, 5)),
+        "sma_20": _latest(sma(close, 20)),
+        "sma_60": _latest(sma(close, 60)),
+        "ema_12": _latest(ema(close, 12)),
+        "ema_26": _latest(ema(close, 26)),
+        "rsi_14": _latest(rsi(close, 14)),
+        "macd": _latest(macd_line),
+        "macd_signal": _latest(macd_signal),
+        "macd_hist": _latest(macd_hist),
+        "bollinger_upper": _latest(upper),
+        "bollinger_middle": _latest(middle),
+        "bollinger_lower": _latest(lower),
+        "volume_ratio_5": _latest(volume_ratio(volume, 5)),
+    }
+    four_point = best_four_point(close, m["open"], volume)
+
+    results = {}
+    for row, sid in enumerate(stock_ids):
+        dates = histories[sid]["date"]
+        results[sid] = {
+            "stock_id": sid,
+            "as_of": str(dates[-1]) if len(dates) else None,
+            "bars": len(dates),
+            **{name: values[row] for name, values in columns.items()},
+            "best_four_point": four_point[row] if len(dates) >= 8 else None,
+        }
+    return results
@@ -0,0 +1,209 @@
+# api/utils/leaderboard.py
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from django.contrib.auth import get_user_model
+from django_redis import get_redis_connection
+
+from api.models import CashAccount, VirtualHolding
+from .realtime import get_fresh_ticks
+from .trading_cache import (
+    HOLDERS_KEY_FMT,
+    LEADERBOARD_KEY,
+    MARKS_KEY,
+    from_cents,
+    get_cash_cents,
+    get_cash_many,
+    get_user_positions,
+    to_cents,
+)
+
+# Scores are equity in cents: cash (available + reserved) plus every
+# position at its symbol's mark. Trades adjust them inside the ledger
+# scripts (see trading_cache); a tick moves every holder of its symbol by
+# shares x price change, found through the symbol:holders reverse index.
+LEADERBOARD_LIMIT_MAX = 100
+REBUILD_BATCH_SIZE = 1000
+
+# Re-marks one symbol and shifts each ranked holder's score by the move.
+# O(h log n) for h holders; a symbol seen for the first time is only marked.
+_MARK_SCRIPT = """
+local new = tonumber(ARGV[2])
+local old = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or ARGV[2])
+redis.call('HSET', KEYS[1], ARGV[1], new)
+local delta = new - old
+if delta == 0 then
+    return 0
+end
+local holders = redis.call('HGETALL', KEYS[2])
+for i = 1, #holders, 2 do
+    redis.call('ZADD', KEYS[3], 'XX', 'INCR', delta * tonumber(holders[i + 1]), holders[i])
+end
+return #holders / 2
+"""
+
+_scripts = {}
+
+
+def _conn():
+    return get_redis_connection("default")
+
+
+def _script(source: str):
+    if source not in _scripts:
+        _scripts[source] = _conn().register_script(source)
+    return _scripts[source]
+
+
+def _holders_key(stock_id: str) -> str:
+    return HOLDERS_KEY_FMT.format(stock_id=stock_id)
+
+
+def mark_prices(ticks: Iterable[Dict]) -> int:
+    """Apply price moves to holders' scores; returns holder scores touched"""
+    ticks = list(ticks)
+    if not ticks:
+        return 0
+    script = _script(_MARK_SCRIPT)
+    pipe = _conn().pipeline(transaction=False)
+    for tick in ticks:
+        script(
+            keys=[MARKS_KEY, _holders_key(tick["stock_id"]), LEADERBOARD_KEY],
+            args=[tick["stock_id"], to_cents(tick["price"])],
+            client=pipe,
+        )
+    return sum(pipe.execute())
+
+
+def _marks(conn, positions: Dict[str, Dict[str, int]]) -> Dict[str, int]:
+    """Current marks, seeding missing ones with the position's average cost"""
+    stock_ids = list(positions)
+    if not stock_ids:
+        return {}
+    marks = dict(zip(stock_ids, conn.hmget(MARKS_KEY, stock_ids)))
+    for stock_id, mark in marks.items():
+        if mark is None:
+            p = positions[stock_id]
+            conn.hsetnx(MARKS_KEY, stock_id, round(p["cost_cents"] / p["quantity"]))
+    return {sid: int(float(v)) for sid, v in zip(stock_ids, conn.hmget(MARKS_KEY, stock_ids))}
+
+
+def _score(cash: Dict[str, int], positions: Dict[str, Dict[str, int]], marks: Dict[str, int]) -> int:
+    return cash["available"] + cash["reserved"] + sum(
+        p["quantity"] * marks[sid] for sid, p in positions.items()
+    )
+
+
+def rank_user(user_id: int) -> int:
+    """(Re)compute one user's score from their ledger and cash; returns it in cents"""
+    conn = _conn()
+    cash = get_cash_cents(user_id)
+    positions = get_user_positions([user_id]).get(user_id)
+    if positions is None:
+        positions = {
+            sid: {"quantity": qty, "cost_cents": cost}
+            for sid, qty, cost in VirtualHolding.objects.filter(user_id=user_id, quantity__gt=0)
+            .values_list("stock_id", "quantity", "cost_cents")
+        }
+    score = _score(cash, positions, _marks(conn, positions))
+    pipe = conn.pipeline()
+    for sid, p in positions.items():
+        pipe.hset(_holders_key(sid), user_id, p["quantity"])
+    pipe.zadd(LEADERBOARD_KEY, {user_id: score})
+    pipe.execute()
+    return score
+
+
+def top(limit: int = 10) -> List[Dict]:
+    """Highest equity first; O(log n + limit)"""
+    rows = _conn().zrevrange(LEADERBOARD_KEY, 0, limit - 1, withscores=True)
+    user_ids = [int(member) for member, _ in rows]
+    names = dict(get_user_model().objects.filter(id__in=user_ids).values_list("id", "username"))
+    return [
+        {
+            "rank": rank,
+            "user_id": user_id,
+            "username": names.get(user_id),
+            "equity": from_cents(int(score)),
+        }
+        for rank, (user_id, (_, score)) in enumerate(zip(user_ids, rows), start=1)
+    ]
+
+
+def user_rank(user_id: int) -> Dict:
+    """1-based rank and equity of one user, ranking them first if needed; O(log n)"""
+    conn = _conn()
+    pipe = conn.pipeline(transaction=False)
+    pipe.zrevrank(LEADERBOARD_KEY, user_id)
+    pipe.zscore(LEADERBOARD_KEY, user_id)
+    pipe.zcard(LEADERBOARD_KEY)
+    rank, score, total = pipe.execute()
+    if rank is None:
+        rank_user(user_id)
+        return user_rank(user_id)
+    return {"rank": rank + 1, "equity": from_cents(int(score)), "total": total}
+
+
+def _cash_by_user(user_ids: List[int]) -> Dict[int, Dict[str, int]]:
+    """Postgres copies, overridden by live Redis balances (CashAccount lags behind them)"""
+    cash = {
+        user_id: {"available": balance, "reserved": reserved}
+        for user_id, balance, reserved in CashAccount.objects.filter(user_id__in=user_ids)
+        .values_list("user_id", "balance_cents", "reserved_cents")
+    }
+    cash.update(get_cash_many(user_ids))
+    return cash
+
+
+def rebuild_leaderboard(batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    """Recompute every score, the reverse index and the marks from scratch
+
+    Corrects any drift (cash resets, ledgers reloaded from Postgres) and
+    brings in users who have not been ranked yet. Scores are built in a
+    scratch key and swapped in with RENAME, so readers never see a partial
+    board. Returns the number of users ranked.
+    """
+    conn = _conn()
+    fresh = {sid: to_cents(t["price"]) for sid, t in get_fresh_ticks(
+        VirtualHolding.objects.values_list("stock_id", flat=True).distinct()
+    ).items()}
+    if fresh:
+        conn.hset(MARKS_KEY, mapping=fresh)
+
+    marks = {sid.decode(): int(float(v)) for sid, v in conn.hgetall(MARKS_KEY).items()}
+
+    scratch = LEADERBOARD_KEY + ":rebuild"
+    conn.delete(scratch)
+    holders = defaultdict(dict)
+    user_ids = list(CashAccount.objects.order_by("user_id").values_list("user_id", flat=True))
+    for i in range(0, len(user_ids), batch_size):
+        batch = user_ids[i:i + batch_size]
+        # Postgres copies, overridden by live ledgers where warm
+        positions = defaultdict(dict)
+        for user_id, sid, qty, cost in VirtualHolding.objects.filter(user_id__in=batch, quantity__gt=0).values_list(
+            "user_id", "stock_id", "quantity", "cost_cents"
+        ):
+            positions[user_id][sid] = {"quantity": qty, "cost_cents": cost}
+        positions.update(get_user_positions(batch))
+        cash = _cash_by_user(batch)
+
+        scores = {}
+        for user_id in batch:
+            held = positions.get(user_id, {})
+            for sid, p in held.items():
+                if sid not in marks:
+                    marks[sid] = round(p["cost_cents"] / p["quantity"])
+                    conn.hsetnx(MARKS_KEY, sid, marks[sid])
+                holders[sid][user_id] = p["quantity"]
+            scores[user_id] = _score(cash[user_id], held, marks)
+        conn.zadd(scratch, scores)
+
+    pipe = conn.pipeline()
+    for key in conn.scan_iter(match=HOLDERS_KEY_FMT.format(stock_id="*")):
+        pipe.delete(key)
+    for sid, by_user in holders.items():
+        pipe.hset(_holders_key(sid), mapping=by_user)
+    if user_ids:
+        pipe.rename(scratch, LEADERBOARD_KEY)
+    pipe.execute()
+    return len(user_ids)
@@ -0,0 +1,63 @@
+# api/utils/market_hours.py
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+TAIPEI_TZ = ZoneInfo("Asia/Taipei")
+
+# Taiwan Stock Exchange regular session: Monday-Friday, 09:00-13:30
+MARKET_OPEN = time(9, 0)
+MARKET_CLOSE = time(13, 30)
+# TWSE publishes the final daily bar a while after the close
+SETTLE_DELAY = timedelta(minutes=30)
+
+
+def taipei_now(now: Optional[datetime] = None) -> datetime:
+    """Current time in Asia/Taipei (accepts an aware datetime for testing)"""
+    if now is None:
+        return datetime.now(TAIPEI_TZ)
+    return now.astimezone(TAIPEI_TZ)
+
+
+def is_trading_day(day: date) -> bool:
+    # Exchange holidays are not modelled; weekends are the only closed days
+    return day.weekday() < 5
+
+
+def is_market_open(now: Optional[datetime] = None) -> bool:
+    now = taipei_now(now)
+    return is_trading_day(now.date()) and MARKET_OPEN <= now.time() <= MARKET_CLOSE
+
+
+def next_open(now: Optional[datetime] = None) -> datetime:
+    """Start of the next regular session strictly after ``now``"""
+    now = taipei_now(now)
+    day = now.date()
+    if now.time() >= MARKET_OPEN:
+        day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return datetime.combine(day, MARKET_OPEN, tzinfo=TAIPEI_TZ)
+
+
+def seconds_until_open(now: Optional[datetime] = None) -> float:
+    now = taipei_now(now)
+    if is_market_open(now):
+        return 0.0
+    return (next_open(now) - now).total_seconds()
+
+
+def last_close(now: Optional[datetime] = None) -> datetime:
+    """End of the most recent regular session at or before ``now``"""
+    now = taipei_now(now)
+    day = now.date()
+    if now.time() < MARKET_CLOSE:
+        day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return datetime.combine(day, MARKET_CLOSE, tzinfo=TAIPEI_TZ)
+
+
+def last_settled_close(now: Optional[datetime] = None) -> datetime:
+    """Most recent close whose daily bar is final (SETTLE_DELAY after it)"""
+    return last_close(taipei_now(now) - SETTLE_DELAY)
@@ -0,0 +1,70 @@
+# api/utils/mcp_client.py
+import asyncio
+import logging
+import os
+from typing import Awaitable, Optional, TypeVar
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Pool sized for the two concurrent provider calls of each analysis task;
+# keep-alive lets consecutive tasks reuse the same connections to the MCP service
+MCP_MAX_CONNECTIONS = int(os.getenv("MCP_MAX_CONNECTIONS", 10))
+MCP_MAX_KEEPALIVE = int(os.getenv("MCP_MAX_KEEPALIVE", 10))
+MCP_KEEPALIVE_EXPIRY = float(os.getenv("MCP_KEEPALIVE_EXPIRY", 60))
+MCP_TIMEOUT = float(os.getenv("MCP_TIMEOUT", 30))
+MCP_CONNECT_TIMEOUT = float(os.getenv("MCP_CONNECT_TIMEOUT", 5))
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_client: Optional[httpx.AsyncClient] = None
+
+
+def start() -> None:
+    """Create this process's event loop and pooled client (idempotent)
+
+    Connected to ``worker_process_init``, so each prefork child owns its own
+    loop and sockets; nothing is shared across a fork.
+    """
+    global _loop, _client
+    if _client is not None:
+        return
+    _loop = asyncio.new_event_loop()
+    _client = httpx.AsyncClient(
+        timeout=httpx.Timeout(MCP_TIMEOUT, connect=MCP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=MCP_MAX_CONNECTIONS,
+            max_keepalive_connections=MCP_MAX_KEEPALIVE,
+            keepalive_expiry=MCP_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def stop() -> None:
+    """Close pooled connections and the loop; connected to ``worker_process_shutdown``"""
+    global _loop, _client
+    if _client is None:
+        return
+    try:
+        _loop.run_until_complete(_client.aclose())
+    except Exception as e:
+        logger.warning("Error closing MCP client: %s", str(e))
+    finally:
+        _loop.close()
+        _loop, _client = None, None
+
+
+def get_client() -> httpx.AsyncClient:
+    start()
+    return _client
+
+
+def run(coro: Awaitable[T]) -> T:
+    """Run ``coro`` on the worker's persistent loop
+
+    Starts the loop lazily outside a prefork child (solo pool, eager tasks).
+    """
+    start()
+    return _loop.run_until_complete(coro)
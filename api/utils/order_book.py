@@ -0,0 +1,255 @@
+# api/utils/order_book.py
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from api.models import Order, TradeHistory
+from .trade_journal import record_trade
+from .trading_cache import (
+    InsufficientFunds,
+    InsufficientShares,
+    add_user_holding,
+    capture_reserved_cash,
+    credit_cash,
+    debit_cash,
+    from_cents,
+    release_cash,
+    remove_user_holding,
+    reserve_cash,
+    to_cents,
+)
+
+logger = logging.getLogger(__name__)
+
+# Open orders are indexed per symbol in two sorted sets, scored by trigger
+# price, so a tick only touches the orders it actually crosses:
+#   orders:<stock_id>:le  fire once price <= score (buy limit, sell stop)
+#   orders:<stock_id>:ge  fire once price >= score (sell limit, buy stop)
+# Postgres (Order) stays the record; the sets are reconciled with it periodically.
+BOOK_KEY_FMT = "orders:{stock_id}:{direction}"
+LE = "le"
+GE = "ge"
+
+# Removes and returns every crossed order id in one step, so a tick, a
+# concurrent tick and a cancel can never claim the same order twice.
+# O(log n + k) per set for k triggered orders.
+_POP_TRIGGERED_SCRIPT = """
+local le = redis.call('ZRANGEBYSCORE', KEYS[1], ARGV[1], '+inf')
+if #le > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], ARGV[1], '+inf')
+end
+local ge = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+if #ge > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+end
+return {le, ge}
+"""
+
+_scripts = {}
+
+
+def _conn():
+    return get_redis_connection("default")
+
+
+def _script(source: str):
+    if source not in _scripts:
+        _scripts[source] = _conn().register_script(source)
+    return _scripts[source]
+
+
+def trigger_direction(side: str, order_type: str) -> str:
+    if (side == TradeHistory.BUY) == (order_type == Order.LIMIT):
+        return LE
+    return GE
+
+
+def _book_key(order: Order) -> str:
+    return BOOK_KEY_FMT.format(stock_id=order.stock_id, direction=trigger_direction(order.side, order.order_type))
+
+
+def place_order(user, stock_id: str, side: str, order_type: str, price: float, quantity: int) -> Order:
+    """Record an order and index it; buys reserve quantity x trigger price
+
+    Raises InsufficientFunds when a buy cannot be covered.
+    """
+    reserved = to_cents(price * quantity) if side == TradeHistory.BUY else 0
+    if reserved:
+        reserve_cash(user.id, reserved)
+    try:
+        order = Order.objects.create(
+            user=user,
+            stock_id=stock_id,
+            side=side,
+            order_type=order_type,
+            price=price,
+            quantity=quantity,
+            reserved_cents=reserved,
+        )
+    except Exception:
+        if reserved:
+            release_cash(user.id, reserved)
+        raise
+    _conn().zadd(_book_key(order), {order.id: price})
+    return order
+
+
+def cancel_order(order: Order) -> bool:
+    """Cancel a resting order; False if a tick already claimed it"""
+    if not _conn().zrem(_book_key(order), order.id):
+        return False
+    Order.objects.filter(id=order.id).update(status=Order.CANCELLED)
+    order.status = Order.CANCELLED
+    if order.reserved_cents:
+        release_cash(order.user_id, order.reserved_cents)
+    return True
+
+
+def cancel_open_orders(user_id: int) -> int:
+    """Cancel every resting order of a user; returns how many were already claimed by a fill"""
+    claimed = 0
+    for order in Order.objects.filter(user_id=user_id, status=Order.OPEN):
+        claimed += not cancel_order(order)
+    return claimed
+
+
+def pop_triggered(stock_id: str, price: float) -> List[int]:
+    keys = [BOOK_KEY_FMT.format(stock_id=stock_id, direction=d) for d in (LE, GE)]
+    le, ge = _script(_POP_TRIGGERED_SCRIPT)(keys=keys, args=[price])
+    return [int(i) for i in le + ge]
+
+
+def _finish(order: Order, status: str, fill_price: float = None, reason: str = ""):
+    order.status = status
+    order.fill_price = fill_price
+    order.reason = reason
+    order.save(update_fields=["status", "fill_price", "reason", "updated_at"])
+
+
+def _fill_buy(order: Order, price: float):
+    cost = to_cents(price * order.quantity)
+    extra = cost - order.reserved_cents
+    # Gapped through a stop: the reserve falls short, take the rest from cash
+    if extra > 0:
+        try:
+            debit_cash(order.user_id, extra)
+        except InsufficientFunds as e:
+            release_cash(order.user_id, order.reserved_cents)
+            _finish(order, Order.REJECTED, reason=str(e))
+            return
+    # Cents taken out of the account so far, and cents still held in reserve
+    spent = max(extra, 0)
+    held = order.reserved_cents
+    try:
+        captured = min(cost, held)
+        capture_reserved_cash(order.user_id, captured)
+        spent, held = spent + captured, held - captured
+        if held:
+            release_cash(order.user_id, held)
+            held = 0
+        # The FILLED row only commits once the shares are in the ledger
+        with transaction.atomic():
+            _finish(order, Order.FILLED, price)
+            add_user_holding(order.user_id, {
+                "stock_id": order.stock_id,
+                "buy_price": price,
+                "quantity": order.quantity,
+            })
+    except Exception:
+        # Undo the completed steps: the order ends with nothing reserved or spent
+        if spent:
+            credit_cash(order.user_id, spent)
+        if held:
+            release_cash(order.user_id, held)
+        raise
+
+
+def _fill_sell(order: Order, price: float):
+    proceeds = to_cents(price * order.quantity)
+    try:
+        with transaction.atomic():
+            _finish(order, Order.FILLED, price)
+            _, realized = remove_user_holding(order.user_id, order.stock_id, order.quantity, price)
+            try:
+                credit_cash(order.user_id, proceeds)
+            except Exception:
+                # Put the shares back at the cost basis they were sold from
+                add_user_holding(order.user_id, {
+                    "stock_id": order.stock_id,
+                    "buy_price": from_cents(proceeds - realized) / order.quantity,
+                    "quantity": order.quantity,
+                })
+                raise
+    except InsufficientShares as e:
+        _finish(order, Order.REJECTED, reason=str(e) or "Insufficient shares")
+
+
+def fill_order(order: Order, price: float):
+    """Execute a claimed order at the tick price and record the trade"""
+    if order.side == TradeHistory.BUY:
+        _fill_buy(order, price)
+    else:
+        _fill_sell(order, price)
+    if order.status == Order.FILLED:
+        try:
+            record_trade(order.user_id, order.stock_id, order.side, price, order.quantity)
+        except Exception as e:
+            # The fill stands; only its history row is missing
+            logger.error("Order %s filled but not journaled: %s", order.id, str(e))
+
+
+def match_ticks(ticks: Iterable[Dict]) -> int:
+    """Fill every order crossed by ``ticks``; returns the number filled"""
+    claimed = {}
+    for tick in ticks:
+        for order_id in pop_triggered(tick["stock_id"], tick["price"]):
+            claimed[order_id] = tick["price"]
+    if not claimed:
+        return 0
+
+    filled = 0
+    for order in Order.objects.filter(id__in=claimed, status=Order.OPEN).order_by("id"):
+        try:
+            fill_order(order, claimed[order.id])
+        except Exception as e:
+            # The fill undid its own cash and share moves; rejected rather than retried
+            logger.error("Fill failed for order %s: %s", order.id, str(e))
+            _finish(order, Order.REJECTED, reason="Fill failed")
+            continue
+        filled += order.status == Order.FILLED
+    return filled
+
+
+def rebuild_order_book() -> int:
+    """Reconcile the price index with the open orders in Postgres (e.g. after a Redis flush)
+
+    Open orders are re-added (ZADD is idempotent) and members whose order
+    is no longer open are dropped. Nothing is deleted wholesale, so orders
+    placed or cancelled meanwhile are unaffected. Must not overlap
+    match_ticks: an order it has claimed but not finished is still OPEN
+    and would be indexed again. Returns the number of open orders.
+    """
+    conn = _conn()
+    books = defaultdict(dict)
+    for order in Order.objects.filter(status=Order.OPEN).only("id", "stock_id", "side", "order_type", "price"):
+        books[_book_key(order)][order.id] = order.price
+
+    indexed = {}
+    for key in conn.scan_iter(match=BOOK_KEY_FMT.format(stock_id="*", direction="*")):
+        indexed[key.decode()] = {int(m) for m in conn.zrange(key, 0, -1)}
+    unknown = {i for key, ids in indexed.items() for i in ids if i not in books.get(key, {})}
+    # Placed since the query above, or no longer open (or gone)
+    closed = unknown - set(Order.objects.filter(id__in=unknown, status=Order.OPEN).values_list("id", flat=True))
+
+    pipe = conn.pipeline()
+    for key, members in books.items():
+        pipe.zadd(key, members)
+    for key, ids in indexed.items():
+        stale = ids & closed
+        if stale:
+            pipe.zrem(key, *stale)
+    pipe.execute()
+    return sum(len(m) for m in books.values())
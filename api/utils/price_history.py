@@ -0,0 +1,188 @@
+# api/utils/price_history.py
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from django.db.models import Max
+from twstock import Stock
+from twstock.stock import DATATUPLE
+
+from api.models import DailyBar
+from .market_hours import last_settled_close, taipei_now
+
+logger = logging.getLogger(__name__)
+
+# How far back a symbol's history starts the first time it is stored
+HISTORY_BOOTSTRAP_MONTHS = int(os.getenv("HISTORY_BOOTSTRAP_MONTHS", 6))
+
+BAR_FIELDS = ["date", "capacity", "turnover", "open", "high", "low", "close", "change", "transaction"]
+_FLOAT_FIELDS = ("open", "high", "low", "close", "change")
+_INT_FIELDS = ("capacity", "turnover", "transaction")
+
+# Calendar days allowed beyond 7/5 per trading day when fetching the last N
+# bars, covering market holidays (the Lunar New Year closure runs ~9 days)
+WINDOW_SLACK_DAYS = 20
+
+
+def _bootstrap_month(today: date):
+    months = today.year * 12 + today.month - 1 - HISTORY_BOOTSTRAP_MONTHS
+    return months // 12, months % 12 + 1
+
+
+def latest_dates(stock_ids: Iterable[str]) -> Dict[str, date]:
+    """Date of the newest stored bar per symbol (absent when none stored)"""
+    rows = (
+        DailyBar.objects.filter(stock_id__in=list(stock_ids))
+        .values("stock_id")
+        .annotate(latest=Max("date"))
+    )
+    return {row["stock_id"]: row["latest"] for row in rows}
+
+
+def stored_symbols() -> List[str]:
+    return list(DailyBar.objects.values_list("stock_id", flat=True).distinct().order_by("stock_id"))
+
+
+def append_new_bars(stock_id: str, latest: Optional[date] = None) -> int:
+    """Fetch and store only the bars newer than ``latest``
+
+    Starts from the month of the newest stored bar (one request per month
+    to the present), or HISTORY_BOOTSTRAP_MONTHS back for a new symbol.
+    Today's bar is skipped until the close has settled, so stored bars are
+    always final.
+    """
+    settled_day = last_settled_close().date()
+    if latest is not None and latest >= settled_day:
+        return 0
+    year, month = (latest.year, latest.month) if latest else _bootstrap_month(taipei_now().date())
+
+    data = Stock(stock_id, initial_fetch=False).fetch_from(year, month)
+    bars = [
+        DailyBar(stock_id=stock_id, date=d.date.date(), **{f: getattr(d, f) for f in BAR_FIELDS[1:]})
+        for d in data
+        if (latest is None or d.date.date() > latest) and d.date.date() <= settled_day
+    ]
+    DailyBar.objects.bulk_create(bars, ignore_conflicts=True)
+    return len(bars)
+
+
+def append_daily_bars(stock_ids: Iterable[str]) -> int:
+    """Bring every symbol up to the last settled close; one failure skips one symbol"""
+    stock_ids = list(stock_ids)
+    latest = latest_dates(stock_ids)
+    appended = 0
+    for stock_id in stock_ids:
+        try:
+            appended += append_new_bars(stock_id, latest.get(stock_id))
+        except Exception as e:
+            logger.warning("History append failed for %s: %s", stock_id, str(e))
+    return appended
+
+
+def _to_arrays(rows: List[tuple]) -> Dict[str, np.ndarray]:
+    columns = dict(zip(BAR_FIELDS, zip(*rows))) if rows else {f: () for f in BAR_FIELDS}
+    arrays = {"date": np.array(columns["date"], dtype="datetime64[D]")}
+    # Missing prices (no trades that day) become NaN
+    for field in _FLOAT_FIELDS:
+        arrays[field] = np.array(columns[field], dtype=np.float64)
+    for field in _INT_FIELDS:
+        arrays[field] = np.array(columns[field], dtype=np.int64)
+    return arrays
+
+
+def symbols_with_bars(
+    stock_ids: Iterable[str], start: Optional[date] = None, end: Optional[date] = None
+) -> List[str]:
+    """Those of ``stock_ids`` with at least one stored bar in the range, in input order"""
+    stock_ids = list(dict.fromkeys(stock_ids))
+    qs = DailyBar.objects.filter(stock_id__in=stock_ids)
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lte=end)
+    present = set(qs.values_list("stock_id", flat=True).distinct())
+    return [sid for sid in stock_ids if sid in present]
+
+
+def load_histories(
+    stock_ids: Iterable[str],
+    days: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> Dict[str, Dict[str, np.ndarray]]:
+    """Stored bars for many symbols in one query, as oldest-first column arrays
+
+    ``start``/``end`` bound the dates (inclusive), then ``days`` keeps the
+    last N bars per symbol. With ``days`` the query only reaches back about
+    N trading days from the newest bar in range, so a symbol whose bars
+    stopped earlier than the others' may come back shorter. Symbols with no
+    stored history map to empty arrays.
+    """
+    stock_ids = list(dict.fromkeys(stock_ids))
+    rows_by_symbol = defaultdict(list)
+    qs = DailyBar.objects.filter(stock_id__in=stock_ids)
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lte=end)
+    if days:
+        newest = qs.aggregate(newest=Max("date"))["newest"]
+        if newest:
+            qs = qs.filter(date__gte=newest - timedelta(days=days * 7 // 5 + WINDOW_SLACK_DAYS))
+    rows = qs.order_by("stock_id", "date").values_list("stock_id", *BAR_FIELDS)
+    for row in rows:
+        rows_by_symbol[row[0]].append(row[1:])
+    return {
+        sid: _to_arrays(rows_by_symbol[sid][-days:] if days else rows_by_symbol[sid])
+        for sid in stock_ids
+    }
+
+
+def load_history(stock_id: str, days: Optional[int] = None) -> Dict[str, np.ndarray]:
+    return load_histories([stock_id], days)[stock_id]
+
+
+def stored_stock(stock_id: str, days: int = 31) -> Optional[Stock]:
+    """A twstock Stock populated from the local store, for its analytics
+
+    Returns None when fewer than ``days`` bars are stored.
+    """
+    rows = list(
+        DailyBar.objects.filter(stock_id=stock_id).order_by("-date").values_list(*BAR_FIELDS)[:days]
+    )
+    if len(rows) < days:
+        return None
+    stock = Stock(stock_id, initial_fetch=False)
+    stock.data = [
+        DATATUPLE(datetime.combine(row[0], datetime.min.time()), *row[1:]) for row in reversed(rows)
+    ]
+    return stock
+
+
+def last_bar_quote(stock_id: str) -> Optional[Dict]:
+    """Quote shaped like quote_cache.fetch_quote, from the two newest stored bars"""
+    bars = list(DailyBar.objects.filter(stock_id=stock_id, close__isnull=False).order_by("-date")[:2])
+    if not bars:
+        return None
+    bar = bars[0]
+    change = 0
+    change_percent = 0
+    if len(bars) == 2:
+        previous_price = bars[1].close
+        change = bar.close - previous_price
+        change_percent = (change / previous_price) * 100 if previous_price > 0 else 0
+    return {
+        "stock_id": stock_id,
+        "price": bar.close,
+        "open": bar.open if bar.open is not None else bar.close,
+        "high": bar.high if bar.high is not None else bar.close,
+        "low": bar.low if bar.low is not None else bar.close,
+        "volume": bar.capacity,
+        "change": change,
+        "change_percent": change_percent,
+        "status": "success",
+        "as_of": bar.date.isoformat(),
+    }
@@ -0,0 +1,161 @@
+# api/utils/quote_cache.py
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Optional
+
+from django.core.cache import cache
+from twstock import Stock
+
+from .market_hours import is_market_open, seconds_until_open
+from .price_history import last_bar_quote
+from .realtime import get_fresh_ticks
+
+logger = logging.getLogger(__name__)
+
+QUOTE_KEY_FMT = "quote:{stock_id}"
+LOCK_KEY_FMT = "quote:lock:{stock_id}"
+
+# Quotes move during the session, after the close the last bar is final until
+# the next open, so the closed TTL is also capped at the time left until then.
+QUOTE_TTL_OPEN = int(os.getenv("QUOTE_TTL_OPEN", 15))
+QUOTE_TTL_CLOSED = int(os.getenv("QUOTE_TTL_CLOSED", 60 * 30))
+# Failed lookups are cached briefly so an upstream outage is not hammered
+QUOTE_TTL_ERROR = int(os.getenv("QUOTE_TTL_ERROR", 5))
+
+# Single-flight: one worker fetches a symbol, the others wait for its result
+FETCH_LOCK_TTL = 20
+FETCH_WAIT_TIMEOUT = 10.0
+FETCH_POLL_INTERVAL = 0.05
+
+# Upper bound on concurrent upstream fetches for one batch lookup
+BATCH_MAX_WORKERS = int(os.getenv("QUOTE_BATCH_WORKERS", 8))
+
+
+def _key(stock_id: str) -> str:
+    return QUOTE_KEY_FMT.format(stock_id=stock_id)
+
+
+def _lock_key(stock_id: str) -> str:
+    return LOCK_KEY_FMT.format(stock_id=stock_id)
+
+
+def quote_ttl(quote: Dict) -> int:
+    if quote.get("status") != "success":
+        return QUOTE_TTL_ERROR
+    if is_market_open():
+        return QUOTE_TTL_OPEN
+    return max(1, int(min(QUOTE_TTL_CLOSED, seconds_until_open())))
+
+
+def fetch_quote(stock_id: str) -> Dict:
+    """Fetch the latest daily bar for ``stock_id`` from twstock (uncached)"""
+    try:
+        stock = Stock(stock_id)
+
+        # Get current price data
+        current_price = stock.price[-1] if stock.price else 0
+        open_price = stock.open[-1] if stock.open else current_price
+        high_price = stock.high[-1] if stock.high else current_price
+        low_price = stock.low[-1] if stock.low else current_price
+        volume = stock.capacity[-1] if stock.capacity else 0
+
+        # Calculate price change
+        change = 0
+        change_percent = 0
+        if len(stock.price) >= 2:
+            previous_price = stock.price[-2]
+            change = current_price - previous_price
+            change_percent = (change / previous_price) * 100 if previous_price > 0 else 0
+
+        return {
+            "stock_id": stock_id,
+            "price": current_price,
+            "open": open_price,
+            "high": high_price,
+            "low": low_price,
+            "volume": volume,
+            "change": change,
+            "change_percent": change_percent,
+            "status": "success"
+        }
+    except Exception as e:
+        logger.warning("Quote fetch failed for %s: %s", stock_id, str(e))
+        # Upstream slow or down: serve the last stored daily bar instead
+        stored = last_bar_quote(stock_id)
+        if stored is not None:
+            return stored
+        return {
+            "stock_id": stock_id,
+            "error": str(e),
+            "status": "error"
+        }
+
+
+def _fetch_and_store(stock_id: str) -> Dict:
+    quote = fetch_quote(stock_id)
+    cache.set(_key(stock_id), quote, quote_ttl(quote))
+    return quote
+
+
+def get_quote(stock_id: str) -> Dict:
+    """Return a cached quote, coalescing concurrent misses into one fetch
+
+    A realtime tick no older than TICK_MAX_AGE takes precedence.
+    """
+    tick = get_fresh_ticks([stock_id]).get(stock_id)
+    if tick is not None:
+        return tick
+    quote = cache.get(_key(stock_id))
+    if quote is not None:
+        return quote
+
+    lock_key = _lock_key(stock_id)
+    if cache.add(lock_key, 1, FETCH_LOCK_TTL):
+        try:
+            return _fetch_and_store(stock_id)
+        finally:
+            cache.delete(lock_key)
+
+    # Another worker is already fetching this symbol; wait for its result
+    deadline = time.monotonic() + FETCH_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(FETCH_POLL_INTERVAL)
+        # Read the lock before the quote: the leader stores first, unlocks second
+        leader_active = cache.get(lock_key) is not None
+        quote = cache.get(_key(stock_id))
+        if quote is not None:
+            return quote
+        if not leader_active:
+            break
+
+    # The leader died or is too slow, fall back to fetching ourselves
+    return _fetch_and_store(stock_id)
+
+
+def get_quotes(stock_ids: Iterable[str], timeout: Optional[float] = None) -> Dict[str, Dict]:
+    """Return quotes for many symbols, fetching all cache misses concurrently
+
+    With ``timeout`` set, symbols still being fetched when it expires come back
+    as errors; their fetches finish in the background and warm the cache.
+    """
+    stock_ids = list(dict.fromkeys(stock_ids))
+    quotes = get_fresh_ticks(stock_ids)
+    rest = [sid for sid in stock_ids if sid not in quotes]
+    cached = cache.get_many([_key(sid) for sid in rest])
+    quotes.update({sid: cached[_key(sid)] for sid in rest if _key(sid) in cached})
+
+    missing = [sid for sid in stock_ids if sid not in quotes]
+    if missing:
+        pool = ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(missing)))
+        futures = {pool.submit(get_quote, sid): sid for sid in missing}
+        done, _ = wait(futures, timeout=timeout)
+        pool.shutdown(wait=False)
+        for future, sid in futures.items():
+            if future in done:
+                quotes[sid] = future.result()
+            else:
+                quotes[sid] = {"stock_id": sid, "error": "Quote lookup timed out", "status": "error"}
+
+    return {sid: quotes[sid] for sid in stock_ids}
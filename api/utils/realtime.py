@@ -0,0 +1,158 @@
+# api/utils/realtime.py
+import json
+import logging
+import os
+import random
+import time
+from typing import Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+from twstock import realtime
+
+logger = logging.getLogger(__name__)
+
+TICK_KEY_FMT = "tick:{stock_id}"
+# Every changed tick is published here as JSON
+QUOTES_CHANNEL = "quotes"
+
+# Ticks older than this are not served; a few missed ingest runs at most
+TICK_MAX_AGE = float(os.getenv("REALTIME_MAX_AGE", 15))
+TICK_TTL = 60 * 60
+# Codes per upstream request; mis.twse.com.tw takes a '|'-joined list
+REALTIME_BATCH_SIZE = int(os.getenv("REALTIME_BATCH_SIZE", 50))
+QUOTE_SOURCE = os.getenv("REALTIME_QUOTE_SOURCE", "api.utils.realtime.TwstockRealtimeSource")
+
+
+def _key(stock_id: str) -> str:
+    return TICK_KEY_FMT.format(stock_id=stock_id)
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def make_tick(stock_id: str, price: float, open_: float, high: float, low: float,
+              volume: int, previous_close: Optional[float], ts: float) -> Dict:
+    """Tick shaped like quote_cache.fetch_quote, plus exchange and ingest times"""
+    change = price - previous_close if previous_close else 0
+    return {
+        "stock_id": stock_id,
+        "price": price,
+        "open": open_ if open_ is not None else price,
+        "high": high if high is not None else price,
+        "low": low if low is not None else price,
+        "volume": volume,
+        "change": change,
+        "change_percent": (change / previous_close) * 100 if previous_close else 0,
+        "status": "success",
+        "source": "realtime",
+        "ts": ts,
+        "fetched_at": time.time(),
+    }
+
+
+class TwstockRealtimeSource:
+    """Live ticks from mis.twse.com.tw, many codes per request
+
+    Uses ``realtime.get_raw`` because the formatted ``realtime.get`` result
+    drops the previous close ("y") needed for the day's change.
+    """
+
+    def fetch(self, stock_ids: List[str]) -> Dict[str, Dict]:
+        ticks = {}
+        for i in range(0, len(stock_ids), REALTIME_BATCH_SIZE):
+            batch = stock_ids[i:i + REALTIME_BATCH_SIZE]
+            try:
+                data = realtime.get_raw(batch)
+            except Exception as e:
+                # Timeouts, connection resets, non-JSON replies: the other batches still count
+                logger.warning("Realtime batch %s failed: %s", batch, str(e))
+                continue
+            if "msgArray" not in data:
+                logger.warning("Realtime batch failed: %s", data.get("rtmessage"))
+                continue
+            for row in data["msgArray"]:
+                # "z" is "-" until the first trade of the snapshot interval
+                price = _float(row.get("z"))
+                if price is None:
+                    continue
+                volume = _float(row.get("v"))
+                ticks[row["c"]] = make_tick(
+                    row["c"], price,
+                    _float(row.get("o")), _float(row.get("h")), _float(row.get("l")),
+                    int(volume * 1000) if volume is not None else 0,  # lots of 1000 shares
+                    _float(row.get("y")),
+                    int(row["tlong"]) / 1000,
+                )
+        return ticks
+
+
+class FakeQuoteSource:
+    """Deterministic random-walk feed for tests and local development"""
+
+    def __init__(self, start_price: float = 100.0, seed: int = 0):
+        self.start_price = start_price
+        self.rng = random.Random(seed)
+        self.prices: Dict[str, float] = {}
+
+    def fetch(self, stock_ids: List[str]) -> Dict[str, Dict]:
+        ticks = {}
+        for stock_id in stock_ids:
+            previous = self.prices.get(stock_id, self.start_price)
+            price = round(previous * (1 + self.rng.uniform(-0.01, 0.01)), 2)
+            self.prices[stock_id] = price
+            ticks[stock_id] = make_tick(stock_id, price, None, None, None, 0, self.start_price, time.time())
+        return ticks
+
+
+_source = None
+
+
+def get_source():
+    """The configured source, created once per process so feeds keep state"""
+    global _source
+    if _source is None:
+        _source = import_string(QUOTE_SOURCE)()
+    return _source
+
+
+def ingest(stock_ids: Iterable[str], source=None) -> List[Dict]:
+    """Store the latest tick per symbol; publishes and returns those that changed"""
+    stock_ids = list(dict.fromkeys(stock_ids))
+    if not stock_ids:
+        return []
+    ticks = (source or get_source()).fetch(stock_ids)
+    if not ticks:
+        return []
+
+    previous = cache.get_many([_key(sid) for sid in ticks])
+    cache.set_many({_key(sid): tick for sid, tick in ticks.items()}, TICK_TTL)
+
+    changed = []
+    for sid, tick in ticks.items():
+        prev = previous.get(_key(sid))
+        if prev is None or (prev["price"], prev["volume"]) != (tick["price"], tick["volume"]):
+            changed.append(tick)
+    if changed:
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        for tick in changed:
+            pipe.publish(QUOTES_CHANNEL, json.dumps(tick))
+        pipe.execute()
+    return changed
+
+
+def _fresh(tick: Optional[Dict], now: float) -> bool:
+    return tick is not None and now - tick["fetched_at"] <= TICK_MAX_AGE
+
+
+def get_fresh_ticks(stock_ids: Iterable[str]) -> Dict[str, Dict]:
+    """Ticks no older than TICK_MAX_AGE; stale or missing symbols are left out"""
+    stock_ids = list(stock_ids)
+    cached = cache.get_many([_key(sid) for sid in stock_ids])
+    now = time.time()
+    return {sid: cached[_key(sid)] for sid in stock_ids if _fresh(cached.get(_key(sid)), now)}
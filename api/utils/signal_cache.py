@@ -0,0 +1,115 @@
+# api/utils/signal_cache.py
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from twstock import BestFourPoint, Stock
+
+from api.models import Order, VirtualHolding
+from .market_hours import SETTLE_DELAY, is_market_open, last_settled_close, taipei_now
+from .price_history import stored_stock
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_KEY_FMT = "signals:{stock_id}"
+LAST_RUN_KEY = "signals:last_run"
+# Sorted set of symbols looked up through the API, scored by last access time
+WATCHED_KEY = "signals:watched"
+
+# Long enough to bridge a weekend; symbols nobody tracks any more age out
+SIGNAL_TTL = 60 * 60 * 24 * 4
+WATCH_WINDOW = 60 * 60 * 24 * 7
+# Each symbol costs a history fetch against TWSE, which rate-limits clients
+SIGNAL_MAX_WORKERS = int(os.getenv("SIGNAL_WORKERS", 4))
+
+
+def _key(stock_id: str) -> str:
+    return SIGNAL_KEY_FMT.format(stock_id=stock_id)
+
+
+def watch_symbols(stock_ids: Iterable[str]):
+    """Keep symbols users look at in the precompute set for WATCH_WINDOW"""
+    now = time.time()
+    mapping = {sid: now for sid in stock_ids}
+    if mapping:
+        get_redis_connection("default").zadd(WATCHED_KEY, mapping)
+
+
+def tracked_symbols() -> List[str]:
+    """Every symbol held or with a resting order, plus those watched within WATCH_WINDOW"""
+    conn = get_redis_connection("default")
+    cutoff = time.time() - WATCH_WINDOW
+    conn.zremrangebyscore(WATCHED_KEY, "-inf", cutoff)
+    watched = [sid.decode() for sid in conn.zrange(WATCHED_KEY, 0, -1)]
+    held = VirtualHolding.objects.values_list("stock_id", flat=True).distinct()
+    ordered = Order.objects.filter(status=Order.OPEN).values_list("stock_id", flat=True).distinct()
+    return sorted(set(held) | set(ordered) | set(watched))
+
+
+def compute_signal(stock_id: str) -> Dict:
+    """Run BestFourPoint on the last 31 days of ``stock_id`` (uncached)
+
+    Reads the local history store, going upstream only for symbols that
+    do not have a month of stored bars yet.
+    """
+    stock = stored_stock(stock_id) or Stock(stock_id)
+    best_four_point = BestFourPoint(stock).best_four_point()
+    return {
+        "stock_id": stock_id,
+        "best_four_point": best_four_point,
+        "computed_at": taipei_now().isoformat(),
+    }
+
+
+def refresh_signal(stock_id: str) -> Dict:
+    signal = compute_signal(stock_id)
+    cache.set(_key(stock_id), signal, SIGNAL_TTL)
+    return signal
+
+
+def get_signal(stock_id: str) -> Optional[Dict]:
+    return cache.get(_key(stock_id))
+
+
+def get_signals(stock_ids: Iterable[str]) -> Dict[str, Dict]:
+    """Cached signals by symbol; symbols never computed are left out"""
+    stock_ids = list(dict.fromkeys(stock_ids))
+    cached = cache.get_many([_key(sid) for sid in stock_ids])
+    return {sid: cached[_key(sid)] for sid in stock_ids if _key(sid) in cached}
+
+
+def refresh_due(now: Optional[datetime] = None) -> bool:
+    """During the session always; otherwise once the last close has settled"""
+    now = taipei_now(now)
+    if is_market_open(now):
+        return True
+    settled = last_settled_close(now) + SETTLE_DELAY
+    last_run = cache.get(LAST_RUN_KEY)
+    return last_run is None or last_run < settled
+
+
+def refresh_signals(stock_ids: Iterable[str]) -> Dict[str, Dict]:
+    """Recompute and store signals; failures keep the previous cached value"""
+    stock_ids = list(stock_ids)
+    signals = {}
+
+    def _compute(stock_id):
+        try:
+            return compute_signal(stock_id)
+        except Exception as e:
+            logger.warning("Signal computation failed for %s: %s", stock_id, str(e))
+            return None
+
+    if stock_ids:
+        with ThreadPoolExecutor(max_workers=min(SIGNAL_MAX_WORKERS, len(stock_ids))) as pool:
+            for stock_id, signal in zip(stock_ids, pool.map(_compute, stock_ids)):
+                if signal is not None:
+                    signals[stock_id] = signal
+        cache.set_many({_key(sid): signal for sid, signal in signals.items()}, SIGNAL_TTL)
+    cache.set(LAST_RUN_KEY, taipei_now(), None)
+    return signals
@@ -0,0 +1,77 @@
+# api/utils/stock_codes.py
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import twstock
+
+# Warrants make up most of twstock.codes; they stay valid symbols but are
+# left out of autocomplete so stocks and ETFs are not drowned out
+WARRANT_TYPES = ("上市認購(售)權證", "上櫃認購(售)權證")
+
+SEARCH_LIMIT_MAX = 50
+
+
+class _SortedPrefixIndex:
+    """Sorted (key, code) pairs; a prefix match is the slice between two bisects"""
+
+    def __init__(self, pairs):
+        pairs = sorted(pairs)
+        self.keys = [key for key, _ in pairs]
+        self.codes = [code for _, code in pairs]
+
+    def prefix(self, query: str, limit: int) -> List[str]:
+        lo = bisect_left(self.keys, query)
+        hi = min(bisect_left(self.keys, query + "\U0010ffff", lo), lo + limit)
+        return self.codes[lo:hi]
+
+
+class _CodeIndex:
+    """Lookup structures built once from twstock.codes
+
+    ``info`` answers validation with a dict lookup; codes and names
+    (casefolded) each get a sorted prefix index for autocomplete.
+    """
+
+    def __init__(self, codes: Dict):
+        self.info = dict(codes)
+        searchable = [c for c in self.info.values() if c.type not in WARRANT_TYPES]
+        self.by_code = _SortedPrefixIndex((c.code.casefold(), c.code) for c in searchable)
+        self.by_name = _SortedPrefixIndex((c.name.casefold(), c.code) for c in searchable if c.name)
+
+
+@lru_cache(maxsize=1)
+def _index() -> _CodeIndex:
+    return _CodeIndex(twstock.codes)
+
+
+def is_valid_stock_id(stock_id: str) -> bool:
+    """Whether twstock knows ``stock_id`` (the same check Stock() starts with)"""
+    return stock_id in _index().info
+
+
+def lookup(stock_id: str) -> Optional[Dict]:
+    info = _index().info.get(stock_id)
+    if info is None:
+        return None
+    return {
+        "stock_id": info.code,
+        "name": info.name,
+        "type": info.type,
+        "market": info.market,
+        "group": info.group,
+    }
+
+
+def search(query: str, limit: int = 10) -> List[Dict]:
+    """Symbols whose code or name starts with ``query``
+
+    Code matches come first (2330 before 台積電), then name matches, each in
+    sorted order.
+    """
+    query = query.strip().casefold()
+    if not query:
+        return []
+    index = _index()
+    codes = index.by_code.prefix(query, limit) + index.by_name.prefix(query, limit)
+    return [lookup(code) for code in dict.fromkeys(codes)][:limit]
@@ -1,72 +1,120 @@
 # Fix for /app/api/utils/sync_holdings.py
 
-from django.core.cache import cache
-from api.models import VirtualHolding
-import json
-import time
+from django.db import transaction
+from django.db.models import Q
+from api.models import CashAccount, RealizedPnl, VirtualHolding
+from api.utils.trading_cache import (
+    clear_dirty_user,
+    get_cash_many,
+    get_user_ledgers,
+    mark_cash_dirty,
+    mark_users_dirty,
+    pop_dirty_cash_users,
+    pop_dirty_users,
+)
+import logging
 
-def sync_holdings_to_redis(user):
-    """Sync user holdings from PostgreSQL to Redis cache"""
+logger = logging.getLogger(__name__)
+
+def _persist_positions(user_ids):
+    """Upsert the Redis ledger of ``user_ids`` into VirtualHolding and RealizedPnl in one transaction"""
+    # Cold ledgers are left out: Postgres already holds their latest state
+    ledgers = get_user_ledgers(user_ids)
+    if not ledgers:
+        return 0
+    snapshot = {user_id: positions for user_id, (positions, _) in ledgers.items()}
+
+    rows = [
+        VirtualHolding(
+            user_id=user_id,
+            stock_id=stock_id,
+            quantity=p["quantity"],
+            cost_cents=p["cost_cents"],
+            buy_price=p["cost_cents"] / 100 / p["quantity"],
+        )
+        for user_id, positions in snapshot.items()
+        for stock_id, p in positions.items()
+    ]
+
+    realized = [
+        RealizedPnl(user_id=user_id, stock_id=stock_id, **r)
+        for user_id, (_, by_symbol) in ledgers.items()
+        for stock_id, r in by_symbol.items()
+    ]
+
+    # Positions closed since the last flush: rows the ledger no longer has
+    closed = Q()
+    for user_id, positions in snapshot.items():
+        closed |= Q(user_id=user_id) & ~Q(stock_id__in=list(positions))
+
+    with transaction.atomic():
+        if rows:
+            VirtualHolding.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=["user", "stock_id"],
+                update_fields=["quantity", "cost_cents", "buy_price"],
+            )
+        VirtualHolding.objects.filter(closed).delete()
+        if realized:
+            RealizedPnl.objects.bulk_create(
+                realized,
+                update_conflicts=True,
+                unique_fields=["user", "stock_id"],
+                update_fields=["realized_cents", "sold_quantity", "sold_cost_cents", "updated_at"],
+            )
+    return len(rows)
+
+
+def flush_dirty_holdings(batch_size=500):
+    """Write-behind: persist one batch of users whose holdings changed"""
+    user_ids = pop_dirty_users(batch_size)
+    if not user_ids:
+        return 0
+    try:
+        _persist_positions(user_ids)
+    except Exception:
+        # Put the batch back so the next run retries it
+        mark_users_dirty(user_ids)
+        raise
+    return len(user_ids)
+
+
+def _persist_cash(user_ids):
+    """Upsert the Redis cash of ``user_ids`` into CashAccount"""
+    accounts = [
+        CashAccount(user_id=user_id, balance_cents=cash["available"], reserved_cents=cash["reserved"])
+        for user_id, cash in get_cash_many(user_ids).items()
+    ]
+    if accounts:
+        CashAccount.objects.bulk_create(
+            accounts,
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["balance_cents", "reserved_cents", "updated_at"],
+        )
+    return len(accounts)
+
+
+def flush_dirty_cash(batch_size=500):
+    """Write-behind: persist one batch of users whose cash changed"""
+    user_ids = pop_dirty_cash_users(batch_size)
+    if not user_ids:
+        return 0
     try:
-        # Get all holdings for the user from database
-        holdings = VirtualHolding.objects.filter(user=user)
-        
-        # Convert to the format expected by Redis
-        data = [
-            {
-                "stock_id": h.stock_id,
-                "buy_price": h.buy_price,
-                "quantity": h.quantity,
-                # FIX: Format datetime properly instead of using localtime()
-                "buy_time": h.buy_time.strftime('%Y-%m-%d %H:%M:%S')
-                # Alternative: "buy_time": h.buy_time.isoformat()
-            }
-            for h in holdings
-        ]
-        
-        # Store in Redis with user-specific key
-        cache_key = f"user_holdings_{user.id}"
-        cache.set(cache_key, json.dumps(data), timeout=None)  # No expiration
-        
-        print(f"✅ Synced {len(data)} holdings to Redis for user {user.username}")
-        
-    except Exception as e:
-        print(f"❌ Error syncing holdings to Redis: {str(e)}")
-        # Don't raise the exception to prevent login failure
-        pass
+        _persist_cash(user_ids)
+    except Exception:
+        mark_cash_dirty(user_ids)
+        raise
+    return len(user_ids)
+
 
 def sync_holdings_to_postgres(user):
-    """Sync user holdings from Redis cache to PostgreSQL"""
+    """Sync user holdings from the Redis ledger to PostgreSQL right away"""
+    clear_dirty_user(user.id)
     try:
-        cache_key = f"user_holdings_{user.id}"
-        cached_data = cache.get(cache_key)
-        
-        if not cached_data:
-            print(f"No cached holdings found for user {user.username}")
-            return
-        
-        holdings_data = json.loads(cached_data)
-        
-        # Clear existing holdings for user
-        VirtualHolding.objects.filter(user=user).delete()
-        
-        # Create new holdings from cache
-        for holding in holdings_data:
-            # Parse the datetime string back to datetime object
-            from datetime import datetime
-            buy_time = datetime.strptime(holding['buy_time'], '%Y-%m-%d %H:%M:%S')
-            
-            VirtualHolding.objects.create(
-                user=user,
-                stock_id=holding['stock_id'],
-                buy_price=holding['buy_price'],
-                quantity=holding['quantity'],
-                buy_time=buy_time
-            )
-        
-        print(f"✅ Synced {len(holdings_data)} holdings to PostgreSQL for user {user.username}")
-        
-    except Exception as e:
-        print(f"❌ Error syncing holdings to PostgreSQL: {str(e)}")
-        # Don't raise the exception
-        pass
\ No newline at end of file
+        count = _persist_positions([user.id])
+    except Exception:
+        mark_users_dirty([user.id])
+        raise
+    logger.info("Synced %d holdings to PostgreSQL for user %s", count, user.username)
@@ -0,0 +1,130 @@
+# api/utils/trade_journal.py
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import List, Optional
+
+from django_redis import get_redis_connection
+from redis.exceptions import LockError, ResponseError
+
+from api.models import TradeHistory
+
+logger = logging.getLogger(__name__)
+
+# Trades are appended to a Redis stream on the request path and copied to
+# TradeHistory in batches by a consumer group. The stream entry id becomes
+# TradeHistory.journal_id, so a batch that is flushed twice (a crash between
+# INSERT and XACK) inserts nothing the second time. Entries are deleted once
+# acknowledged, so the stream only holds trades not yet in Postgres.
+JOURNAL_STREAM = "trades:journal"
+JOURNAL_GROUP = "trade-writers"
+# One logical consumer: unacknowledged entries are re-read by whichever
+# process flushes next, instead of waiting on a consumer that died
+JOURNAL_CONSUMER = "flusher"
+JOURNAL_BATCH_SIZE = 1000
+# Serializes flushers so batches land in journal order
+JOURNAL_LOCK_KEY = "trades:journal:lock"
+JOURNAL_LOCK_TTL = 60
+
+
+def _conn():
+    return get_redis_connection("default")
+
+
+def _ensure_group(conn):
+    try:
+        conn.xgroup_create(JOURNAL_STREAM, JOURNAL_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def record_trade(user_id: int, stock_id: str, side: str, price: float, quantity: int,
+                 ts: Optional[float] = None) -> str:
+    """Journal one trade; returns its stream entry id"""
+    entry = {
+        "user_id": user_id,
+        "stock_id": stock_id,
+        "side": side,
+        "price": repr(float(price)),
+        "quantity": quantity,
+        "ts": repr(ts if ts is not None else time.time()),
+    }
+    return _conn().xadd(JOURNAL_STREAM, entry).decode()
+
+
+def _to_row(entry_id: bytes, fields: dict) -> TradeHistory:
+    f = {k.decode(): v.decode() for k, v in fields.items()}
+    return TradeHistory(
+        journal_id=entry_id.decode(),
+        user_id=int(f["user_id"]),
+        stock_id=f["stock_id"],
+        side=f["side"],
+        price=float(f["price"]),
+        quantity=int(f["quantity"]),
+        ts=datetime.fromtimestamp(float(f["ts"]), tz=dt_timezone.utc),
+    )
+
+
+def pending_trades(user_id: int) -> List[TradeHistory]:
+    """Unsaved rows for ``user_id``'s trades still in the journal, newest first
+
+    The stream only holds trades not yet flushed (a couple of seconds'
+    worth), so this scans it whole rather than keeping a per-user index.
+    Entries a running flush has already inserted are left out.
+    """
+    conn = _conn()
+    user = str(user_id).encode()
+    rows = [
+        _to_row(entry_id, fields)
+        for entry_id, fields in conn.xrevrange(JOURNAL_STREAM)
+        if fields.get(b"user_id") == user
+    ]
+    if not rows:
+        return rows
+    saved = set(
+        TradeHistory.objects.filter(journal_id__in=[r.journal_id for r in rows])
+        .values_list("journal_id", flat=True)
+    )
+    return [r for r in rows if r.journal_id not in saved]
+
+
+def _read(conn, start: str, count: int) -> List:
+    response = conn.xreadgroup(JOURNAL_GROUP, JOURNAL_CONSUMER, {JOURNAL_STREAM: start}, count=count)
+    return response[0][1] if response else []
+
+
+def flush_journal(batch_size: int = JOURNAL_BATCH_SIZE, wait: float = 5) -> int:
+    """Copy journaled trades into TradeHistory, oldest first; returns rows written
+
+    Waits up to ``wait`` seconds for a flush already running elsewhere, so a
+    caller that returns normally sees every trade journaled before the call.
+    """
+    conn = _conn()
+    try:
+        with conn.lock(JOURNAL_LOCK_KEY, timeout=JOURNAL_LOCK_TTL, blocking_timeout=wait):
+            return _flush(conn, batch_size)
+    except LockError:
+        logger.info("Trade journal flush skipped, another flush is still running")
+        return 0
+
+
+def _flush(conn, batch_size: int) -> int:
+    # Entries read earlier but never acknowledged (a flush that failed part
+    # way) are retried before new ones
+    _ensure_group(conn)
+    flushed = 0
+    while True:
+        entries = _read(conn, "0", batch_size) or _read(conn, ">", batch_size)
+        if not entries:
+            return flushed
+        TradeHistory.objects.bulk_create(
+            [_to_row(entry_id, fields) for entry_id, fields in entries if fields],
+            ignore_conflicts=True,
+        )
+        ids = [entry_id for entry_id, _ in entries]
+        pipe = conn.pipeline()
+        pipe.xack(JOURNAL_STREAM, JOURNAL_GROUP, *ids)
+        pipe.xdel(JOURNAL_STREAM, *ids)
+        pipe.execute()
+        flushed += len(entries)
@@ -1,31 +1,511 @@
 # api/utils/trading_cache.py
-from django.core.cache import cache
-from typing import Dict, List
+from django_redis import get_redis_connection
+from typing import Dict, List, Optional, Tuple
 
+from api.models import CashAccount, RealizedPnl, VirtualHolding
+
+# Script results: -2 means the ledger is not loaded yet, -1 insufficient funds/shares
+_COLD = -2
+_INSUFFICIENT = -1
+
+# Each user's holdings live in one Redis hash, one set of fields per symbol:
+#   qty:<stock_id>       shares held
+#   cost:<stock_id>      total cost basis of those shares, in integer cents
+#   realized:<stock_id>  realized P&L from sales so far, in cents
+#   sold:<stock_id>      shares sold so far
+#   soldcost:<stock_id>  cost basis of the shares sold so far, in cents
+#   __v                  ledger format version, set once the hash is hydrated
+# Open lots queue up FIFO in a list per symbol, one "<qty>:<cost cents>"
+# entry per buy; a sale pops whole lots from the head and splits at most
+# one, so each lot is consumed once (amortized O(1)) and the exact cost of
+# what was sold is known. Trades are applied by server-side scripts, so
+# they are atomic regardless of how many positions the user has. A hash
+# without the current version stamp is cold: it is loaded from
+# VirtualHolding and RealizedPnl on first use.
 CACHE_KEY_FMT = "holdings:{user_id}"
+LOTS_KEY_FMT = "lots:{user_id}:{stock_id}"
+LEDGER_VERSION = "1"
+
+# Users whose ledger changed since the last write-behind flush to Postgres
+DIRTY_HOLDINGS_KEY = "holdings:dirty"
+
+# Leaderboard state, kept current by the trade scripts below and by quote
+# ticks (see leaderboard.py):
+#   symbol:holders:<stock_id>  hash user id -> shares held (reverse index)
+#   leaderboard:marks          hash stock_id -> last marked price, in cents
+#   leaderboard:equity         sorted set user id -> cash + marked holdings, in cents
+# Trades only adjust scores of users already ranked (ZADD XX), so a partial
+# score is never created; users join through leaderboard.rank_user.
+HOLDERS_KEY_FMT = "symbol:holders:{stock_id}"
+MARKS_KEY = "leaderboard:marks"
+LEADERBOARD_KEY = "leaderboard:equity"
+
+# Idempotent: a warm ledger is left alone, and fields already present are
+# never overwritten by the (possibly older) Postgres copy. Each hydrated
+# symbol's lot queue restarts as one lot holding the whole position at its
+# total cost, ahead of any later buy. KEYS[2..] are those queues, in the
+# order of the leading qty/cost field pairs in ARGV.
+_HYDRATE_SCRIPT = """
+if redis.call('HGET', KEYS[1], '__v') == ARGV[1] then
+    return 0
+end
+for i = 2, #ARGV, 2 do
+    redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+for i = 2, #KEYS do
+    local field = 2 + 4 * (i - 2)
+    local qty = tonumber(redis.call('HGET', KEYS[1], ARGV[field]) or '0')
+    local cost = tonumber(redis.call('HGET', KEYS[1], ARGV[field + 2]) or '0')
+    redis.call('DEL', KEYS[i])
+    if qty > 0 then
+        redis.call('RPUSH', KEYS[i], string.format('%d:%d', qty, cost))
+    end
+end
+redis.call('HSET', KEYS[1], '__v', ARGV[1])
+return 1
+"""
+
+_BUY_SCRIPT = """
+if redis.call('HGET', KEYS[1], '__v') ~= ARGV[5] then
+    return -2
+end
+-- A queue left over from an earlier, closed position is stale; a missing
+-- one for an open position starts as a single lot so it is sold first
+local before = tonumber(redis.call('HGET', KEYS[1], 'qty:' .. ARGV[1]) or '0')
+if before <= 0 then
+    redis.call('DEL', KEYS[3])
+elseif redis.call('LLEN', KEYS[3]) == 0 then
+    local cost = tonumber(redis.call('HGET', KEYS[1], 'cost:' .. ARGV[1]) or '0')
+    redis.call('RPUSH', KEYS[3], string.format('%d:%d', before, cost))
+end
+local held = redis.call('HINCRBY', KEYS[1], 'qty:' .. ARGV[1], ARGV[2])
+redis.call('HINCRBY', KEYS[1], 'cost:' .. ARGV[1], ARGV[3])
+redis.call('RPUSH', KEYS[3], ARGV[2] .. ':' .. ARGV[3])
+redis.call('SADD', KEYS[2], ARGV[4])
+
+redis.call('HSET', KEYS[4], ARGV[4], held)
+-- The first trade in a symbol marks it until a tick arrives
+redis.call('HSETNX', KEYS[6], ARGV[1], math.floor(tonumber(ARGV[3]) / tonumber(ARGV[2]) + 0.5))
+local mark = tonumber(redis.call('HGET', KEYS[6], ARGV[1]))
+redis.call('ZADD', KEYS[5], 'XX', 'INCR', mark * tonumber(ARGV[2]) - tonumber(ARGV[3]), ARGV[4])
+return 1
+"""
+
+# Returns {shares left, realized P&L in cents}, or -1 if fewer than
+# requested are held
+_SELL_SCRIPT = """
+if redis.call('HGET', KEYS[1], '__v') ~= ARGV[5] then
+    return -2
+end
+local sid = ARGV[1]
+local quantity = tonumber(ARGV[2])
+local held = tonumber(redis.call('HGET', KEYS[1], 'qty:' .. sid) or '0')
+if held < quantity then
+    return -1
+end
+local cost = tonumber(redis.call('HGET', KEYS[1], 'cost:' .. sid) or '0')
+if redis.call('LLEN', KEYS[3]) == 0 then
+    redis.call('RPUSH', KEYS[3], string.format('%d:%d', held, cost))
+end
+
+local left = quantity
+local sold_cost = 0
+while left > 0 do
+    local lot = redis.call('LINDEX', KEYS[3], 0)
+    if not lot then
+        -- Queue shorter than the position: price the rest at average cost
+        sold_cost = sold_cost + math.floor((cost - sold_cost) * left / (held - quantity + left))
+        break
+    end
+    local q, c = string.match(lot, '(%d+):(%d+)')
+    q = tonumber(q)
+    c = tonumber(c)
+    if q <= left then
+        redis.call('LPOP', KEYS[3])
+        sold_cost = sold_cost + c
+        left = left - q
+    else
+        local part = math.floor(c * left / q)
+        redis.call('LSET', KEYS[3], 0, string.format('%d:%d', q - left, c - part))
+        sold_cost = sold_cost + part
+        left = 0
+    end
+end
+
+local realized = tonumber(ARGV[3]) - sold_cost
+redis.call('HINCRBY', KEYS[1], 'realized:' .. sid, realized)
+redis.call('HINCRBY', KEYS[1], 'sold:' .. sid, quantity)
+redis.call('HINCRBY', KEYS[1], 'soldcost:' .. sid, sold_cost)
+redis.call('SADD', KEYS[2], ARGV[4])
+
+local mark = tonumber(redis.call('HGET', KEYS[6], sid) or math.floor(cost / held + 0.5))
+redis.call('ZADD', KEYS[5], 'XX', 'INCR', tonumber(ARGV[3]) - mark * quantity, ARGV[4])
+
+local remaining = held - quantity
+if remaining == 0 then
+    redis.call('HDEL', KEYS[1], 'qty:' .. sid, 'cost:' .. sid)
+    redis.call('DEL', KEYS[3])
+    redis.call('HDEL', KEYS[4], ARGV[4])
+else
+    redis.call('HSET', KEYS[4], ARGV[4], remaining)
+    redis.call('HSET', KEYS[1], 'qty:' .. sid, remaining, 'cost:' .. sid, cost - sold_cost)
+end
+return {remaining, realized}
+"""
+
+# Cash lives in a second hash per user, in integer cents and without expiry:
+#   available  spendable balance
+#   reserved   funds held back for resting orders
+# Like holdings, cash is written behind: every change adds the user to
+# cash:dirty in the same script, and a beat job copies the balances to
+# CashAccount, which re-seeds Redis on a miss.
+CASH_KEY_FMT = "cash:{user_id}"
+DIRTY_CASH_KEY = "cash:dirty"
+DEFAULT_CASH_BALANCE = 1000000.0  # 1,000,000 NTD
+
+_CASH_HYDRATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], 'available', ARGV[1], 'reserved', ARGV[2])
+end
+return 1
+"""
+
+# Moves ARGV[1] cents from field ARGV[2] to field ARGV[3] (if given),
+# refusing when the source field would go negative; ARGV[4] is the user id
+_CASH_MOVE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -2
+end
+local amount = tonumber(ARGV[1])
+local source = tonumber(redis.call('HGET', KEYS[1], ARGV[2]) or '0')
+if source < amount then
+    return -1
+end
+redis.call('HINCRBY', KEYS[1], ARGV[2], -amount)
+if ARGV[3] ~= '' then
+    redis.call('HINCRBY', KEYS[1], ARGV[3], amount)
+end
+redis.call('SADD', KEYS[2], ARGV[4])
+return tonumber(redis.call('HGET', KEYS[1], 'available'))
+"""
+
+_CASH_CREDIT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -2
+end
+redis.call('HINCRBY', KEYS[1], 'available', ARGV[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+return tonumber(redis.call('HGET', KEYS[1], 'available'))
+"""
+
+_scripts = {}
+
+
+class InsufficientShares(Exception):
+    pass
+
+
+class InsufficientFunds(Exception):
+    def __init__(self, available_cents: int, needed_cents: int):
+        self.available_cents = available_cents
+        self.needed_cents = needed_cents
+        super().__init__(
+            f"Insufficient funds. You have NT${from_cents(available_cents):,.2f} "
+            f"but need NT${from_cents(needed_cents):,.2f}"
+        )
+
 
 def _key(user_id: int) -> str:
     return CACHE_KEY_FMT.format(user_id=user_id)
 
+
+def _conn():
+    return get_redis_connection("default")
+
+
+def _script(source: str):
+    if source not in _scripts:
+        _scripts[source] = _conn().register_script(source)
+    return _scripts[source]
+
+
+def to_cents(amount: float) -> int:
+    return int(round(amount * 100))
+
+
+def from_cents(cents: int) -> float:
+    return cents / 100
+
+
+def _lots_key(user_id: int, stock_id: str) -> str:
+    return LOTS_KEY_FMT.format(user_id=user_id, stock_id=stock_id)
+
+
+def _parse_ledger(raw: Dict[bytes, bytes]) -> Optional[Tuple[Dict, Dict]]:
+    """(open positions, realized totals) per symbol; None for a cold ledger"""
+    fields = {k.decode(): v.decode() for k, v in raw.items()}
+    if fields.pop("__v", None) != LEDGER_VERSION:
+        return None
+    fields = {k: int(v) for k, v in fields.items()}
+    positions = {}
+    realized = {}
+    for field, value in fields.items():
+        kind, _, stock_id = field.partition(":")
+        if kind == "qty" and value > 0:
+            positions[stock_id] = {
+                "quantity": value,
+                "cost_cents": fields.get(f"cost:{stock_id}", 0),
+            }
+        elif kind == "sold":
+            realized[stock_id] = {
+                "realized_cents": fields.get(f"realized:{stock_id}", 0),
+                "sold_quantity": value,
+                "sold_cost_cents": fields.get(f"soldcost:{stock_id}", 0),
+            }
+    return positions, realized
+
+
+def get_user_ledgers(user_ids: List[int]) -> Dict[int, Tuple[Dict, Dict]]:
+    """Raw ledger snapshot for many users in one round trip (cold users are omitted)"""
+    pipe = _conn().pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.hgetall(_key(user_id))
+
+    snapshot = {}
+    for user_id, raw in zip(user_ids, pipe.execute()):
+        ledger = _parse_ledger(raw)
+        if ledger is not None:
+            snapshot[user_id] = ledger
+    return snapshot
+
+
+def get_user_positions(user_ids: List[int]) -> Dict[int, Dict[str, Dict[str, int]]]:
+    return {user_id: ledger[0] for user_id, ledger in get_user_ledgers(user_ids).items()}
+
+
+def hydrate_holdings(user_id: int) -> bool:
+    """Load a cold ledger from VirtualHolding and RealizedPnl; no-op if it is already warm"""
+    args = [LEDGER_VERSION]
+    keys = [_key(user_id)]
+    rows = VirtualHolding.objects.filter(user_id=user_id, quantity__gt=0)
+    # Position pairs come first: the script maps lot keys to them by position
+    for stock_id, quantity, cost_cents in rows.values_list("stock_id", "quantity", "cost_cents"):
+        args += [f"qty:{stock_id}", quantity, f"cost:{stock_id}", cost_cents]
+        keys.append(_lots_key(user_id, stock_id))
+    realized = RealizedPnl.objects.filter(user_id=user_id).values_list(
+        "stock_id", "realized_cents", "sold_quantity", "sold_cost_cents"
+    )
+    for stock_id, realized_cents, sold_quantity, sold_cost_cents in realized:
+        args += [
+            f"realized:{stock_id}", realized_cents,
+            f"sold:{stock_id}", sold_quantity,
+            f"soldcost:{stock_id}", sold_cost_cents,
+        ]
+    return bool(_script(_HYDRATE_SCRIPT)(keys=keys, args=args))
+
+
+def _run_ledger_script(user_id: int, source: str, stock_id: str, args: list):
+    script = _script(source)
+    keys = [
+        _key(user_id), DIRTY_HOLDINGS_KEY, _lots_key(user_id, stock_id),
+        HOLDERS_KEY_FMT.format(stock_id=stock_id), LEADERBOARD_KEY, MARKS_KEY,
+    ]
+    args = [stock_id] + args + [user_id, LEDGER_VERSION]
+    result = script(keys=keys, args=args)
+    if result == _COLD:
+        hydrate_holdings(user_id)
+        result = script(keys=keys, args=args)
+    return result
+
+
 def get_user_holdings(user_id: int) -> List[Dict]:
-    return cache.get(_key(user_id), [])
+    positions = get_user_positions([user_id]).get(user_id)
+    if positions is None:
+        hydrate_holdings(user_id)
+        positions = get_user_positions([user_id]).get(user_id, {})
+    return [
+        {
+            "stock_id": stock_id,
+            "buy_price": round(from_cents(p["cost_cents"]) / p["quantity"], 4),
+            "quantity": p["quantity"],
+        }
+        for stock_id, p in sorted(positions.items())
+    ]
+
+
+def pop_dirty_users(count: int) -> List[int]:
+    """Claim up to ``count`` users whose holdings need persisting"""
+    return [int(u) for u in _conn().spop(DIRTY_HOLDINGS_KEY, count) or []]
+
+
+def mark_users_dirty(user_ids: List[int]):
+    if user_ids:
+        _conn().sadd(DIRTY_HOLDINGS_KEY, *user_ids)
+
+
+def clear_dirty_user(user_id: int):
+    _conn().srem(DIRTY_HOLDINGS_KEY, user_id)
+
 
 def add_user_holding(user_id: int, holding: Dict):
-    holdings = get_user_holdings(user_id)
-    holdings.append(holding)
-    cache.set(_key(user_id), holdings, None)
-
-def remove_user_holding(user_id: int, stock_id: str, quantity: int):
-    holdings = get_user_holdings(user_id)
-    new_list = []
-    to_remove = quantity
-    for h in holdings:
-        if h["stock_id"] == stock_id and to_remove > 0:
-            if h["quantity"] <= to_remove:
-                to_remove -= h["quantity"]
-                continue
-            else:
-                h["quantity"] -= to_remove
-                to_remove = 0
-        new_list.append(h)
-    cache.set(_key(user_id), new_list, None)
+    quantity = int(holding["quantity"])
+    _run_ledger_script(
+        user_id,
+        _BUY_SCRIPT,
+        holding["stock_id"],
+        [quantity, to_cents(holding["buy_price"] * quantity)],
+    )
+
+
+def remove_user_holding(user_id: int, stock_id: str, quantity: int, sell_price: float) -> Tuple[int, int]:
+    """Sell the oldest lots first; returns (shares left, realized P&L in cents)"""
+    quantity = int(quantity)
+    result = _run_ledger_script(user_id, _SELL_SCRIPT, stock_id, [quantity, to_cents(sell_price * quantity)])
+    if result == _INSUFFICIENT:
+        raise InsufficientShares(f"Insufficient shares of {stock_id} to sell {quantity}")
+    remaining, realized_cents = result
+    return remaining, realized_cents
+
+
+def get_user_pnl(user_id: int) -> Dict[str, Dict]:
+    """Per-symbol average cost and realized P&L, straight from the ledger"""
+    ledger = get_user_ledgers([user_id]).get(user_id)
+    if ledger is None:
+        hydrate_holdings(user_id)
+        ledger = get_user_ledgers([user_id]).get(user_id, ({}, {}))
+    positions, realized = ledger
+    symbols = {}
+    for stock_id in sorted(set(positions) | set(realized)):
+        p = positions.get(stock_id, {"quantity": 0, "cost_cents": 0})
+        r = realized.get(stock_id, {"realized_cents": 0, "sold_quantity": 0, "sold_cost_cents": 0})
+        symbols[stock_id] = {
+            "stock_id": stock_id,
+            "quantity": p["quantity"],
+            "avg_cost": round(from_cents(p["cost_cents"]) / p["quantity"], 4) if p["quantity"] else None,
+            "cost_basis": from_cents(p["cost_cents"]),
+            "realized_pnl": from_cents(r["realized_cents"]),
+            "sold_quantity": r["sold_quantity"],
+            "realized_return_percent": (
+                round(r["realized_cents"] / r["sold_cost_cents"] * 100, 4) if r["sold_cost_cents"] else None
+            ),
+        }
+    return symbols
+
+
+def _cash_key(user_id: int) -> str:
+    return CASH_KEY_FMT.format(user_id=user_id)
+
+
+def _hydrate_cash(user_id: int):
+    account, _ = CashAccount.objects.get_or_create(
+        user_id=user_id,
+        defaults={"balance_cents": to_cents(DEFAULT_CASH_BALANCE)},
+    )
+    _script(_CASH_HYDRATE_SCRIPT)(
+        keys=[_cash_key(user_id)],
+        args=[account.balance_cents, account.reserved_cents],
+    )
+
+
+def _run_cash_script(user_id: int, source: str, args: list) -> int:
+    script = _script(source)
+    keys = [_cash_key(user_id), DIRTY_CASH_KEY]
+    args = args + [user_id]
+    result = script(keys=keys, args=args)
+    if result == _COLD:
+        _hydrate_cash(user_id)
+        result = script(keys=keys, args=args)
+    return result
+
+
+def pop_dirty_cash_users(count: int) -> List[int]:
+    """Claim up to ``count`` users whose cash needs persisting"""
+    return [int(u) for u in _conn().spop(DIRTY_CASH_KEY, count) or []]
+
+
+def mark_cash_dirty(user_ids: List[int]):
+    if user_ids:
+        _conn().sadd(DIRTY_CASH_KEY, *user_ids)
+
+
+def get_cash_many(user_ids: List[int]) -> Dict[int, Dict[str, int]]:
+    """Live cash of the users cached in Redis; cold users are left out"""
+    pipe = _conn().pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.hgetall(_cash_key(user_id))
+    return {
+        user_id: {k.decode(): int(v) for k, v in raw.items()}
+        for user_id, raw in zip(user_ids, pipe.execute()) if raw
+    }
+
+
+def get_cash_cents(user_id: int) -> Dict[str, int]:
+    raw = _conn().hgetall(_cash_key(user_id))
+    if not raw:
+        _hydrate_cash(user_id)
+        raw = _conn().hgetall(_cash_key(user_id))
+    return {k.decode(): int(v) for k, v in raw.items()}
+
+
+def get_user_cash_balance(user_id: int) -> float:
+    """Get user's current spendable cash balance"""
+    return from_cents(get_cash_cents(user_id)["available"])
+
+
+def debit_cash(user_id: int, amount_cents: int) -> int:
+    """Check-and-debit in one step; returns the new available balance in cents
+
+    Nothing runs after the script, so a caller that gets a balance back
+    owns the debit and must credit it back if its own next step fails.
+    """
+    result = _run_cash_script(user_id, _CASH_MOVE_SCRIPT, [amount_cents, "available", ""])
+    if result == _INSUFFICIENT:
+        raise InsufficientFunds(get_cash_cents(user_id)["available"], amount_cents)
+    return result
+
+
+def credit_cash(user_id: int, amount_cents: int) -> int:
+    result = _run_cash_script(user_id, _CASH_CREDIT_SCRIPT, [amount_cents])
+    return result
+
+
+def reserve_cash(user_id: int, amount_cents: int) -> int:
+    """Hold funds back from the available balance (e.g. for a resting order)"""
+    result = _run_cash_script(user_id, _CASH_MOVE_SCRIPT, [amount_cents, "available", "reserved"])
+    if result == _INSUFFICIENT:
+        raise InsufficientFunds(get_cash_cents(user_id)["available"], amount_cents)
+    return result
+
+
+def release_cash(user_id: int, amount_cents: int) -> int:
+    """Return previously reserved funds to the available balance"""
+    result = _run_cash_script(user_id, _CASH_MOVE_SCRIPT, [amount_cents, "reserved", "available"])
+    if result == _INSUFFICIENT:
+        raise ValueError(f"Cannot release {amount_cents} cents, not enough reserved")
+    return result
+
+
+def capture_reserved_cash(user_id: int, amount_cents: int) -> int:
+    """Spend previously reserved funds"""
+    result = _run_cash_script(user_id, _CASH_MOVE_SCRIPT, [amount_cents, "reserved", ""])
+    if result == _INSUFFICIENT:
+        raise ValueError(f"Cannot capture {amount_cents} cents, not enough reserved")
+    return result
+
+
+def reset_cash_balance(user_id: int) -> float:
+    """Reset user's cash to the default balance (for testing/demo)
+
+    Drops every reserve, so the user's open orders must be cancelled first.
+    """
+    balance_cents = to_cents(DEFAULT_CASH_BALANCE)
+    CashAccount.objects.update_or_create(
+        user_id=user_id,
+        defaults={"balance_cents": balance_cents, "reserved_cents": 0},
+    )
+    pipe = _conn().pipeline()
+    pipe.hset(_cash_key(user_id), mapping={"available": balance_cents, "reserved": 0})
+    # A flush that read the old balance may land after the row above
+    pipe.sadd(DIRTY_CASH_KEY, user_id)
+    pipe.execute()
+    return DEFAULT_CASH_BALANCE
@@ -0,0 +1,84 @@
+# api/utils/valuation.py
+from typing import Dict, List
+
+import numpy as np
+
+from .quote_cache import get_quotes
+
+# Upper bound on waiting for upstream quotes during one valuation request
+VALUATION_QUOTE_TIMEOUT = 3.0
+
+
+def _to_list(values: np.ndarray, ndigits: int = 2) -> List:
+    """Round and convert to JSON-friendly floats, NaN -> None"""
+    return [None if np.isnan(v) else round(float(v), ndigits) for v in values]
+
+
+def value_portfolio(holdings: List[Dict], cash_balance: float) -> Dict:
+    """Mark holdings to market with one batch quote lookup and array math"""
+    if not holdings:
+        return {
+            "positions": [],
+            "totals": {
+                "cost_basis": 0.0,
+                "market_value": 0.0,
+                "unrealized_pnl": 0.0,
+                "cash_balance": cash_balance,
+                "equity": cash_balance,
+            },
+            "price_errors": {},
+        }
+
+    # Aggregate lots per symbol
+    lot_symbols = np.array([h["stock_id"] for h in holdings])
+    lot_quantity = np.array([h["quantity"] for h in holdings], dtype=np.float64)
+    lot_cost = np.array([h["buy_price"] for h in holdings], dtype=np.float64) * lot_quantity
+    symbols, index = np.unique(lot_symbols, return_inverse=True)
+    quantity = np.bincount(index, weights=lot_quantity)
+    cost_basis = np.bincount(index, weights=lot_cost)
+
+    quotes = get_quotes(symbols.tolist(), timeout=VALUATION_QUOTE_TIMEOUT)
+    price_errors = {
+        sid: q["error"] for sid, q in quotes.items() if q["status"] != "success"
+    }
+    prices = np.array(
+        [np.nan if sid in price_errors else quotes[sid]["price"] for sid in symbols],
+        dtype=np.float64,
+    )
+
+    market_value = quantity * prices
+    unrealized = market_value - cost_basis
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_cost = cost_basis / quantity
+        unrealized_pct = np.where(cost_basis > 0, unrealized / cost_basis * 100, np.nan)
+        total_market_value = np.nansum(market_value)
+        weights = market_value / total_market_value if total_market_value else np.full_like(market_value, np.nan)
+
+    columns = {
+        "quantity": quantity.astype(np.int64).tolist(),
+        "avg_cost": _to_list(avg_cost, 4),
+        "cost_basis": _to_list(cost_basis),
+        "price": _to_list(prices, 4),
+        "market_value": _to_list(market_value),
+        "unrealized_pnl": _to_list(unrealized),
+        "unrealized_pnl_percent": _to_list(unrealized_pct),
+        "weight": _to_list(weights, 6),
+    }
+    positions = [
+        {"stock_id": sid, **{name: values[i] for name, values in columns.items()}}
+        for i, sid in enumerate(symbols.tolist())
+    ]
+
+    # Symbols without a price are left out of market value and P&L totals
+    priced = ~np.isnan(prices)
+    return {
+        "positions": positions,
+        "totals": {
+            "cost_basis": round(float(cost_basis.sum()), 2),
+            "market_value": round(float(total_market_value), 2),
+            "unrealized_pnl": round(float(unrealized[priced].sum()), 2),
+            "cash_balance": cash_balance,
+            "equity": round(float(total_market_value) + cash_balance, 2),
+        },
+        "price_errors": price_errors,
+    }
@@ -4,90 +4,84 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status
 from django.contrib.auth import authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
-from twstock import Stock
-from django.core.cache import cache
-from celery.result import AsyncResult
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from celery import chord, group
+from celery.result import AsyncResult, GroupResult
 from decimal import Decimal
+from datetime import datetime, time, timedelta
+import asyncio
 import json
+import uuid
 
 from .serializers import (
     RegisterSerializer, LoginSerializer,
-    HoldingSerializer, TradeHistorySerializer,
+    HoldingSerializer, TradeHistorySerializer, TradeHistoryFilterSerializer,
     BuySerializer, SellSerializer,
     AnalyzeSerializer, PriceLookupSerializer,
+    BatchPriceLookupSerializer, BatchAnalyzeSerializer, BacktestSerializer,
+    StockSearchSerializer, OrderSerializer, PlaceOrderSerializer, OrderFilterSerializer,
+    EquitySnapshotSerializer, DateRangeSerializer, LeaderboardSerializer,
 )
 
-from .models import VirtualHolding, TradeHistory
+from .models import EquitySnapshot, Order, VirtualHolding, TradeHistory
+from .pagination import TradeHistoryCursorPagination
 from .utils.trading_cache import (
+    DEFAULT_CASH_BALANCE,
+    InsufficientFunds,
     add_user_holding,
+    credit_cash,
+    debit_cash,
+    from_cents,
+    get_user_cash_balance,
     get_user_holdings,
+    get_user_pnl,
     remove_user_holding,
+    reset_cash_balance,
+    to_cents,
 )
-from .utils.sync_holdings import sync_holdings_to_postgres, sync_holdings_to_redis
-from .tasks import analyze_stock
-
-
-# Default cash balance for new users
-DEFAULT_CASH_BALANCE = 1000000.0  # 1,000,000 NTD
-
-
-def get_user_cash_balance(user_id):
-    """Get user's current cash balance"""
-    cache_key = f"user_cash:{user_id}"
-    balance = cache.get(cache_key)
-    if balance is None:
-        # Initialize with default balance for new users
-        balance = DEFAULT_CASH_BALANCE
-        cache.set(cache_key, balance, 60 * 60 * 24)  # Cache for 24 hours
-    return float(balance)
-
-
-def update_user_cash_balance(user_id, amount):
-    """Update user's cash balance"""
-    cache_key = f"user_cash:{user_id}"
-    current_balance = get_user_cash_balance(user_id)
-    new_balance = current_balance + amount
-    cache.set(cache_key, new_balance, 60 * 60 * 24)
-    return new_balance
+from .utils.sync_holdings import sync_holdings_to_postgres
+from .utils.order_book import cancel_open_orders, cancel_order, place_order
+from .utils.trade_journal import pending_trades, record_trade
+from .utils.equity import forget_snapshots
+from .utils.leaderboard import rank_user, top as leaderboard_top, user_rank
+from .utils.quote_cache import get_quote, get_quotes
+from .utils.valuation import value_portfolio
+from .utils.analysis_cache import (
+    analysis_key,
+    claim_inflight,
+    get_batch,
+    get_cached_analysis,
+    store_batch,
+)
+from .utils.analysis_events import async_redis, channel_name, tokens_key
+from .utils.signal_cache import get_signals, watch_symbols
+from .utils.price_history import load_histories, stored_symbols
+from .utils.indicators import LOOKBACK_BARS, compute_indicators
+from .utils.market_hours import TAIPEI_TZ
+from .utils.stock_codes import is_valid_stock_id, search as search_stocks
+from .tasks import analyze_batch, analyze_stock, gather_stock_info, run_backtest
 
 
 def get_stock_price_info(stock_id):
     """Get detailed stock price information"""
-    try:
-        stock = Stock(stock_id)
-        
-        # Get current price data
-        current_price = stock.price[-1] if stock.price else 0
-        open_price = stock.open[-1] if stock.open else current_price
-        high_price = stock.high[-1] if stock.high else current_price  
-        low_price = stock.low[-1] if stock.low else current_price
-        volume = stock.capacity[-1] if stock.capacity else 0
-        
-        # Calculate price change
-        change = 0
-        change_percent = 0
-        if len(stock.price) >= 2:
-            previous_price = stock.price[-2]
-            change = current_price - previous_price
-            change_percent = (change / previous_price) * 100 if previous_price > 0 else 0
-            
-        return {
-            "stock_id": stock_id,
-            "price": current_price,
-            "open": open_price,
-            "high": high_price,
-            "low": low_price,
-            "volume": volume,
-            "change": change,
-            "change_percent": change_percent,
-            "status": "success"
-        }
-    except Exception as e:
-        return {
-            "stock_id": stock_id,
-            "error": str(e),
-            "status": "error"
-        }
+    return get_quote(stock_id)
+
+
+def format_analysis_result(result):
+    """Shape an analyze_stock result for the client"""
+    # Add additional metadata to the response
+    return {
+        "symbol": result.get("stock_id", ""),
+        "prompt": result.get("prompt", ""),
+        "twstock_analysis": result.get("twstock", {}),
+        "claude_opinion": result.get("claude", {}).get("response", ""),
+        "gemini_opinion": result.get("gemini", {}).get("response", ""),
+        "raw_data": result
+    }
 
 
 class RegisterView(APIView):
@@ -120,7 +114,6 @@ class LoginView(APIView):
             return Response({"detail": "Invalid credentials"}, status=401)
         
         refresh = RefreshToken.for_user(user)
-        sync_holdings_to_redis(user)
         
         # Ensure user has cash balance initialized
         cash_balance = get_user_cash_balance(user.id)
@@ -159,42 +152,34 @@ class BuyStockView(APIView):
         # Calculate total cost
         total_cost = price * quantity
 
-        # Check if user has enough cash
-        user_cash = get_user_cash_balance(request.user.id)
-        if user_cash < total_cost:
-            return Response({
-                "detail": f"Insufficient funds. You have NT${user_cash:,.2f} but need NT${total_cost:,.2f}"
-            }, status=400)
-
-        try:
-            # Validate stock exists
-            Stock(stock_id)
-        except Exception:
+        # Validate stock exists
+        if not is_valid_stock_id(stock_id):
             return Response({"detail": "Invalid stock ID"}, status=400)
 
-        # Execute trade
-        add_user_holding(request.user.id, {
-            "stock_id": stock_id,
-            "buy_price": price,
-            "quantity": quantity,
-        })
+        # Check-and-debit atomically so concurrent buys cannot overdraw
+        try:
+            new_balance = debit_cash(request.user.id, to_cents(total_cost))
+        except InsufficientFunds as e:
+            return Response({"detail": str(e)}, status=400)
 
-        # Deduct cash from user balance
-        new_balance = update_user_cash_balance(request.user.id, -total_cost)
+        # Execute trade; from here on any failure refunds the debit
+        try:
+            add_user_holding(request.user.id, {
+                "stock_id": stock_id,
+                "buy_price": price,
+                "quantity": quantity,
+            })
+        except Exception:
+            credit_cash(request.user.id, to_cents(total_cost))
+            raise
 
         # Record trade history
-        TradeHistory.objects.create(
-            user=request.user,
-            stock_id=stock_id,
-            side=TradeHistory.BUY,
-            price=price,
-            quantity=quantity,
-        )
+        record_trade(request.user.id, stock_id, TradeHistory.BUY, price, quantity)
         
         return Response({
             "msg": "bought",
             "total_cost": total_cost,
-            "remaining_cash": new_balance,
+            "remaining_cash": from_cents(new_balance),
         })
    
 
@@ -214,27 +199,22 @@ class SellStockView(APIView):
         total_proceeds = price * quantity
 
         try:
-            # Remove holding (this will validate user has enough shares)
-            remove_user_holding(request.user.id, stock_id, quantity)
+            # Consume the oldest lots first (this will validate user has enough shares)
+            _, realized_cents = remove_user_holding(request.user.id, stock_id, quantity, price)
         except Exception as e:
             return Response({"detail": str(e)}, status=400)
 
         # Add cash to user balance
-        new_balance = update_user_cash_balance(request.user.id, total_proceeds)
+        new_balance = credit_cash(request.user.id, to_cents(total_proceeds))
 
         # Record trade history
-        TradeHistory.objects.create(
-            user=request.user,
-            stock_id=stock_id,
-            side=TradeHistory.SELL,
-            price=price,
-            quantity=quantity,
-        )
+        record_trade(request.user.id, stock_id, TradeHistory.SELL, price, quantity)
         
         return Response({
             "msg": "sold",
             "total_proceeds": total_proceeds,
-            "new_cash_balance": new_balance,
+            "realized_pnl": from_cents(realized_cents),
+            "new_cash_balance": from_cents(new_balance),
         })
 
 
@@ -244,24 +224,160 @@ class HoldingsView(APIView):
     def get(self, request):
         holdings = get_user_holdings(request.user.id)
         cash_balance = get_user_cash_balance(request.user.id)
-        
-        return Response({
+
+        data = {
             "holdings": holdings,
             "cash_balance": cash_balance,
             "user_id": request.user.id
-        })
+        }
+        # ?valuation=1 adds server-side mark-to-market figures
+        if request.query_params.get("valuation") in ("1", "true"):
+            data["valuation"] = value_portfolio(holdings, cash_balance)
+
+        return Response(data)
 
     def post(self, request):
         sync_holdings_to_postgres(request.user)
         return Response({"msg": "synced"})
 
 
+class PnlView(APIView):
+    """Average cost and FIFO realized P&L per symbol, read from the ledger"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        symbols = list(get_user_pnl(request.user.id).values())
+        return Response({
+            "symbols": symbols,
+            "totals": {
+                "cost_basis": round(sum(s["cost_basis"] for s in symbols), 2),
+                "realized_pnl": round(sum(s["realized_pnl"] for s in symbols), 2),
+            },
+        })
+
+
+class EquityCurveView(APIView):
+    """Daily equity snapshots for charting, oldest first"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        ser = DateRangeSerializer(data=request.query_params)
+        if not ser.is_valid():
+            return Response(ser.errors, status=400)
+        qs = EquitySnapshot.objects.filter(user=request.user)
+        if "start" in ser.validated_data:
+            qs = qs.filter(date__gte=ser.validated_data["start"])
+        if "end" in ser.validated_data:
+            qs = qs.filter(date__lte=ser.validated_data["end"])
+        return Response({"snapshots": EquitySnapshotSerializer(qs.order_by("date"), many=True).data})
+
+
+class LeaderboardView(APIView):
+    """Top users by equity and the caller's own rank, straight from a Redis sorted set"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        ser = LeaderboardSerializer(data=request.query_params)
+        if not ser.is_valid():
+            return Response(ser.errors, status=400)
+        me = user_rank(request.user.id)
+        return Response({
+            "top": leaderboard_top(ser.validated_data["limit"]),
+            "me": {"rank": me["rank"], "equity": me["equity"]},
+            "total": me["total"],
+        })
+
+
 class TradeHistoryView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        qs = TradeHistory.objects.filter(user=request.user).order_by("-ts")
-        return Response(TradeHistorySerializer(qs, many=True).data)
+        """Cursor-paginated history, filterable by stock_id, side, start and end dates"""
+        ser = TradeHistoryFilterSerializer(data=request.query_params)
+        if not ser.is_valid():
+            return Response(ser.errors, status=400)
+        filters = ser.validated_data
+
+        # Dates are trading days, so their bounds are Taipei midnights
+        start = end = None
+        if "start" in filters:
+            start = datetime.combine(filters["start"], time.min, tzinfo=TAIPEI_TZ)
+        if "end" in filters:
+            end = datetime.combine(filters["end"] + timedelta(days=1), time.min, tzinfo=TAIPEI_TZ)
+
+        qs = TradeHistory.objects.filter(user=request.user)
+        if "stock_id" in filters:
+            qs = qs.filter(stock_id=filters["stock_id"])
+        if "side" in filters:
+            qs = qs.filter(side=filters["side"])
+        # Plain range bounds on ts (not ts__date) so the (user, ts) indexes apply
+        if start:
+            qs = qs.filter(ts__gte=start)
+        if end:
+            qs = qs.filter(ts__lt=end)
+
+        paginator = TradeHistoryCursorPagination()
+        page = paginator.paginate_queryset(qs, request, view=self)
+        # Trades still in the journal are newer than anything in Postgres:
+        # they head the first page (with a null id) until the flush lands them
+        if "cursor" not in request.query_params:
+            pending = [
+                t for t in pending_trades(request.user.id)
+                if filters.get("stock_id", t.stock_id) == t.stock_id
+                and filters.get("side", t.side) == t.side
+                and (start is None or t.ts >= start)
+                and (end is None or t.ts < end)
+            ]
+            page = pending + list(page)
+        return paginator.get_paginated_response(TradeHistorySerializer(page, many=True).data)
+
+
+class OrdersView(APIView):
+    """Resting limit/stop orders, filled by the realtime ingest job"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        ser = OrderFilterSerializer(data=request.query_params)
+        if not ser.is_valid():
+            return Response(ser.errors, status=400)
+        qs = Order.objects.filter(user=request.user, **ser.validated_data).order_by("-created_at")
+        return Response({"orders": OrderSerializer(qs, many=True).data})
+
+    def post(self, request):
+        ser = PlaceOrderSerializer(data=request.data)
+        if not ser.is_valid():
+            return Response(ser.errors, status=400)
+        data = ser.validated_data
+
+        try:
+            order = place_order(request.user, **data)
+        except InsufficientFunds as e:
+            return Response({"detail": str(e)}, status=400)
+        # Keep the symbol in the realtime ingest set while the order rests
+        watch_symbols([order.stock_id])
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+
+class OrderDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, order_id):
+        order = Order.objects.filter(user=request.user, id=order_id).first()
+        if order is None:
+            return Response({"detail": "Order not found"}, status=404)
+        return Response(OrderSerializer(order).data)
+
+    def delete(self, request, order_id):
+        order = Order.objects.filter(user=request.user, id=order_id).first()
+        if order is None:
+            return Response({"detail": "Order not found"}, status=404)
+        if order.status != Order.OPEN or not cancel_order(order):
+            order.refresh_from_db()
+            return Response(
+                {"detail": "Order is no longer open", "order": OrderSerializer(order).data},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(OrderSerializer(order).data)
 
 
 class AnalyzeStockView(APIView):
@@ -275,48 +391,220 @@ class AnalyzeStockView(APIView):
         stock_id = ser.validated_data["stock_id"]
         prompt = ser.validated_data["prompt"]
         
-        # Validate stock exists and get basic info
-        try:
-            Stock(stock_id)
-        except Exception:
-            return Response({"detail": "Invalid stock ID"}, status=400)
-        
-        # Start analysis task with both stock_id and custom prompt
-        task = analyze_stock.delay(stock_id, prompt)
+        # The serializer validated the symbol; the (cached) quote keys the result cache
+        quote = get_quote(stock_id)
+        if quote["status"] != "success":
+            return Response({"detail": "Quote unavailable, please try again later"}, status=503)
+        watch_symbols([stock_id])
+
+        digest = analysis_key(stock_id, prompt, quote)
+        cached = get_cached_analysis(digest)
+        if cached is not None:
+            return Response({
+                "task_id": cached["task_id"],
+                "stock_id": stock_id,
+                "prompt": prompt,
+                "status": "done",
+                "cached": True,
+                "result": format_analysis_result(cached["result"]),
+            })
+
+        # Identical requests already running attach to the existing task
+        task_id = str(uuid.uuid4())
+        existing_task_id = claim_inflight(digest, task_id)
+        if existing_task_id is not None:
+            task_id = existing_task_id
+        else:
+            # Start analysis task with both stock_id and custom prompt
+            analyze_stock.apply_async((stock_id, prompt), {"cache_key": digest}, task_id=task_id)
+
         return Response({
-            "task_id": task.id,
+            "task_id": task_id,
             "stock_id": stock_id,
             "prompt": prompt,
             "status": "started"
         })
 
 
+def format_batch_result(result):
+    """Shape an analyze_batch result for the client"""
+    return {
+        "symbols": result.get("stock_ids", []),
+        "prompt": result.get("prompt", ""),
+        "twstock_analysis": result.get("twstock", {}),
+        "analyses": [
+            {
+                "symbols": analysis["stock_ids"],
+                "claude_opinion": analysis["claude"]["response"],
+                "gemini_opinion": analysis["gemini"]["response"],
+            }
+            for analysis in result.get("analyses", [])
+        ],
+        "raw_data": result
+    }
+
+
+def analysis_status(task_id, formatter=format_analysis_result):
+    """Current state of an analysis task, shaped for the client"""
+    res = AsyncResult(task_id)
+    if res.successful():
+        return {
+            "status": "done",
+            "result": formatter(res.result)
+        }
+    elif res.failed():
+        return {
+            "status": "failed",
+            "error": str(res.result) if res.result else "Analysis failed"
+        }
+    else:
+        return {"status": "pending"}
+
+
+class AnalyzeBatchView(APIView):
+    """Fan out per-symbol data gathering, then one consolidated LLM pass"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        ser = BatchAnalyzeSerializer(data=request.data)
+        if not ser.is_valid():
+            return Response(ser.errors, status=400)
+
+        stock_ids = ser.validated_data.get("stock_ids") or [
+            h["stock_id"] for h in get_user_holdings(request.user.id)
+        ]
+        if not stock_ids:
+            return Response({"detail": "No stocks to analyze"}, status=400)
+        prompt = ser.validated_data.get("prompt", "").strip() or None
+        watch_symbols(stock_ids)
+
+        batch = chord(
+            group(gather_stock_info.s(stock_id) for stock_id in stock_ids),
+            analyze_batch.s(prompt),
+        )
+        # Freeze to learn the ids up front; the group is saved before dispatch
+        # so the progress endpoint can always restore it
+        callback = batch.freeze()
+        group_result = callback.parent
+        group_result.save()
+        store_batch(group_result.id, callback.id, stock_ids)
+        batch.apply_async()
+
+        return Response({
+            "group_id": group_result.id,
+            "task_id": callback.id,
+            "stock_ids": stock_ids,
+            "prompt": prompt,
+            "status": "started"
+        })
+
+
+class AnalyzeBatchResultView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, group_id):
+        batch = get_batch(group_id)
+        group_result = GroupResult.restore(group_id)
+        if batch is None or group_result is None:
+            return Response({"detail": "Batch not found"}, status=404)
+
+        # Gathering progress; the consolidated analysis runs once all are in
+        response = {
+            "group_id": group_id,
+            "task_id": batch["task_id"],
+            "stock_ids": batch["stock_ids"],
+            "total": len(group_result.results),
+            "completed": group_result.completed_count(),
+        }
+        response.update(analysis_status(batch["task_id"], format_batch_result))
+        if response["status"] == "pending" and response["completed"] == response["total"]:
+            response["status"] = "analyzing"
+        return Response(response)
+
+
 class AnalyzeResultView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, task_id):
-        res = AsyncResult(task_id)
-        if res.successful():
-            result = res.result
-            # Add additional metadata to the response
-            return Response({
-                "status": "done",
-                "result": {
-                    "symbol": result.get("stock_id", ""),
-                    "prompt": result.get("prompt", ""),
-                    "twstock_analysis": result.get("twstock", {}),
-                    "claude_opinion": result.get("claude", {}).get("response", ""),
-                    "gemini_opinion": result.get("gemini", {}).get("response", ""),
-                    "raw_data": result
-                }
-            })
-        elif res.failed():
-            return Response({
-                "status": "failed",
-                "error": str(res.result) if res.result else "Analysis failed"
-            })
-        else:
-            return Response({"status": "pending"})
+        return Response(analysis_status(task_id))
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class AnalyzeStreamView(View):
+    """Server-sent events for one analysis task, pushed via Redis pub/sub
+
+    EventSource cannot send an Authorization header, so the JWT access token
+    may also be passed as ``?access=<token>``.
+    """
+    # Comment line sent while waiting, also re-checks the task state as a fallback
+    HEARTBEAT_SECONDS = 15
+    STREAM_TIMEOUT_SECONDS = 120
+
+    async def get(self, request, task_id):
+        header = request.headers.get("Authorization", "")
+        raw_token = header.split(" ", 1)[1] if header.startswith("Bearer ") else request.GET.get("access")
+        if not raw_token:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+        try:
+            JWTAuthentication().get_validated_token(raw_token)
+        except (InvalidToken, TokenError):
+            return JsonResponse({"detail": "Invalid token"}, status=401)
+
+        response = StreamingHttpResponse(self._events(task_id), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def _events(self, task_id):
+        redis = async_redis()
+        pubsub = redis.pubsub()
+        # Subscribe before checking the state so a result published in between is not lost
+        await pubsub.subscribe(channel_name(task_id))
+        try:
+            state = await sync_to_async(analysis_status)(task_id)
+            if state["status"] != "pending":
+                yield _sse(state["status"], state)
+                return
+
+            # Tokens published before we subscribed; later ones may also be
+            # on the channel already, so anything at or below ``seen`` is skipped
+            seen = 0
+            for raw in await redis.lrange(tokens_key(task_id), 0, -1):
+                seen += 1
+                yield _sse("token", {**json.loads(raw), "seq": seen})
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.STREAM_TIMEOUT_SECONDS
+            while loop.time() < deadline:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=self.HEARTBEAT_SECONDS
+                )
+                if message is None:
+                    state = await sync_to_async(analysis_status)(task_id)
+                    if state["status"] != "pending":
+                        yield _sse(state["status"], state)
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+
+                event = json.loads(message["data"])
+                if event["event"] == "done":
+                    yield _sse("done", {"status": "done", "result": format_analysis_result(event["result"])})
+                    return
+                if event["event"] == "token":
+                    if event["seq"] <= seen:
+                        continue
+                    seen = event["seq"]
+                yield _sse(event["event"], event)
+
+            yield _sse("timeout", {"status": "pending"})
+        finally:
+            await pubsub.unsubscribe(channel_name(task_id))
+            await pubsub.close()
+            await redis.close()
 
 
 class StockPriceLookupView(APIView):
@@ -328,15 +616,137 @@ class StockPriceLookupView(APIView):
             return Response(ser.errors, status=400)
 
         stock_id = ser.validated_data["stock_id"]
-        
+
+        # Batch mode: ?stock_id=2330,2317,2454
+        if "," in stock_id:
+            return self._batch_response(stock_id.split(","))
+
         # Get comprehensive stock information
         stock_info = get_stock_price_info(stock_id)
         
         if stock_info["status"] == "error":
             return Response({"detail": stock_info["error"]}, status=400)
+        watch_symbols([stock_id])
             
         return Response(stock_info)
 
+    def post(self, request):
+        """Batch lookup: {"stock_ids": ["2330", "2317", ...]}"""
+        return self._batch_response(request.data.get("stock_ids"))
+
+    def _batch_response(self, stock_ids):
+        ser = BatchPriceLookupSerializer(data={"stock_ids": stock_ids})
+        if not ser.is_valid():
+            return Response(ser.errors, status=400)
+
+        quotes = []
+        errors = {}
+        for stock_id, stock_info in get_quotes(ser.validated_data["stock_ids"]).items():
+            if stock_info["status"] == "error":
+                errors[stock_id] = stock_info["error"]
+            else:
+                quotes.append(stock_info)
+        watch_symbols(q["stock_id"] for q in quotes)
+
+        return Response({"quotes": quotes, "errors": errors})
+
+
+class StockSearchView(APIView):
+    """Autocomplete over listed codes and company names, served from memory"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        ser = StockSearchSerializer(data=request.query_params)
+        if not ser.is_valid():
+            return Response(ser.errors, status=400)
+        return Response({"results": search_stocks(ser.validated_data["q"], ser.validated_data["limit"])})
+
+
+class SignalsView(APIView):
+    """Precomputed BestFourPoint signals, read straight from the cache"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        # ?stock_id=2330,2317 or, by default, every held symbol
+        raw = request.query_params.get("stock_id", "")
+        stock_ids = [sid.strip() for sid in raw.split(",") if sid.strip()] or [
+            h["stock_id"] for h in get_user_holdings(request.user.id)
+        ]
+        ser = BatchPriceLookupSerializer(data={"stock_ids": stock_ids})
+        if not ser.is_valid():
+            return Response(ser.errors, status=400)
+        stock_ids = ser.validated_data["stock_ids"]
+
+        # Unknown codes are never watched: each would cost upstream requests every run
+        unknown = [sid for sid in stock_ids if not is_valid_stock_id(sid)]
+        stock_ids = [sid for sid in stock_ids if sid not in unknown]
+        signals = get_signals(stock_ids)
+        pending = [sid for sid in stock_ids if sid not in signals]
+        # Not computed yet: the next precompute run picks these up
+        watch_symbols(pending)
+        return Response({"signals": signals, "pending": pending, "unknown": unknown})
+
+
+class IndicatorsView(APIView):
+    """Latest technical indicators computed from the local daily history"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        # ?stock_id=2330,2317, ?all=1 for every stored symbol, else held symbols
+        if request.query_params.get("all") in ("1", "true"):
+            stock_ids = stored_symbols()
+        else:
+            raw = request.query_params.get("stock_id", "")
+            stock_ids = [sid.strip() for sid in raw.split(",") if sid.strip()] or [
+                h["stock_id"] for h in get_user_holdings(request.user.id)
+            ]
+            ser = BatchPriceLookupSerializer(data={"stock_ids": stock_ids})
+            if not ser.is_valid():
+                return Response(ser.errors, status=400)
+            stock_ids = ser.validated_data["stock_ids"]
+
+        # Unknown codes are never watched: each would be bootstrapped from upstream
+        unknown = [sid for sid in stock_ids if not is_valid_stock_id(sid)]
+        stock_ids = [sid for sid in stock_ids if sid not in unknown]
+        histories = load_histories(stock_ids, days=LOOKBACK_BARS)
+        missing = [sid for sid in stock_ids if len(histories[sid]["date"]) == 0]
+        # No stored bars yet: the next history append picks these up
+        watch_symbols(missing)
+        indicators = compute_indicators({sid: h for sid, h in histories.items() if sid not in missing})
+        return Response({"indicators": indicators, "missing": missing, "unknown": unknown})
+
+
+class BacktestView(APIView):
+    """Queue a strategy replay over stored daily bars"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        ser = BacktestSerializer(data=request.data)
+        if not ser.is_valid():
+            return Response(ser.errors, status=400)
+        data = ser.validated_data
+
+        task = run_backtest.delay(
+            data["stock_ids"],
+            data["strategy"],
+            data["start"].isoformat() if data.get("start") else None,
+            data["end"].isoformat() if data.get("end") else None,
+            data["initial_cash"],
+        )
+        return Response({
+            "task_id": task.id,
+            "stock_ids": data["stock_ids"],
+            "strategy": data["strategy"],
+            "status": "started"
+        })
+
+
+class BacktestResultView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, task_id):
+        return Response(analysis_status(task_id, formatter=lambda result: result))
+
 
 class UserBalanceView(APIView):
     permission_classes = [IsAuthenticated]
@@ -352,8 +762,12 @@ class UserBalanceView(APIView):
     def post(self, request):
         """Reset user's cash balance (for testing/demo)"""
         if request.data.get("reset") == True:
-            cache_key = f"user_cash:{request.user.id}"
-            cache.set(cache_key, DEFAULT_CASH_BALANCE, 60 * 60 * 24)
+            # The reset drops every reserve, so no order may still be holding one
+            if cancel_open_orders(request.user.id):
+                return Response({"detail": "Orders are being filled, try again shortly"}, status=409)
+            reset_cash_balance(request.user.id)
+            forget_snapshots(request.user.id)
+            rank_user(request.user.id)
             return Response({
                 "msg": "Balance reset",
                 "new_balance": DEFAULT_CASH_BALANCE
@@ -15,12 +15,14 @@ describe('ChatbotComponent', () => {
     mockPromptService = jasmine.createSpyObj<PromptService>('PromptService', [
       'getRemaining',
       'sendPrompt',
-      'getResult'
+      'getResult',
+      'watchResult'
     ]);
 
     mockPromptService.getRemaining.and.returnValue(of(10));
     mockPromptService.sendPrompt.and.returnValue(of({ task_id: 'mock-task-id' }));
     mockPromptService.getResult.and.returnValue(of({ status: 'done', result: 'Mock result' }));
+    mockPromptService.watchResult.and.returnValue(of({ status: 'done', result: 'Mock result' }));
 
     await TestBed.configureTestingModule({
       imports: [ChatbotComponent, FormsModule, HttpClientTestingModule],
@@ -49,6 +49,7 @@ export class ChatbotComponent implements OnInit, OnDestroy {
   currentPage = 1;
   itemsPerPage = 5;
   totalPages = 1;
+  streamingText: { [provider: string]: string } = {};
   private currentSubscription: Subscription | null = null;
   private pollingTimeout: any = null;
 
@@ -82,9 +83,10 @@ export class ChatbotComponent implements OnInit, OnDestroy {
   submitPrompt() {
     if (!this.symbol || !this.prompt || this.loading || this.remainingPrompts <= 0) return;
 
-    // Validate stock symbol
+    // Validate stock symbol (ETF codes like 00679B are upper-case)
+    this.symbol = this.symbol.trim().toUpperCase();
     if (!this.promptService.isValidStockSymbol(this.symbol)) {
-      alert('Please enter a valid 4-digit Taiwan stock code (e.g., 2330)');
+      alert('Please enter a valid Taiwan stock code (e.g., 2330 or 00646)');
       return;
     }
 
@@ -92,6 +94,7 @@ export class ChatbotComponent implements OnInit, OnDestroy {
 
     this.loading = true;
     this.result = null;
+    this.streamingText = {};
 
     console.log('🚀 Submitting prompt:', this.symbol, this.prompt);
 
@@ -99,9 +102,9 @@ export class ChatbotComponent implements OnInit, OnDestroy {
       next: (res) => {
         console.log('✅ Got response:', res);
         const taskId = res.task_id;
-        console.log('🔄 Starting to poll for task:', taskId);
+        console.log('🔄 Waiting for task:', taskId);
 
-        this.pollResult(taskId, 20, 2000); // 20 attempts, 2 second intervals
+        this.watchResult(taskId);
         this.decrementPrompts();
       },
       error: (err) => {
@@ -113,6 +116,17 @@ export class ChatbotComponent implements OnInit, OnDestroy {
     });
   }
 
+  // ✅ Prefer the pushed result; fall back to polling if the stream fails
+  private watchResult(taskId: string) {
+    this.currentSubscription = this.promptService.watchResult(taskId).subscribe({
+      next: (res) => this.handleResultResponse(taskId, res, 20, 2000),
+      error: (err) => {
+        console.warn('⚠️ Result stream unavailable, polling instead:', err);
+        this.pollResult(taskId, 20, 2000); // 20 attempts, 2 second intervals
+      }
+    });
+  }
+
   private pollResult(taskId: string, retries = 20, delayMs = 2000) {
     if (retries <= 0) {
       console.log('⏰ Polling timeout for task:', taskId);
@@ -131,53 +145,7 @@ export class ChatbotComponent implements OnInit, OnDestroy {
       }
 
       this.currentSubscription = this.promptService.getResult(taskId).subscribe({
-        next: (res) => {
-          console.log('📝 Poll response:', res);
-          if (res.status === 'done') {
-            console.log('✅ Task completed:', taskId);
-
-            if (res.result) {
-              // ✅ FIXED: Better handling of API response structure
-              this.result = {
-                symbol: res.result.symbol || this.symbol,
-                prompt: res.result.prompt || this.prompt,
-                twstock_analysis: {
-                  buy: res.result.twstock_analysis?.buy || false,
-                  sell: res.result.twstock_analysis?.sell || false,
-                  summary: res.result.twstock_analysis?.summary || [],
-                  price: res.result.twstock_analysis?.price || 0,
-                  best_four_point: res.result.twstock_analysis?.best_four_point || null,
-                  change: (res.result.twstock_analysis as AnalysisResult['twstock_analysis'])?.change,
-                  change_percent: (res.result.twstock_analysis as AnalysisResult['twstock_analysis'])?.change_percent
-                },
-                gemini_opinion: res.result.gemini_opinion || '',
-                claude_opinion: res.result.claude_opinion || '',
-                raw_data: res.result.raw_data || res.result
-              };
-
-              console.log('✅ Processed result:', this.result);
-              this.saveToHistory();
-            } else {
-              console.warn('⚠️ Result is empty');
-              this.result = null;
-            }
-
-            this.loading = false;
-            this.currentSubscription = null;
-          } else if (res.status === 'failed') {
-            console.log('❌ Task failed:', taskId);
-            this.loading = false;
-            this.result = null;
-            this.currentSubscription = null;
-            alert('Analysis failed: ' + (res.error || 'Unknown error'));
-          } else if (res.status === 'pending') {
-            console.log('⏳ Task still pending, retrying...', retries - 1, 'attempts left');
-            this.pollResult(taskId, retries - 1, delayMs);
-          } else {
-            console.log('❓ Unknown status:', res.status);
-            this.pollResult(taskId, retries - 1, delayMs);
-          }
-        },
+        next: (res) => this.handleResultResponse(taskId, res, retries, delayMs),
         error: (err) => {
           console.error('❌ Polling error:', err);
           this.loading = false;
@@ -188,6 +156,58 @@ export class ChatbotComponent implements OnInit, OnDestroy {
     }, delayMs);
   }
 
+  private handleResultResponse(taskId: string, res: any, retries: number, delayMs: number) {
+    if (res.status === 'streaming') {
+      this.streamingText[res.provider] = (this.streamingText[res.provider] || '') + res.text;
+      return;
+    }
+    console.log('📝 Result response:', res);
+    if (res.status === 'done') {
+      console.log('✅ Task completed:', taskId);
+
+      if (res.result) {
+        // ✅ FIXED: Better handling of API response structure
+        this.result = {
+          symbol: res.result.symbol || this.symbol,
+          prompt: res.result.prompt || this.prompt,
+          twstock_analysis: {
+            buy: res.result.twstock_analysis?.buy || false,
+            sell: res.result.twstock_analysis?.sell || false,
+            summary: res.result.twstock_analysis?.summary || [],
+            price: res.result.twstock_analysis?.price || 0,
+            best_four_point: res.result.twstock_analysis?.best_four_point || null,
+            change: (res.result.twstock_analysis as AnalysisResult['twstock_analysis'])?.change,
+            change_percent: (res.result.twstock_analysis as AnalysisResult['twstock_analysis'])?.change_percent
+          },
+          gemini_opinion: res.result.gemini_opinion || '',
+          claude_opinion: res.result.claude_opinion || '',
+          raw_data: res.result.raw_data || res.result
+        };
+
+        console.log('✅ Processed result:', this.result);
+        this.saveToHistory();
+      } else {
+        console.warn('⚠️ Result is empty');
+        this.result = null;
+      }
+
+      this.loading = false;
+      this.currentSubscription = null;
+    } else if (res.status === 'failed') {
+      console.log('❌ Task failed:', taskId);
+      this.loading = false;
+      this.result = null;
+      this.currentSubscription = null;
+      alert('Analysis failed: ' + (res.error || 'Unknown error'));
+    } else if (res.status === 'pending') {
+      console.log('⏳ Task still pending, retrying...', retries - 1, 'attempts left');
+      this.pollResult(taskId, retries - 1, delayMs);
+    } else {
+      console.log('❓ Unknown status:', res.status);
+      this.pollResult(taskId, retries - 1, delayMs);
+    }
+  }
+
   private saveToHistory() {
     if (this.result) {
       const newHistoryItem: HistoryItem = {
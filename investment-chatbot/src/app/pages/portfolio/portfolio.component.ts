@@ -122,6 +122,7 @@ export class PortfolioComponent implements OnInit, OnDestroy {
   }
 
   buyStock(symbol: string) {
+    symbol = (symbol || '').trim().toUpperCase();
     if (!symbol) {
       alert('Invalid stock symbol');
       return;
@@ -129,7 +130,7 @@ export class PortfolioComponent implements OnInit, OnDestroy {
 
     // Validate stock symbol format
     if (!this.portfolioService.isValidTaiwanStockSymbol(symbol)) {
-      alert('Please enter a valid 4-digit Taiwan stock code (e.g., 2330)');
+      alert('Please enter a valid Taiwan stock code (e.g., 2330 or 00646)');
       return;
     }
 
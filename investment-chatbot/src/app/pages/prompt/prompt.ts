@@ -34,6 +34,7 @@ export class PromptComponent implements OnInit, OnDestroy {
   itemsPerPage = 5;
   totalPages = 1;
 
+  streamingText: { [provider: string]: string } = {};
   private currentSubscription: Subscription | null = null;
   private pollingTimeout: any = null;
 
@@ -68,8 +69,9 @@ export class PromptComponent implements OnInit, OnDestroy {
       return;
     }
 
+    this.symbol = this.symbol.trim().toUpperCase();
     if (!this.promptService.isValidStockSymbol(this.symbol)) {
-      this.error = 'Please enter a valid 4-digit Taiwan stock code';
+      this.error = 'Please enter a valid Taiwan stock code (e.g., 2330 or 00646)';
       return;
     }
 
@@ -81,12 +83,13 @@ export class PromptComponent implements OnInit, OnDestroy {
     this.cancelCurrentRequest();
     this.loading = true;
     this.result = '';
+    this.streamingText = {};
     this.error = '';
 
     this.currentSubscription = this.promptService.sendPrompt(this.symbol, this.prompt).subscribe({
       next: (res) => {
         const taskId = res.task_id;
-        this.pollResult(taskId, 15, 2000);
+        this.watchResult(taskId);
         this.decrementPrompts();
       },
       error: (err) => {
@@ -97,6 +100,14 @@ export class PromptComponent implements OnInit, OnDestroy {
     });
   }
 
+  // Prefer the pushed result; fall back to polling if the stream fails
+  private watchResult(taskId: string) {
+    this.currentSubscription = this.promptService.watchResult(taskId).subscribe({
+      next: (res) => this.handleResultResponse(taskId, res, 15, 2000),
+      error: () => this.pollResult(taskId, 15, 2000)
+    });
+  }
+
   private pollResult(taskId: string, retries = 15, delayMs = 2000) {
     if (retries <= 0) {
       this.loading = false;
@@ -108,22 +119,7 @@ export class PromptComponent implements OnInit, OnDestroy {
       if (!this.loading) return;
 
       this.currentSubscription = this.promptService.getResult(taskId).subscribe({
-        next: (res) => {
-          if (res.status === 'done' && res.result) {
-            this.result = this.formatAnalysisResult(res.result);
-            this.saveToHistory();
-            this.loading = false;
-            this.currentSubscription = null;
-          } else if (res.status === 'failed') {
-            this.error = res.error || 'Analysis failed';
-            this.loading = false;
-            this.currentSubscription = null;
-          } else if (res.status === 'pending') {
-            this.pollResult(taskId, retries - 1, delayMs);
-          } else {
-            this.pollResult(taskId, retries - 1, delayMs);
-          }
-        },
+        next: (res) => this.handleResultResponse(taskId, res, retries, delayMs),
         error: (err) => {
           this.error = err.message || 'Failed to get analysis results';
           this.loading = false;
@@ -133,6 +129,27 @@ export class PromptComponent implements OnInit, OnDestroy {
     }, delayMs);
   }
 
+  private handleResultResponse(taskId: string, res: any, retries: number, delayMs: number) {
+    if (res.status === 'streaming') {
+      this.streamingText[res.provider] = (this.streamingText[res.provider] || '') + res.text;
+      return;
+    }
+    if (res.status === 'done' && res.result) {
+      this.result = this.formatAnalysisResult(res.result);
+      this.saveToHistory();
+      this.loading = false;
+      this.currentSubscription = null;
+    } else if (res.status === 'failed') {
+      this.error = res.error || 'Analysis failed';
+      this.loading = false;
+      this.currentSubscription = null;
+    } else if (res.status === 'pending') {
+      this.pollResult(taskId, retries - 1, delayMs);
+    } else {
+      this.pollResult(taskId, retries - 1, delayMs);
+    }
+  }
+
   private formatAnalysisResult(result: any): string {
     let output = `Analysis for ${result.symbol?.toUpperCase()}\n`;
     output += `Question: ${result.prompt}\n\n`;
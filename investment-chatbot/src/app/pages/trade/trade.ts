@@ -87,7 +87,7 @@ export class TradeComponent implements OnInit, OnDestroy {
         stock_id: formattedSymbol,
         price: 0,
         status: 'error',
-        error: 'Please enter a valid 4-digit Taiwan stock code'
+        error: 'Please enter a valid Taiwan stock code (e.g., 2330 or 00646)'
       };
       return;
     }
@@ -131,8 +131,8 @@ export class TradeComponent implements OnInit, OnDestroy {
       this.stockSymbol = this.stockService.formatStockId(this.stockSymbol);
     }
 
-    // Auto-fetch when 4 digits are entered
-    if (this.stockSymbol && this.stockSymbol.length === 4) {
+    // Auto-fetch once the input is a complete code
+    if (this.stockSymbol && this.stockService.isValidStockId(this.stockSymbol)) {
       setTimeout(() => this.fetchStockInfo(), 300); // Small delay for better UX
     } else {
       this.stockInfo = null;
@@ -206,8 +206,8 @@ export class TradeComponent implements OnInit, OnDestroy {
 
   // ✅ FIXED: Enhanced validation with better error messages
   private validateTradeInputs(): boolean {
-    if (!this.stockSymbol || this.stockSymbol.trim().length !== 4) {
-      this.errorMessage = 'Please enter a valid 4-digit stock symbol';
+    if (!this.stockSymbol || !this.stockSymbol.trim()) {
+      this.errorMessage = 'Please enter a stock symbol';
       return false;
     }
 
@@ -258,7 +258,7 @@ export class TradeComponent implements OnInit, OnDestroy {
   }
 
   refreshStockInfo(): void {
-    if (this.stockSymbol && this.stockSymbol.length === 4) {
+    if (this.hasValidSymbol) {
       this.fetchStockInfo();
     }
   }
@@ -279,10 +279,13 @@ export class TradeComponent implements OnInit, OnDestroy {
   }
 
   // ✅ FIXED: Helper methods for template
+  get hasValidSymbol(): boolean {
+    return !!this.stockSymbol && this.stockService.isValidStockId(this.stockSymbol);
+  }
+
   get isFormValid(): boolean {
     return !!(
-      this.stockSymbol &&
-      this.stockSymbol.length === 4 &&
+      this.hasValidSymbol &&
       this.price &&
       this.price.trim() !== '' &&
       this.parsePrice(this.price) > 0 &&
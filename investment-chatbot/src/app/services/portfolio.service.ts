@@ -3,6 +3,7 @@ import { HttpClient, HttpHeaders } from '@angular/common/http';
 import { Observable, BehaviorSubject } from 'rxjs';
 import { map, catchError } from 'rxjs/operators';
 import { throwError } from 'rxjs';
+import { STOCK_CODE_PATTERN } from './stock.service';
 
 export interface PortfolioItem {
   id?: number;
@@ -163,15 +164,16 @@ export class PortfolioService {
     }).pipe(catchError(this.handleError));
   }
 
-  // Get trade history
-  getTradeHistory(): Observable<TradeHistoryItem[]> {
-    return this.http.get<TradeHistoryItem[]>(`${this.baseUrl}/history/`, {
+  // Get trade history (first page of the cursor-paginated endpoint)
+  getTradeHistory(limit: number = 200): Observable<TradeHistoryItem[]> {
+    return this.http.get<any>(`${this.baseUrl}/history/?limit=${limit}`, {
       headers: this.getAuthHeaders()
     }).pipe(
       map(response => {
-        // Ensure response is an array
-        if (Array.isArray(response)) {
-          return response.map(item => ({
+        // Paginated envelope: { next, previous, results }
+        const items: TradeHistoryItem[] = Array.isArray(response) ? response : response?.results;
+        if (Array.isArray(items)) {
+          return items.map(item => ({
             id: item.id,
             stock_id: item.stock_id,
             side: item.side,
@@ -189,9 +191,7 @@ export class PortfolioService {
 
   // Validate Taiwan stock symbol
   isValidTaiwanStockSymbol(symbol: string): boolean {
-    // Taiwan stock codes are typically 4 digits
-    const symbolRegex = /^\d{4}$/;
-    return symbolRegex.test(symbol);
+    return STOCK_CODE_PATTERN.test((symbol || '').trim().toUpperCase());
   }
 
   // Format currency for Taiwan
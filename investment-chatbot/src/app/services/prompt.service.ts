@@ -3,6 +3,7 @@ import { HttpClient, HttpHeaders } from '@angular/common/http';
 import { Observable } from 'rxjs';
 import { catchError } from 'rxjs/operators';
 import { throwError } from 'rxjs';
+import { STOCK_CODE_PATTERN } from './stock.service';
 
 export interface PromptRequest {
   stock_id: string;
@@ -17,9 +18,11 @@ export interface PromptResponse {
 }
 
 export interface AnalysisResultResponse {
-  status: 'done' | 'pending' | 'failed';
+  status: 'done' | 'pending' | 'failed' | 'streaming';
   result?: any;
   error?: string;
+  provider?: string; // streaming only: which model produced `text`
+  text?: string;     // streaming only: next chunk of partial output
 }
 
 @Injectable({
@@ -60,10 +63,42 @@ export class PromptService {
     );
   }
 
+  // Server-sent events: the backend pushes the result as soon as the task finishes.
+  // Errors (including the server-side timeout) let callers fall back to polling.
+  watchResult(taskId: string): Observable<AnalysisResultResponse> {
+    return new Observable<AnalysisResultResponse>(observer => {
+      const token = localStorage.getItem('access') || '';
+      const source = new EventSource(
+        `${this.baseUrl}/analyze/${taskId}/stream/?access=${encodeURIComponent(token)}`
+      );
+
+      const finish = (event: MessageEvent) => {
+        observer.next(JSON.parse(event.data));
+        observer.complete();
+        source.close();
+      };
+      // Partial LLM output while the analysis is still running
+      source.addEventListener('token', ((event: MessageEvent) => {
+        const data = JSON.parse(event.data);
+        observer.next({ status: 'streaming', provider: data.provider, text: data.text });
+      }) as EventListener);
+      source.addEventListener('done', finish as EventListener);
+      source.addEventListener('failed', finish as EventListener);
+      source.addEventListener('timeout', () => {
+        source.close();
+        observer.error(new Error('Analysis stream timed out'));
+      });
+      source.onerror = () => {
+        source.close();
+        observer.error(new Error('Analysis stream unavailable'));
+      };
+
+      return () => source.close();
+    });
+  }
+
   isValidStockSymbol(symbol: string): boolean {
-    // Taiwan stock codes are typically 4 digits
-    const symbolRegex = /^\d{4}$/;
-    return symbolRegex.test(symbol);
+    return STOCK_CODE_PATTERN.test((symbol || '').trim().toUpperCase());
   }
 
   private handleError(error: any): Observable<never> {
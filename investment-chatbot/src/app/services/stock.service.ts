@@ -1,8 +1,15 @@
 import { Injectable } from '@angular/core';
 import { HttpClient, HttpHeaders, HttpErrorResponse } from '@angular/common/http';
-import { Observable, of } from 'rxjs';
+import { Observable, forkJoin, of } from 'rxjs';
 import { map, catchError, timeout } from 'rxjs/operators';
 
+// Shape of a TWSE/TPEx code: 4-6 digits, optionally one letter (e.g. 2330, 00646, 00679B).
+// Whether the code is actually listed is checked by the API against its code index.
+export const STOCK_CODE_PATTERN = /^\d{4,6}[A-Z]?$/;
+
+// Most symbols POST /api/price/ accepts per request (BatchPriceLookupSerializer max_length)
+export const PRICE_BATCH_LIMIT = 50;
+
 // ✅ FIXED: Proper interface with correct types
 export interface StockInfo {
   stock_id: string;
@@ -43,7 +50,7 @@ export class StockService {
         stock_id: stockId,
         price: 0, // ✅ Always return number
         status: 'error',
-        error: 'Invalid stock ID format. Please enter a 4-digit Taiwan stock code.'
+        error: 'Invalid stock ID format. Please enter a Taiwan stock code such as 2330 or 00646.'
       });
     }
 
@@ -154,46 +161,68 @@ export class StockService {
     return num;
   }
 
-  // ✅ Get multiple stock prices with proper error handling
+  // ✅ Get multiple stock prices in one batch request
   getMultipleStockPrices(stockIds: string[]): Observable<StockInfo[]> {
     if (!stockIds || stockIds.length === 0) {
       return of([]);
     }
 
-    const requests = stockIds.map(id => this.getStockPrice(id));
-
-    return new Observable(observer => {
-      const results: StockInfo[] = [];
-      let completed = 0;
-
-      requests.forEach((request, index) => {
-        request.subscribe({
-          next: (result) => {
-            results[index] = result;
-            completed++;
-
-            if (completed === requests.length) {
-              observer.next(results);
-              observer.complete();
-            }
-          },
-          error: (error) => {
-            results[index] = {
-              stock_id: stockIds[index] || '',
-              price: 0, // ✅ Always return number
+    // Larger portfolios go out as parallel requests of at most PRICE_BATCH_LIMIT symbols
+    const batches: string[][] = [];
+    for (let i = 0; i < stockIds.length; i += PRICE_BATCH_LIMIT) {
+      batches.push(stockIds.slice(i, i + PRICE_BATCH_LIMIT));
+    }
+    return forkJoin(batches.map(batch => this.fetchPriceBatch(batch))).pipe(
+      map(results => results.flat())
+    );
+  }
+
+  private fetchPriceBatch(stockIds: string[]): Observable<StockInfo[]> {
+    return this.http.post<any>(`${this.baseUrl}/price/`, { stock_ids: stockIds }, {
+      headers: this.getAuthHeaders()
+    }).pipe(
+      timeout(15000),
+      map(response => {
+        const quotes: any[] = response?.quotes || [];
+        const errors: { [stockId: string]: string } = response?.errors || {};
+        const byId = new Map(quotes.map(q => [q.stock_id, q]));
+
+        // Keep the caller's ordering, one entry per requested symbol
+        return stockIds.map(stockId => {
+          const quote = byId.get(stockId);
+          if (!quote) {
+            const errorInfo: StockInfo = {
+              stock_id: stockId,
+              price: 0,
               status: 'error',
-              error: 'Request failed'
+              error: errors[stockId] || 'Request failed'
             };
-            completed++;
-
-            if (completed === requests.length) {
-              observer.next(results);
-              observer.complete();
-            }
+            return errorInfo;
           }
+          const stockInfo: StockInfo = {
+            stock_id: stockId,
+            price: this.safeNumberRequired(quote.price, 0),
+            open: this.safeNumberOptional(quote.open),
+            high: this.safeNumberOptional(quote.high),
+            low: this.safeNumberOptional(quote.low),
+            volume: this.safeNumberOptional(quote.volume),
+            change: this.safeNumberOptional(quote.change),
+            change_percent: this.safeNumberOptional(quote.change_percent),
+            status: 'success'
+          };
+          return stockInfo;
         });
-      });
-    });
+      }),
+      catchError((error: HttpErrorResponse) => {
+        console.error('❌ Batch stock price fetch error:', error);
+        return of(stockIds.map(stockId => ({
+          stock_id: stockId,
+          price: 0, // ✅ Always return number
+          status: 'error' as const,
+          error: 'Request failed'
+        })));
+      })
+    );
   }
 
   // ✅ Enhanced Taiwan stock ID validation
@@ -202,16 +231,8 @@ export class StockService {
       return false;
     }
 
-    const trimmed = stockId.trim();
-
-    // Taiwan stock codes are 4 digits
-    if (!/^\d{4}$/.test(trimmed)) {
-      return false;
-    }
-
-    // Additional validation: first digit should be 1-9 (no leading zeros)
-    const firstDigit = trimmed.charAt(0);
-    return firstDigit !== '0';
+    // ETF codes such as 0050 and 00646 start with 0, so leading zeros are allowed
+    return STOCK_CODE_PATTERN.test(stockId.trim().toUpperCase());
   }
 
   // ✅ Enhanced stock ID formatting
@@ -220,9 +241,8 @@ export class StockService {
       return '';
     }
 
-    // Remove all non-numeric characters and limit to 4 digits
-    const cleaned = stockId.replace(/\D/g, '').slice(0, 4);
-    return cleaned;
+    // Keep digits and letters (ETF/bond codes like 00679B), upper-cased and at most 7 characters
+    return stockId.toUpperCase().replace(/[^0-9A-Z]/g, '').slice(0, 7);
   }
 
   // ✅ Check if Taiwan Stock Exchange is open
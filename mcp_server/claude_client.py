@@ -1,16 +1,38 @@
 # mcp_server/claude_client.py
 import os
-from anthropic import Anthropic
+from typing import AsyncIterator
+import httpx
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
 
-client = Anthropic(
-    api_key=os.getenv("CLAUDE_API_KEY")
+# One pooled HTTP client shared by every request in this process
+client = AsyncAnthropic(
+    api_key=os.getenv("CLAUDE_API_KEY"),
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("CLAUDE_MAX_CONNECTIONS", 20)),
+            max_keepalive_connections=int(os.getenv("CLAUDE_MAX_KEEPALIVE", 10)),
+        ),
+    ),
 )
 
-def call_claude(prompt: str) -> str:
-    response = client.messages.create(
-        model="claude-3-5-sonnet-latest",
+MODEL = "claude-3-5-sonnet-latest"
+
+async def call_claude(prompt: str) -> str:
+    response = await client.messages.create(
+        model=MODEL,
         max_tokens=1024,
         temperature=0.7,
         messages=[{"role": "user", "content": prompt}]
     )
     return response.content[0].text
+
+async def stream_claude(prompt: str) -> AsyncIterator[str]:
+    """Yield completion text incrementally as Claude produces it"""
+    async with client.messages.stream(
+        model=MODEL,
+        max_tokens=1024,
+        temperature=0.7,
+        messages=[{"role": "user", "content": prompt}]
+    ) as stream:
+        async for text in stream.text_stream:
+            yield text
@@ -0,0 +1,22 @@
+# mcp_server/fake_client.py
+import asyncio
+import os
+from typing import AsyncIterator
+
+# Stand-in provider for load tests: no API keys, no network, fixed latency
+FAKE_LATENCY = float(os.getenv("FAKE_LATENCY", 1.0))
+FAKE_CHUNKS = int(os.getenv("FAKE_CHUNKS", 20))
+
+def _words(prompt: str) -> list:
+    return [f"fake-{i} " for i in range(FAKE_CHUNKS)] + [f"({len(prompt)} chars)"]
+
+async def call_fake(prompt: str) -> str:
+    await asyncio.sleep(FAKE_LATENCY)
+    return "".join(_words(prompt))
+
+async def stream_fake(prompt: str) -> AsyncIterator[str]:
+    """Spread FAKE_LATENCY evenly across the streamed chunks"""
+    words = _words(prompt)
+    for word in words:
+        await asyncio.sleep(FAKE_LATENCY / len(words))
+        yield word
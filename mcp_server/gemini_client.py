@@ -1,13 +1,27 @@
 # mcp_server/gemini_client.py
 import os
+from typing import AsyncIterator
 from google.generativeai import GenerativeModel
 import google.generativeai as genai
 
 # Fix: Use GOOGLE_API_KEY to match your .env file
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
+# The async methods share one gRPC aio channel, which multiplexes requests
 model = GenerativeModel("gemini-2.0-flash")
 
-def call_gemini(prompt: str) -> str:
-    response = model.generate_content(prompt)
-    return response.text
\ No newline at end of file
+async def call_gemini(prompt: str) -> str:
+    response = await model.generate_content_async(prompt)
+    return response.text
+
+async def stream_gemini(prompt: str) -> AsyncIterator[str]:
+    """Yield completion text incrementally as Gemini produces it"""
+    response = await model.generate_content_async(prompt, stream=True)
+    async for chunk in response:
+        # Chunks without text parts (e.g. safety metadata) raise on .text
+        try:
+            text = chunk.text
+        except ValueError:
+            continue
+        if text:
+            yield text
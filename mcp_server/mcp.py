@@ -1,20 +1,62 @@
 # mcp_server/mcp.py
+import asyncio
+import os
+from typing import AsyncIterator, Awaitable, Callable
 from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from claude_client import call_claude
-from gemini_client import call_gemini
+
+# MCP_PROVIDER=fake serves both routes from a local stub for load testing
+if os.getenv("MCP_PROVIDER", "").lower() == "fake":
+    from fake_client import call_fake as call_claude, stream_fake as stream_claude
+    from fake_client import call_fake as call_gemini, stream_fake as stream_gemini
+else:
+    from claude_client import call_claude, stream_claude
+    from gemini_client import call_gemini, stream_gemini
 
 app = FastAPI()
 
+# Streaming endpoints send raw UTF-8 text chunks as the model produces them
+STREAM_MEDIA_TYPE = "text/plain; charset=utf-8"
+
+# Per-provider cap on in-flight completions; excess requests queue here
+# instead of piling onto the provider's rate limit
+LIMITS = {
+    "claude": asyncio.Semaphore(int(os.getenv("CLAUDE_MAX_CONCURRENCY", 8))),
+    "gemini": asyncio.Semaphore(int(os.getenv("GEMINI_MAX_CONCURRENCY", 8))),
+}
+
 class PromptRequest(BaseModel):
     prompt: str
 
+async def _limited(provider: str, call: Callable[[str], Awaitable[str]], prompt: str) -> str:
+    async with LIMITS[provider]:
+        return await call(prompt)
+
+async def _limited_stream(provider: str, stream: Callable[[str], AsyncIterator[str]], prompt: str) -> AsyncIterator[str]:
+    # The slot is held until the last chunk has been sent
+    async with LIMITS[provider]:
+        async for text in stream(prompt):
+            yield text
+
 @app.post("/claude")
 async def claude_handler(request: PromptRequest):
-    result = call_claude(request.prompt)
+    result = await _limited("claude", call_claude, request.prompt)
     return {"result": result}
 
 @app.post("/gemini")
 async def gemini_handler(request: PromptRequest):
-    result = call_gemini(request.prompt)
+    result = await _limited("gemini", call_gemini, request.prompt)
     return {"result": result}
+
+@app.post("/claude/stream")
+async def claude_stream_handler(request: PromptRequest):
+    return StreamingResponse(
+        _limited_stream("claude", stream_claude, request.prompt), media_type=STREAM_MEDIA_TYPE
+    )
+
+@app.post("/gemini/stream")
+async def gemini_stream_handler(request: PromptRequest):
+    return StreamingResponse(
+        _limited_stream("gemini", stream_gemini, request.prompt), media_type=STREAM_MEDIA_TYPE
+    )
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pretest.settings')
 
 application = get_asgi_application()
+
+# Serve admin/DRF static files in development, as runserver did
+if settings.DEBUG:
+    application = ASGIStaticFilesHandler(application)
@@ -136,4 +136,43 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
 }
-CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
\ No newline at end of file
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+# Entries are synced into django_celery_beat's periodic task table on beat start
+CELERY_BEAT_SCHEDULE = {
+    'persist-dirty-holdings': {
+        'task': 'api.tasks.persist_dirty_holdings',
+        'schedule': 30.0,
+    },
+    'persist-dirty-cash': {
+        'task': 'api.tasks.persist_dirty_cash',
+        'schedule': 30.0,
+    },
+    'precompute-signals': {
+        'task': 'api.tasks.precompute_signals',
+        'schedule': 600.0,
+    },
+    'append-history': {
+        'task': 'api.tasks.append_history',
+        'schedule': 1800.0,
+    },
+    'ingest-realtime-quotes': {
+        'task': 'api.tasks.ingest_realtime_quotes',
+        'schedule': 5.0,
+    },
+    'rebuild-order-book': {
+        'task': 'api.tasks.rebuild_order_book',
+        'schedule': 300.0,
+    },
+    'snapshot-daily-equity': {
+        'task': 'api.tasks.snapshot_daily_equity',
+        'schedule': 3600.0,
+    },
+    'rebuild-leaderboard': {
+        'task': 'api.tasks.rebuild_leaderboard',
+        'schedule': 86400.0,
+    },
+    'flush-trade-journal': {
+        'task': 'api.tasks.flush_trade_journal',
+        'schedule': 2.0,
+    },
+}
@@ -22,5 +22,7 @@ echo "👤 Creating superuser if missing…"
 python manage.py shell -c "from django.contrib.auth import get_user_model; U=get_user_model();\
 U.objects.filter(username='admin').exists() or U.objects.create_superuser('admin','admin@example.com','admin123')"
 
-echo "🚀 Launching Django on port $DJANGO_PORT…"
-exec python manage.py runserver 0.0.0.0:"$DJANGO_PORT"
+echo "🚀 Launching Django (ASGI) on port $DJANGO_PORT…"
+# ASGI so /api/analyze/<id>/stream/ pushes events as they are published;
+# runserver (WSGI) would buffer each stream until it ends
+exec uvicorn pretest.asgi:application --host 0.0.0.0 --port "$DJANGO_PORT"